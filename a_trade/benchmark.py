@@ -0,0 +1,332 @@
+# coding: utf-8
+# 文件：benchmark.py
+
+"""
+性能基准测试脚本。
+
+用法:
+    python -m a_trade.benchmark db_profile <开始日期(yyyyMMdd)> <结束日期(yyyyMMdd)> [配置名...]
+    python -m a_trade.benchmark schedule_bus [股票数量] [重复次数]
+    python -m a_trade.benchmark concept_search <交易日期(yyyyMMdd)> [重复次数]
+    python -m a_trade.benchmark llm_batch <交易日期(yyyyMMdd)> [每批原因数]
+
+db_profile: 分别以不同的 SQLite 配置（TRADE_DB_PROFILE）在子进程中重放 daily_work.main 中
+            只依赖本地数据库的阶段（连板数计算、市场情绪计算），对比耗时。这些阶段可重复执行，结果不变。
+schedule_bus: 使用合成的分钟数据回放 TimeScheduleBus 盘中阶段，对比逐分钟遍历、逐股票回调、批量回调的每秒事件数，
+              不读取数据库。
+concept_search: 取一个交易日 limit_up_tushare 的全部涨停原因，按 jieba 分词后分别用 ConceptInfo.name LIKE 逐原因查询
+                与概念名称 n-gram 索引查找，校验结果一致并对比耗时。不调用翻译接口，英文分词按原样参与匹配。
+llm_batch: 取一个交易日的全部涨停原因及其候选板块，对比逐个请求与批量请求板块归因的请求数与提示词 token 预估量，
+           不调用模型接口。
+"""
+
+import os
+import sys
+import json
+import time
+import subprocess
+import datetime
+from collections import defaultdict
+from typing import Dict, List
+
+import numpy as np
+
+
+def _run_db_pipeline(start_date: str, end_date: str) -> Dict[str, float]:
+    """在当前进程（已按环境变量选择好 SQLite 配置）中执行一次数据库阶段，返回各阶段耗时"""
+    from a_trade.trade_calendar import TradeCalendar
+    from a_trade.limit_up_data_tushare import update_continuous_limit_up_count, LimitDataSource
+    from a_trade.market_analysis import update_market_daily_data_during
+
+    timings = {}
+
+    stage_start = time.perf_counter()
+    update_continuous_limit_up_count(start_date, end_date)
+    timings['连板数计算'] = time.perf_counter() - stage_start
+
+    stage_start = time.perf_counter()
+    update_market_daily_data_during(start_date, end_date)
+    timings['市场情绪计算'] = time.perf_counter() - stage_start
+
+    stage_start = time.perf_counter()
+    for trade_date in TradeCalendar.get_trade_dates(start_date, end_date):
+        limit_data_source = LimitDataSource(trade_date)
+        limit_data_source.load_daily_data()
+    timings['涨停数据读取'] = time.perf_counter() - stage_start
+
+    timings['总计'] = sum(timings.values())
+    return timings
+
+
+def benchmark_db_profiles(start_date: str, end_date: str, profiles: List[str] = None) -> Dict[str, Dict[str, float]]:
+    """
+    对比不同 SQLite 配置下日常流程数据库阶段的耗时，每个配置在独立子进程中运行
+
+    参数:
+        start_date: str, 开始日期 (格式: YYYYMMDD)
+        end_date: str, 结束日期 (格式: YYYYMMDD)
+        profiles: List[str], 参与对比的配置名称，默认对比 default 与 performance
+
+    返回:
+        Dict[str, Dict[str, float]]: 配置名 -> 阶段 -> 耗时(秒)
+    """
+    profiles = profiles or ['default', 'performance']
+    results = {}
+    for profile in profiles:
+        env = dict(os.environ, TRADE_DB_PROFILE=profile)
+        output = subprocess.run(
+            [sys.executable, '-m', 'a_trade.benchmark', '_db_pipeline', start_date, end_date],
+            env=env, check=True, capture_output=True, text=True
+        ).stdout
+        results[profile] = json.loads(output.strip().splitlines()[-1])
+
+    stages = list(next(iter(results.values())).keys())
+    print(f"{'阶段':<12}" + ''.join(f"{profile:>14}" for profile in profiles))
+    for stage in stages:
+        print(f"{stage:<12}" + ''.join(f"{results[profile][stage]:>13.2f}s" for profile in profiles))
+    return results
+
+
+def _synthetic_minute_data(stock_count: int, trade_date: str) -> Dict[str, list]:
+    """生成 stock_count 只股票一个交易日的分钟数据（09:31-11:30, 13:01-15:00 共240根）"""
+    from a_trade.minute_bar_store import MINUTE_BAR_FIELDS, bars_from_columns
+
+    minutes = list(range(9 * 60 + 31, 11 * 60 + 31)) + list(range(13 * 60 + 1, 15 * 60 + 1))
+    rng = np.random.default_rng(0)
+    data = {}
+    for i in range(stock_count):
+        columns = np.empty((len(MINUTE_BAR_FIELDS), len(minutes)), dtype=np.float64)
+        columns[0] = np.asarray(minutes) * 60
+        columns[1:] = 10 + rng.random((len(MINUTE_BAR_FIELDS) - 1, len(minutes)))
+        stock_code = f"{600000 + i:06d}.SH"
+        data[stock_code] = bars_from_columns(stock_code, trade_date, columns)
+    return data
+
+
+def _legacy_minute_walk(stock_minute_data: Dict[str, list], trade_date: str, callback) -> int:
+    """改造前的盘中回放方式：解析字符串时间分组后逐分钟遍历，作为对照"""
+    trade_date_obj = datetime.datetime.strptime(trade_date, "%Y%m%d").date()
+    time_grouped_data = defaultdict(dict)
+    for stock_code, minute_data_list in stock_minute_data.items():
+        for data in minute_data_list:
+            trade_datetime = datetime.datetime.strptime(data.trade_time, "%Y-%m-%d %H:%M:%S")
+            time_grouped_data[datetime.datetime.combine(trade_date_obj, trade_datetime.time())][stock_code] = data
+
+    dispatched = 0
+    current_dt = datetime.datetime.combine(trade_date_obj, datetime.time(9, 30))
+    end_dt = datetime.datetime.combine(trade_date_obj, datetime.time(15, 0))
+    while current_dt <= end_dt:
+        for stock_code, data in time_grouped_data.get(current_dt, {}).items():
+            callback(stock_code, data, current_dt.strftime("%H:%M"))
+            dispatched += 1
+        current_dt += datetime.timedelta(minutes=1)
+    return dispatched
+
+
+def benchmark_schedule_bus(stock_count: int = 200, repeat: int = 5) -> Dict[str, float]:
+    """
+    对比盘中回放方式的每秒事件数，耗时包含分钟数据分组/排序与派发
+
+    参数:
+        stock_count: int, 订阅股票数量
+        repeat: int, 重复次数，取最短耗时
+
+    返回:
+        Dict[str, float]: 回放方式 -> 每秒事件数
+    """
+    from a_trade.time_schedule import TimeScheduleBus
+
+    trade_date = '20240102'
+    stock_minute_data = _synthetic_minute_data(stock_count, trade_date)
+    stock_codes = list(stock_minute_data.keys())
+    loader = lambda codes, _: {code: stock_minute_data[code] for code in codes}
+
+    def on_minute_data(stock_code, minute_data, trade_time):
+        pass
+
+    def on_minute_batch(minute_data_map, trade_time):
+        pass
+
+    def run_bus(batch: bool) -> int:
+        bus = TimeScheduleBus(trade_date, minute_data_loader=loader)
+        if batch:
+            bus.subscribe_batch(stock_codes, on_minute_batch)
+        else:
+            bus.subscribe(stock_codes, on_minute_data)
+        bus.register_api_call('10:00', lambda: None)
+        return bus.during_market_trade()
+
+    cases = {
+        '逐分钟遍历(改造前)': lambda: _legacy_minute_walk(stock_minute_data, trade_date, on_minute_data),
+        '事件回放-逐股票回调': lambda: run_bus(False),
+        '事件回放-批量回调': lambda: run_bus(True),
+    }
+    results = {}
+    print(f"{'回放方式':<20}{'事件数':>10}{'耗时(ms)':>12}{'事件/秒':>14}")
+    for name, case in cases.items():
+        best = float('inf')
+        events = 0
+        for _ in range(repeat):
+            stage_start = time.perf_counter()
+            events = case()
+            best = min(best, time.perf_counter() - stage_start)
+        results[name] = events / best if best > 0 else float('inf')
+        print(f"{name:<20}{events:>10}{best * 1000:>12.2f}{results[name]:>14.0f}")
+    return results
+
+
+def benchmark_concept_search(trade_date: str, repeat: int = 5) -> Dict[str, float]:
+    """
+    对比涨停原因分词匹配概念的两种方式的耗时
+
+    参数:
+        trade_date: str, 交易日期 (格式: YYYYMMDD)
+        repeat: int, 重复次数，取最短耗时
+
+    返回:
+        Dict[str, float]: 查询方式 -> 耗时(秒)
+    """
+    import jieba
+    from sqlalchemy import or_
+    from a_trade.db_base import Session
+    from a_trade.trade_utils import strip_list
+    from a_trade.concept_manager import ConceptInfo, target_conditions, conceptManager
+    from a_trade.limit_up_data_tushare import LimitUpTushare
+    from a_trade.reason_concept import reasonConceptManager
+
+    with Session() as session:
+        reasons = [row.reason_type for row in session.query(LimitUpTushare.reason_type).filter(
+            LimitUpTushare.trade_date == trade_date,
+            LimitUpTushare.reason_type.isnot(None)
+        ).distinct()]
+    reason_words = {}
+    for reason in reasons:
+        words = strip_list([word.strip() for word in jieba.lcut(reason) if reasonConceptManager._is_valid_word(word.strip())])
+        if words:
+            reason_words[reason] = words
+    if not reason_words:
+        print(f"{trade_date} 没有可用于匹配的涨停原因")
+        return {}
+
+    def like_query() -> Dict[str, set]:
+        result = {}
+        with Session() as session:
+            for reason, words in reason_words.items():
+                conditions = target_conditions + [or_(*[ConceptInfo.name.like(f"%{word}%") for word in words])]
+                result[reason] = {concept.name for concept in session.query(ConceptInfo).filter(*conditions).all()}
+        return result
+
+    def index_query() -> Dict[str, set]:
+        return {reason: conceptManager.query_concepts_by_words(words) for reason, words in reason_words.items()}
+
+    def index_batch_query() -> Dict[str, set]:
+        # 当日全部分词一次查找，再按原因分配
+        all_words = strip_list([word for words in reason_words.values() for word in words])
+        word_concepts = {word: conceptManager.name_index.search(word) for word in all_words}
+        return {reason: set().union(*(word_concepts[word] for word in words)) for reason, words in reason_words.items()}
+
+    cases = {
+        'LIKE 逐原因查询': like_query,
+        'n-gram 索引': index_query,
+        'n-gram 索引-当日批量': index_batch_query,
+    }
+    expected = None
+    results = {}
+    word_count = sum(len(words) for words in reason_words.values())
+    print(f"{trade_date} 涨停原因 {len(reason_words)} 个，分词 {word_count} 个，概念 {len(conceptManager.name_index.names)} 个")
+    print(f"{'查询方式':<20}{'耗时(ms)':>12}{'每原因(us)':>14}")
+    for name, case in cases.items():
+        best = float('inf')
+        for _ in range(repeat):
+            stage_start = time.perf_counter()
+            matched = case()
+            best = min(best, time.perf_counter() - stage_start)
+        if expected is None:
+            expected = matched
+        elif matched != expected:
+            diff = [reason for reason in expected if expected[reason] != matched.get(reason)]
+            print(f"{name} 与 LIKE 查询结果不一致: {diff[:5]}")
+        results[name] = best
+        print(f"{name:<20}{best * 1000:>12.2f}{best / len(reason_words) * 1e6:>14.1f}")
+    return results
+
+
+def benchmark_llm_batch(trade_date: str, batch_size: int = None) -> Dict[str, Dict[str, int]]:
+    """
+    对比板块归因逐个请求与批量请求的请求数与 token 预估量（提示词 + max_tokens）
+
+    参数:
+        trade_date: str, 交易日期 (格式: YYYYMMDD)
+        batch_size: int, 每批原因数，默认 RELATED_CONCEPT_BATCH_SIZE
+
+    返回:
+        Dict[str, Dict[str, int]]: 请求方式 -> {'请求数', '提示词token', '总token'}
+    """
+    import jieba
+    from a_trade.db_base import Session
+    from a_trade.trade_utils import strip_list
+    from a_trade.concept_manager import conceptManager
+    from a_trade.limit_up_data_tushare import LimitUpTushare
+    from a_trade.limit_attribution import _split_reason_type
+    from a_trade.reason_concept import reasonConceptManager
+    from a_trade.concept_llm_analysis import (RELATED_CONCEPT_BATCH_SIZE, _related_concept_request,
+                                              _batch_related_concept_request)
+
+    batch_size = batch_size or RELATED_CONCEPT_BATCH_SIZE
+    with Session() as session:
+        reason_types = [row.reason_type for row in session.query(LimitUpTushare.reason_type).filter(
+            LimitUpTushare.trade_date == trade_date,
+            LimitUpTushare.reason_type.isnot(None)
+        )]
+    reasons = strip_list([reason for reason_type in reason_types for reason in _split_reason_type(reason_type) if reason])
+    items = []
+    for reason in reasons:
+        words = [word.strip() for word in jieba.lcut(reason) if reasonConceptManager._is_valid_word(word.strip())]
+        concept_names = sorted(conceptManager.query_concepts_by_words(words))
+        if concept_names:
+            items.append((reason, concept_names))
+    if not items:
+        print(f"{trade_date} 没有可归因的涨停原因")
+        return {}
+
+    def measure(requests) -> Dict[str, int]:
+        total = sum(request.estimate_tokens() for request in requests)
+        return {'请求数': len(requests), '提示词token': total - sum(request.max_tokens for request in requests), '总token': total}
+
+    ordered = sorted(items, key=lambda item: item[1])
+    results = {
+        '逐个请求': measure([_related_concept_request(reason, concept_names) for reason, concept_names in items]),
+        f'批量请求({batch_size}个/批)': measure([_batch_related_concept_request(ordered[start:start + batch_size])
+                                                for start in range(0, len(ordered), batch_size)]),
+    }
+    print(f"{trade_date} 涨停股票 {len(reason_types)} 只，可归因的涨停原因 {len(items)} 个")
+    print(f"{'请求方式':<20}{'请求数':>8}{'提示词token':>14}{'总token':>12}")
+    for name, result in results.items():
+        print(f"{name:<20}{result['请求数']:>8}{result['提示词token']:>14}{result['总token']:>12}")
+    return results
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command == 'schedule_bus':
+        benchmark_schedule_bus(*(int(arg) for arg in sys.argv[2:4]))
+    elif command == 'concept_search':
+        if len(sys.argv) < 3:
+            print("用法: python -m a_trade.benchmark concept_search <交易日期(yyyyMMdd)> [重复次数]")
+            sys.exit(1)
+        benchmark_concept_search(sys.argv[2], *(int(arg) for arg in sys.argv[3:4]))
+    elif command == 'llm_batch':
+        if len(sys.argv) < 3:
+            print("用法: python -m a_trade.benchmark llm_batch <交易日期(yyyyMMdd)> [每批原因数]")
+            sys.exit(1)
+        benchmark_llm_batch(sys.argv[2], *(int(arg) for arg in sys.argv[3:4]))
+    elif command in ('db_profile', '_db_pipeline') and len(sys.argv) < 4:
+        print("用法: python -m a_trade.benchmark db_profile <开始日期(yyyyMMdd)> <结束日期(yyyyMMdd)> [配置名...]")
+        sys.exit(1)
+    elif command == 'db_profile':
+        benchmark_db_profiles(sys.argv[2], sys.argv[3], sys.argv[4:] or None)
+    elif command == '_db_pipeline':
+        print(json.dumps(_run_db_pipeline(sys.argv[2], sys.argv[3])))
+    else:
+        print(f"未知的基准测试: {command}")
+        sys.exit(1)
@@ -6,8 +6,9 @@ import logging
 import a_trade.settings
 import ast
 import json
-from typing import List, Optional
-from a_trade.llm_caller_factory import LLMCallerFactory
+from typing import List, Optional, Tuple, Dict, Any
+from pydantic import BaseModel, Field, ValidationError, field_validator
+from a_trade.llm_caller_pool import LLMRequest, llmCallerPool
 from dotenv import load_dotenv
 # 获取环境变量
 openai_secret_key = os.getenv("OPENAI_API_KEY")
@@ -16,18 +17,14 @@ proxy_http_url = os.getenv('PROXY_HTTP')
 # 加载环境变量
 load_dotenv()
 
-def analyze_key_word_with_limit_reason(limit_reason: str, jieba_words: List[str]) -> List[str]:
-    """
-    调用 OpenAI GPT-4o 获取涨停原因联想分词
-    
-    Args:
-        limit_reason (str): 股票的涨停原因
-        jieba_words (List[str]): 无法帮助分析板块的关键词数组
-        
-    Returns:
-        List[str]: 联想分词后的关键词数组，每个关键词不超过4个字，最多4个元素
-    """
-    logging.info(f"即将openai调用对{limit_reason}进行联想与分词")
+# 批量板块归因时每个提示词包含的涨停原因数
+RELATED_CONCEPT_BATCH_SIZE = 20
+
+class ConceptAnalysisError(Exception):
+    """板块归因响应多次解码失败，结果不可信，调用方不应记录该涨停原因"""
+
+def _key_word_request(limit_reason: str, jieba_words: List[str]) -> LLMRequest:
+    """构造涨停原因联想分词请求，解析结果为关键词数组"""
     system_prompt = f"""
 我将为你提供一只股票的涨停原因。请你为我通过总结+联想的方式找到涨停原因的关键词数组。我希望这个关键词数组可以有助于我找到涨停原因背后的板块名称。
 **规则: **
@@ -87,43 +84,39 @@ def analyze_key_word_with_limit_reason(limit_reason: str, jieba_words: List[str]
 失败关键词: {jieba_words}
 """
     
-    caller = LLMCallerFactory.get_caller("openai")
-    
-    try:
-        response_text = caller.call_text_model_api(
-            system_prompt=system_prompt,
-            user_prompt=user_prompt
-        )
-    except Exception as e:
-        logging.error(f"文本API调用失败: {e}")
-        raise
-    
-    try:
+    def parse(response_text: str) -> List[str]:
         key_word_list = ast.literal_eval(response_text)
-        logging.info(f"涨停原因 '{limit_reason}' 通过 OpenAI 联想分词结果: {key_word_list}")
+        if not isinstance(key_word_list, list):
+            raise ValueError(f"联想分词结果不是数组: {key_word_list}")
         return key_word_list
-    except (ValueError, SyntaxError) as e:
-        logging.error(f"LLM 联想分词解码错误: {e}, 返回文本是 {response_text}")
-        return analyze_key_word_with_limit_reason(limit_reason, jieba_words)
 
-def analyze_related_concept_with_limit_reason(limit_reason: str, concept_names: List[str], search_content: Optional[str] = None) -> dict:
+    return LLMRequest(system_prompt=system_prompt, user_prompt=user_prompt, parse=parse)
+
+def analyze_key_word_with_limit_reason(limit_reason: str, jieba_words: List[str]) -> List[str]:
     """
-    调用 OpenAI GPT-4o 获取涨停原因联想板块
+    调用 OpenAI GPT-4o 获取涨停原因联想分词
     
     Args:
         limit_reason (str): 股票的涨停原因
-        concept_names (List[str]): 可能的板块名称数组
-        search_content (Optional[str]): 涨停原因里陌生术语的背景信息，可选
+        jieba_words (List[str]): 无法帮助分析板块的关键词数组
         
     Returns:
-        dict: 包含以下字段的字典:
-            - output (List[str]): 与涨停原因相关的板块名称数组
-            - reason (str): 推理过程
-            - unknown (Optional[str]): 陌生术语或不常见术语，可选
+        List[str]: 联想分词后的关键词数组，每个关键词不超过4个字，最多4个元素；多次解码失败时返回空数组
     """
-    if not concept_names:
-        return {"output": []}
-    
+    logging.info(f"即将openai调用对{limit_reason}进行联想与分词")
+    try:
+        key_word_list = llmCallerPool.call("openai", _key_word_request(limit_reason, jieba_words))
+    except (ValueError, SyntaxError) as e:
+        logging.error(f"LLM 联想分词解码错误，已达到最大重试次数: {e}")
+        return []
+    except Exception as e:
+        logging.error(f"文本API调用失败: {e}")
+        raise
+    logging.info(f"涨停原因 '{limit_reason}' 通过 OpenAI 联想分词结果: {key_word_list}")
+    return key_word_list
+
+def _related_concept_request(limit_reason: str, concept_names: List[str], search_content: Optional[str] = None) -> LLMRequest:
+    """构造涨停原因联想板块请求，解析结果为 analyze_related_concept_with_limit_reason 的返回格式"""
     background_info = search_content if search_content else ""
     system_prompt = f"""
 我将为你提供一只股票的涨停原因，以及该股票可能的板块名称数组、可能还会提供涨停原因里陌生术语的背景信息。请你为我从数组范围内找到与涨停原因具有相关性的板块名称。
@@ -165,19 +158,10 @@ def analyze_related_concept_with_limit_reason(limit_reason: str, concept_names:
 板块名称数组: {concept_names}
 {background_info}
     """
-    caller = LLMCallerFactory.get_caller("openai")
-    
-    try:
-        response_text = caller.call_text_model_api(
-            system_prompt=system_prompt,
-            user_prompt=user_prompt
-        )
-    except Exception as e:
-        logging.error(f"文本API调用失败: {e}")
-        raise
-    
-    try:
+    def parse(response_text: str) -> dict:
         response_json = json.loads(response_text)
+        if not isinstance(response_json, dict):
+            raise ValueError(f"板块归因结果不是 JSON 对象: {response_json}")
         concept_name_list = response_json.get("output", [])
         reason = response_json.get("reason", "无推理过程提供")
         unknown_word = response_json.get("unknown", None)
@@ -197,12 +181,164 @@ def analyze_related_concept_with_limit_reason(limit_reason: str, concept_names:
             "output": concept_name_list,
             "reason": reason
         }
-    except (ValueError, SyntaxError, json.JSONDecodeError) as e:
-        logging.error(f"LLM 板块归因解码错误: {e}, JSON字符串是 {response_text}")
-        return analyze_related_concept_with_limit_reason(limit_reason, concept_names, search_content)
 
+    return LLMRequest(system_prompt=system_prompt, user_prompt=user_prompt, parse=parse)
+
+def analyze_related_concept_with_limit_reason(limit_reason: str, concept_names: List[str], search_content: Optional[str] = None) -> dict:
+    """
+    调用 OpenAI GPT-4o 获取涨停原因联想板块
+    
+    Args:
+        limit_reason (str): 股票的涨停原因
+        concept_names (List[str]): 可能的板块名称数组
+        search_content (Optional[str]): 涨停原因里陌生术语的背景信息，可选
+        
+    Returns:
+        dict: 包含以下字段的字典:
+            - output (List[str]): 与涨停原因相关的板块名称数组
+            - reason (str): 推理过程
+            - unknown (Optional[str]): 陌生术语或不常见术语，可选
+
+    Raises:
+        ConceptAnalysisError: 多次解码失败
+    """
+    if not concept_names:
+        return {"output": []}
 
-def analyze_concept_datas_from_media_image(image_path):
+    try:
+        return llmCallerPool.call("openai", _related_concept_request(limit_reason, concept_names, search_content))
+    except (ValueError, SyntaxError) as e:
+        logging.error(f"LLM 板块归因解码错误，已达到最大重试次数: {e}")
+        raise ConceptAnalysisError(f"涨停原因 '{limit_reason}' 板块归因解码失败") from e
+    except Exception as e:
+        logging.error(f"文本API调用失败: {e}")
+        raise
+
+class RelatedConceptResult(BaseModel):
+    """批量板块归因响应中的单个元素"""
+    id: int
+    output: List[str] = Field(default_factory=list)
+    reason: str = "无推理过程提供"
+    unknown: Optional[str] = None
+
+    @field_validator('output', mode='before')
+    @classmethod
+    def _parse_output(cls, value):
+        # 与单个归因一致，output 可能是数组字符串
+        if isinstance(value, str):
+            return ast.literal_eval(value) if value.strip() else []
+        return value
+
+    def to_dict(self) -> dict:
+        result = {"output": self.output, "reason": self.reason}
+        if self.unknown:
+            result["unknown"] = self.unknown
+        return result
+
+def _batch_related_concept_request(items: List[Tuple[str, List[str]]]) -> LLMRequest:
+    """
+    构造批量板块归因请求，多个涨停原因共用一份规则说明。
+    解析结果为 id -> 校验通过且 output 均来自该原因板块名称数组的 RelatedConceptResult，整体不是 JSON 数组时视为解析失败。
+    """
+    system_prompt = """
+我将为你提供多只股票的涨停原因，每个涨停原因附带编号 id 与该股票可能的板块名称数组。请你分别从各自的数组范围内找到与涨停原因具有相关性的板块名称。
+**重要指示: **
+- 输出结果必须是一个 **纯粹的 JSON 数组**，数组里每个元素对应一个涨停原因，必须包含输入中的全部 id。
+- 严禁使用 Markdown 格式化（如 ```json 或 ```）。
+- **输出内容必须从 '[' 开始，直到 ']' 结束**。任何额外的字符（如换行、注释或代码块标记）都将导致解析失败。
+
+**规则: **
+1. 板块名称数组里与涨停原因不相关的板块名称请丢弃。每个涨停原因只能从它自己的板块名称数组里选择。
+2. 如果具有**直接相关性**的板块个数大于1，请确保输出数组元素是按照与涨停原因相关性从大到小的顺序组织的
+3. 如果具有**直接相关性**的板块中存在多个。需要区分彼此之间的关系是包含关系还是并列关系，如果存在包含关系的多个板块，确保只返回在包含关系里最小的板块。比如人工智能包含AIGC概念，且都与涨停原因相关，只返回AIGC概念。
+4. 数组元素的 JSON 结构如下:
+    - 'id': 输入中涨停原因的编号。
+    - 'output': 一个数组，分析结果仅只提取**与涨停原因最核心、最直接相关的主要板块**，忽略包含其他细分领域或泛指的板块。若结果有多个，数组元素按照相关性排序。如果没有相关板块，则输出空数组。
+    - 'reason': 推理过程，描述为什么选择这些板块名称，或者为什么没有相关板块。
+    - 'unknown': 一个字符串，所有被认为是陌生术语或不常见术语的内容。如果没有陌生术语，请不要包含'unknown'字段。
+5. 如果涨停原因包含了你没有直接知识或不常见的术语名称，必须将这些术语添加到 `unknown` 字段中，无论是否提到其模糊性。
+6. **仅包含直接对应或同义的板块名称**：仅当板块名称与涨停原因直接对应或是同义词时，才将其包含在 output 数组中。避免包含仅有部分关联或泛指的板块名称。
+
+**案例**
+输入: [{"id": 0, "涨停原因": "华为云", "板块名称数组": ["华为概念", "华为汽车", "云计算", "国资云", "云游戏", "云南"]}, {"id": 1, "涨停原因": "实控人已变更为国资", "板块名称数组": ["国资云"]}, {"id": 2, "涨停原因": "Kimi", "板块名称数组": ["区块链", "人工智能", "金融科技"]}]
+我期待你输出: [{"id": 0, "output": ["云计算", "华为概念"], "reason": "推理过程"}, {"id": 1, "output": [], "reason": "推理过程"}, {"id": 2, "output": [], "reason": "推理过程", "unknown": "Kimi"}]
+"""
+    user_prompt = json.dumps(
+        [{"id": i, "涨停原因": limit_reason, "板块名称数组": concept_names} for i, (limit_reason, concept_names) in enumerate(items)],
+        ensure_ascii=False
+    )
+
+    def parse(response_text: str) -> Dict[int, RelatedConceptResult]:
+        response_json = json.loads(response_text)
+        if isinstance(response_json, dict):
+            # 个别模型只能输出 JSON 对象，取其中唯一的数组
+            arrays = [value for value in response_json.values() if isinstance(value, list)]
+            response_json = arrays[0] if len(arrays) == 1 else response_json
+        if not isinstance(response_json, list):
+            raise ValueError(f"批量板块归因结果不是 JSON 数组: {response_text}")
+        results = {}
+        for element in response_json:
+            try:
+                result = RelatedConceptResult.model_validate(element)
+            except (ValidationError, ValueError, SyntaxError) as e:
+                logging.warning(f"批量板块归因元素校验失败: {element}, {e}")
+                continue
+            if not 0 <= result.id < len(items):
+                continue
+            # 只能从该原因自己的板块名称数组中选择，越界视为校验失败，改为逐个请求
+            out_of_list = set(result.output) - set(items[result.id][1])
+            if out_of_list:
+                logging.warning(f"批量板块归因元素板块不在候选范围内: {items[result.id][0]}, {out_of_list}")
+                continue
+            results[result.id] = result
+        return results
+
+    return LLMRequest(system_prompt=system_prompt, user_prompt=user_prompt, max_tokens=4096, parse=parse)
+
+def analyze_related_concepts_with_limit_reasons(items: List[Tuple[str, List[str]]], batch_size: int = RELATED_CONCEPT_BATCH_SIZE) -> List[dict]:
+    """
+    获取多个涨停原因的联想板块。按候选板块排序后每 batch_size 个原因合并为一个提示词并发请求，
+    缺失或校验失败的原因再逐个请求。
+
+    Args:
+        items (List[Tuple[str, List[str]]]): (涨停原因, 可能的板块名称数组) 列表
+        batch_size (int): 每个提示词包含的涨停原因数，为 1 时逐个请求
+
+    Returns:
+        List[dict]: 与 items 顺序一致，格式同 analyze_related_concept_with_limit_reason；调用失败的原因返回 {"output": []}
+    """
+    results = [{"output": []} for _ in items]
+    # 候选板块相近的原因放在同一批
+    indexes = sorted((i for i, (_, concept_names) in enumerate(items) if concept_names), key=lambda i: sorted(items[i][1]))
+    batches = [indexes[start:start + batch_size] for start in range(0, len(indexes), batch_size)] if batch_size > 1 else []
+
+    failed_indexes = [] if batches else indexes
+    responses = llmCallerPool.map("openai", [_batch_related_concept_request([items[i] for i in batch]) for batch in batches])
+    for batch, response in zip(batches, responses):
+        if isinstance(response, Exception):
+            logging.error(f"批量板块归因失败，{len(batch)} 个涨停原因改为逐个请求: {response}")
+            failed_indexes.extend(batch)
+            continue
+        for position, i in enumerate(batch):
+            result = response.get(position)
+            if result is None:
+                failed_indexes.append(i)
+                continue
+            results[i] = result.to_dict()
+            logging.info(f"涨停原因 '{items[i][0]}' 按相关性排序的板块名称是: {result.output}")
+    if batches:
+        logging.info(f"批量板块归因: {len(indexes)} 个涨停原因, {len(batches)} 个批次, {len(failed_indexes)} 个改为逐个请求")
+
+    responses = llmCallerPool.map("openai", [_related_concept_request(*items[i]) for i in failed_indexes])
+    for i, response in zip(failed_indexes, responses):
+        if isinstance(response, Exception):
+            logging.error(f"涨停原因 '{items[i][0]}' 板块归因失败: {response}")
+            continue
+        results[i] = response
+    return results
+
+def _media_image_request(image_path: str) -> LLMRequest:
+    """构造媒体表格图片解析请求，解析结果为概念数据 JSON"""
     prompt = """
 图片里是股票分类表。
 **表格格式: **
@@ -234,22 +370,30 @@ def analyze_concept_datas_from_media_image(image_path):
 5.如果图片里不存在表格，输出空JSON
 6.**输出内容必须从 '{{' 开始，直到 '}}' 结束**。任何额外的字符（如换行、注释或代码块标记）都将导致解析失败
 """
-    # 获取 LLM 调用器，默认使用 Deepseek
-    caller = LLMCallerFactory.get_caller("doubao")
-    
+    def parse(response_text) -> Any:
+        if isinstance(response_text, (dict, list)):
+            return response_text
+        return json.loads(response_text)
+
+    return LLMRequest(system_prompt=prompt, image_path=image_path, temperature=0, parse=parse)
+
+def analyze_concept_datas_from_media_image(image_path: str) -> Any:
+    """使用豆包多模态模型提取图片表格中的概念数据，多次解码失败时返回空字典"""
     try:
-        response_text = caller.call_visual_model_api(
-            system_prompt=prompt,
-            image_path=image_path,
-            temperature=0,
-        )
-        response_json = json.loads(response_text)
-        return response_json
-    except (ValueError, SyntaxError, json.JSONDecodeError) as e:
-        # OpenAI返回格式偶尔不受控，重试或调用备用API
-        logging.error(f"Json解析错误: {e}, JSON字符串是 {response_text}")
-        # 假设有一个备用函数 get_concept_datas_from_media_png_by_API
-        return analyze_concept_datas_from_media_image(image_path)
-    
+        return llmCallerPool.call("doubao", _media_image_request(image_path))
+    except (ValueError, SyntaxError) as e:
+        # 返回格式偶尔不受控，重试次数用尽后放弃该图片
+        logging.error(f"Json解析错误，已达到最大重试次数: {e}")
+        return {}
+
+def analyze_concept_datas_from_media_images(image_paths: List[str]) -> List[Any]:
+    """
+    并发提取多张图片表格中的概念数据
+
+    返回:
+        List[Any]: 与 image_paths 顺序一致，失败的图片返回对应的异常对象
+    """
+    return llmCallerPool.map("doubao", [_media_image_request(image_path) for image_path in image_paths])
+
 if __name__ == "__main__":
     analyze_related_concept_with_limit_reason('磁性元器件', ['通信网络设备及器件','分立器件','磁性材料'])
\ No newline at end of file
@@ -2,13 +2,13 @@
 import logging
 import datetime
 from sqlalchemy import Column, String, Integer, Float, Table, ForeignKey, or_ , and_, func
-from a_trade.db_base import Session, Base, engine
+from a_trade.db_base import Session, Base, engine, bulk_upsert_dataframe
 from a_trade.trade_calendar import TradeCalendar
 from a_trade.settings import _get_tushare
 import pandas as pd
 from typing import Optional
 import json
-from typing import List
+from typing import List, Dict, Iterable, Set
 
 class ConceptInfo(Base):
     __tablename__ = 'concept_info'
@@ -58,16 +58,81 @@ target_conditions = [
     ConceptInfo.name.isnot(None)
 ]
 
+# SQLite LIKE 只对 ASCII 字母大小写不敏感，索引按同样规则归一化
+_ASCII_LOWER = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')
+
+class ConceptNameIndex:
+    """
+    概念名称 n-gram 倒排索引，等价于 ConceptInfo.name LIKE '%word%'。
+    单字与相邻双字分别建倒排表：单字直接取倒排表，多字取各双字倒排表的交集后再做子串校验。
+    （中文分词多为两个字，SQLite FTS5 trigram 无法为少于三个字符的词使用索引，因此不采用）
+    fold_ascii_case=False 时区分大小写，与 Python 的 word in name 一致。
+    """
+
+    def __init__(self, names: Iterable[str], fold_ascii_case: bool = True):
+        self.fold_ascii_case = fold_ascii_case
+        self.names: List[str] = []
+        self._normalized: Dict[str, str] = {}
+        self._unigrams: Dict[str, Set[str]] = {}
+        self._bigrams: Dict[str, Set[str]] = {}
+        for name in names:
+            self.add(name)
+
+    def _normalize(self, text: str) -> str:
+        return text.translate(_ASCII_LOWER) if self.fold_ascii_case else text
+
+    def add(self, name: str) -> None:
+        """增量加入一个名称"""
+        if not name or name in self._normalized:
+            return
+        normalized = self._normalize(name)
+        self.names.append(name)
+        self._normalized[name] = normalized
+        for char in normalized:
+            self._unigrams.setdefault(char, set()).add(name)
+        for i in range(len(normalized) - 1):
+            self._bigrams.setdefault(normalized[i:i + 2], set()).add(name)
+
+    def search(self, word: str) -> Set[str]:
+        """返回名称中包含 word 的概念"""
+        word = self._normalize(word)
+        if not word:
+            return set(self.names)
+        if len(word) == 1:
+            return set(self._unigrams.get(word, ()))
+        postings = [self._bigrams.get(word[i:i + 2]) for i in range(len(word) - 1)]
+        if not all(postings):
+            return set()
+        postings.sort(key=len)
+        candidates = postings[0].intersection(*postings[1:])
+        if len(word) == 2:
+            return candidates
+        return {name for name in candidates if word in self._normalized[name]}
+
+    def search_many(self, words: Iterable[str]) -> Set[str]:
+        """返回名称中包含任一 word 的概念"""
+        result = set()
+        for word in dict.fromkeys(words):
+            result |= self.search(word)
+        return result
+
 class ConceptManager:
     def __init__(self):
         self.concept_info_cache = {}
+        self.name_index = ConceptNameIndex([])
         self._load_concept_infos()
 
     def _load_concept_infos(self) -> None:
-        """加载板块信息至内存缓存"""
+        """加载板块信息至内存缓存，并重建名称索引"""
         result = self._get_all_available_subject_concept()
+        self.concept_info_cache.clear()
         for record in result:
             self.concept_info_cache[record.name] = record
+        self.name_index = ConceptNameIndex(self.concept_info_cache.keys())
+
+    def query_concepts_by_words(self, words: Iterable[str]) -> Set[str]:
+        """查询名称包含任一分词的可用主题概念，一次索引查找返回全部候选"""
+        return self.name_index.search_many(words)
 
     def get_code_from_concept_name(self, name: str) -> Optional[str]:
         """根据概念名称获取概念代码"""
@@ -124,7 +189,10 @@ class ConceptManager:
                 session.commit()
                 new_concept_list += new_concepts['name'].tolist()
                 # new_concept_list += list(new_concepts.loc[:, ['name']].itertuples(index=False, name=None))
-            
+
+            if new_concept_list:
+                # 新增概念后同步内存缓存与名称索引
+                self._load_concept_infos()
             return new_concept_list
         except Exception as e:
             session.rollback()
@@ -150,21 +218,17 @@ class ConceptManager:
                     logging.info(f"板块: {concept.name}({concept.concept_code}) 缺少映射信息，即将请求")
                     ths_member_result = _get_tushare().pro_api().ths_member(ts_code=concept.concept_code)
                     print(ths_member_result)
-                    for _, row in ths_member_result.iterrows():
-                        new_relation = ConceptStockRelation(
-                            concept_code=concept.concept_code,
-                            concept_name=concept.name,
-                            stock_code=row['ts_code'],
-                            stock_name=row['con_name']
-                        )
-                        session.merge(new_relation)
-                session.commit()
+                    bulk_upsert_dataframe(
+                        ths_member_result[['ts_code', 'con_name']],
+                        ConceptStockRelation,
+                        column_map={'ts_code': 'stock_code', 'con_name': 'stock_name'},
+                        constants={'concept_code': concept.concept_code, 'concept_name': concept.name}
+                    )
             else:
                 logging.info("没有要更新的板块映射关系")
 
     def update_concept_daily_data_until(self, end_date: str) -> None:
         """更新题材+行业板块日线数据截止至end_date"""
-        session = Session()
         try:
             concepts = self.concept_info_cache.values()
             concept_codes = [concept.concept_code for concept in concepts]
@@ -193,34 +257,23 @@ class ConceptManager:
                 daily_data = _get_tushare().pro_api().ths_daily(ts_code=','.join(concept_codes), start_date=start_date, end_date=end_date)
                 if (len(daily_data) == 0):
                     logging.info(f"板块{concept_codes} 自{start_date}后不再有日线数据")
-                else:
-                    logging.info(f"从{start_date} - {end_date} 请求了{len(concept_codes)}个题材日线数据, 返回{len(daily_data)} 个题材日线数据")
-                for _, row in daily_data.iterrows():
-                    amount = row['avg_price'] * row['vol'] if row.get('avg_price') is not None and row.get('vol') is not None else None
-                    new_data = ConceptDailyData(
-                        concept_code=row['ts_code'],
-                        trade_date=row['trade_date'],
-                        open=row.get('open', None),
-                        high=row.get('high', None),
-                        low=row.get('low', None),
-                        close=row.get('close', None),
-                        pre_close=row.get('pre_close', None),
-                        change=row.get('change', None),
-                        pct_chg=row.get('pct_change', None),
-                        vol=row.get('vol', None),
-                        amount=amount,
-                        turnover_rate=row.get('turnover_rate', None),
-                        avg_price=row.get('avg_price', None)
-                    )
-                    session.merge(new_data)
-                    if any(row.get(field, None) is None for field in ['open', 'high', 'low', 'close', 'pre_close', 'change', 'vol']):
-                        logging.error(f"数据缺失，跳过插入: {row.to_dict()}")
-                session.commit()
+                    continue
+                logging.info(f"从{start_date} - {end_date} 请求了{len(concept_codes)}个题材日线数据, 返回{len(daily_data)} 个题材日线数据")
+                daily_data = daily_data.reindex(columns=[
+                    'ts_code', 'trade_date', 'open', 'high', 'low', 'close', 'pre_close',
+                    'change', 'pct_change', 'vol', 'turnover_rate', 'avg_price'
+                ])
+                daily_data['amount'] = daily_data['avg_price'] * daily_data['vol']
+                required_fields = ['open', 'high', 'low', 'close', 'pre_close', 'change', 'vol']
+                for _, row in daily_data[daily_data[required_fields].isna().any(axis=1)].iterrows():
+                    logging.error(f"数据缺失，跳过插入: {row.to_dict()}")
+                bulk_upsert_dataframe(
+                    daily_data,
+                    ConceptDailyData,
+                    column_map={'ts_code': 'concept_code', 'pct_change': 'pct_chg'}
+                )
         except Exception as e:
-            session.rollback()
             logging.error(f"更新题材日线数据失败: {e}")
-        finally:
-            session.close()
 
         self._update_concept_trade_date()
     
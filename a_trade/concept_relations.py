@@ -1,7 +1,140 @@
 # coding: utf-8
+import os
 import json
-from typing import List, Set, Optional, Dict
+import pickle
+import hashlib
+import logging
+from typing import Iterable, List, Set, Optional, Dict, Tuple
 from a_trade.settings import get_project_path
+from a_trade.db_base import db_dir
+
+# 板块关系闭包缓存目录，文件名包含 concept_category.json 的哈希值，JSON 变化后自动重建
+CONCEPT_CLOSURE_CACHE_DIR = db_dir / 'concept_closure'
+# 缓存格式版本，ConceptClosure 结构变化时递增
+CONCEPT_CLOSURE_CACHE_VERSION = 1
+
+class ConceptClosure:
+    """
+    板块关系的传递闭包索引。每个板块分配一个序号，祖先、子孙集合以整数位集表示：
+        - 父辈判断为一次位运算
+        - 公共祖先为祖先位集的按位与，再按祖先在各自链条中的位置选出最近的公共祖先
+        - 连通分量（经父子关系可达的板块）预先计算
+    """
+
+    def __init__(self, concept_to_category: Dict[str, List[str]], concept_to_chains: Dict[str, List[str]],
+                 concept_to_descendants: Dict[str, Set[str]]):
+        names = list(concept_to_category.keys())
+        for parents in concept_to_category.values():
+            names.extend(parents)
+        names.extend(concept_to_descendants.keys())
+        self.names: List[str] = list(dict.fromkeys(names))
+        self.index: Dict[str, int] = {name: position for position, name in enumerate(self.names)}
+
+        # 祖先位集不含自身（与 concept_to_chains 一致），祖先位置为在 [自身] + 链条 中的下标
+        self.ancestor_bits: List[int] = [0] * len(self.names)
+        self.ancestor_rank: List[Dict[int, int]] = [{position: 0} for position in range(len(self.names))]
+        for name, chain in concept_to_chains.items():
+            position = self.index[name]
+            ranks = self.ancestor_rank[position]
+            for depth, ancestor in enumerate(chain, start=1):
+                ancestor_position = self.index[ancestor]
+                self.ancestor_bits[position] |= 1 << ancestor_position
+                ranks.setdefault(ancestor_position, depth)
+
+        self.descendant_bits: List[int] = [0] * len(self.names)
+        for name, descendants in concept_to_descendants.items():
+            bits = 0
+            for descendant in descendants:
+                bits |= 1 << self.index[descendant]
+            self.descendant_bits[self.index[name]] = bits
+
+        self.component: List[int] = self._build_components(concept_to_category)
+        self._lca_cache: Dict[frozenset, Optional[str]] = {}
+
+    def _build_components(self, concept_to_category: Dict[str, List[str]]) -> List[int]:
+        """按父子关系（无向）合并连通分量，返回每个板块所属分量的代表序号"""
+        root = list(range(len(self.names)))
+
+        def find(position: int) -> int:
+            while root[position] != position:
+                root[position] = root[root[position]]
+                position = root[position]
+            return position
+
+        for child, parents in concept_to_category.items():
+            for parent in parents:
+                child_root, parent_root = find(self.index[child]), find(self.index[parent])
+                if child_root != parent_root:
+                    root[max(child_root, parent_root)] = min(child_root, parent_root)
+        return [find(position) for position in range(len(self.names))]
+
+    def bits_of(self, concepts: Iterable[str]) -> int:
+        bits = 0
+        for concept in concepts:
+            position = self.index.get(concept)
+            if position is not None:
+                bits |= 1 << position
+        return bits
+
+    def is_ancestor(self, ancestor: str, concept: str) -> bool:
+        position = self.index.get(concept)
+        ancestor_position = self.index.get(ancestor)
+        if position is None or ancestor_position is None:
+            return False
+        return (self.ancestor_bits[position] >> ancestor_position) & 1 == 1
+
+    def lowest_common_ancestor(self, concepts: Iterable[str]) -> Optional[str]:
+        """
+        最近公共祖先（包含板块自身）：在所有公共祖先中，取到各板块链条位置最大值最小的一个，位置相同时取序号小的
+        """
+        key = frozenset(concepts)
+        if key in self._lca_cache:
+            return self._lca_cache[key]
+        if not key:
+            return None
+
+        positions = [self.index.get(concept) for concept in key]
+        if any(position is None for position in positions):
+            # 不在板块关系中的板块，祖先只有自身
+            result = next(iter(key)) if len(key) == 1 else None
+        else:
+            common = (1 << len(self.names)) - 1
+            for position in positions:
+                common &= self.ancestor_bits[position] | (1 << position)
+            result = None
+            best_depth = None
+            while common:
+                lowest_bit = common & -common
+                candidate = lowest_bit.bit_length() - 1
+                common ^= lowest_bit
+                depth = max(self.ancestor_rank[position][candidate] for position in positions)
+                if best_depth is None or depth < best_depth:
+                    best_depth = depth
+                    result = self.names[candidate]
+        self._lca_cache[key] = result
+        return result
+
+    def group_by_component(self, concepts: Iterable[str]) -> List[Set[str]]:
+        """按连通分量对板块分组，分组顺序为各分量在输入中首次出现的顺序，不在板块关系中的板块单独成组"""
+        groups: Dict[object, Set[str]] = {}
+        for concept in concepts:
+            position = self.index.get(concept)
+            component_key = self.component[position] if position is not None else ('unknown', concept)
+            groups.setdefault(component_key, set()).add(concept)
+        return list(groups.values())
+
+    def leaf_concepts(self, concepts: Set[str]) -> Set[str]:
+        """concepts 中没有子孙板块也在 concepts 中的板块"""
+        bits = self.bits_of(concepts)
+        return {
+            concept for concept in concepts
+            if concept not in self.index or not (self.descendant_bits[self.index[concept]] & bits)
+        }
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_lca_cache'] = {}
+        return state
 
 class ConceptRelations:
     def __init__(self):
@@ -13,17 +146,26 @@ class ConceptRelations:
         self.concept_to_chains = {}        # 板块的完整链条
         self.concept_to_descendants = {}  # 板块的所有子板块
 
+        self.closure: Optional[ConceptClosure] = None
+
         concept_file_path = get_project_path() / 'concept_category.json'
         self._load_concept_infos(concept_file_path)
 
     def _load_concept_infos(self, concept_file_path: str) -> None:
         """
-        加载板块数据并构建链条和反向索引
+        加载板块数据并构建链条、反向索引和闭包索引，构建结果按 JSON 文件哈希缓存到磁盘
         :param concept_file_path: 板块关系数据文件路径
         """
         # 加载父子关系数据
-        with open(concept_file_path, 'r', encoding='utf-8') as file:
-            self.concept_to_category = json.load(file)
+        with open(concept_file_path, 'rb') as file:
+            content = file.read()
+        self.concept_to_category = json.loads(content.decode('utf-8'))
+
+        cache_path = CONCEPT_CLOSURE_CACHE_DIR / f"v{CONCEPT_CLOSURE_CACHE_VERSION}_{hashlib.sha256(content).hexdigest()[:16]}.pkl"
+        cached = self._load_closure_cache(cache_path)
+        if cached is not None:
+            self.concept_to_chains, self.concept_to_descendants, self.closure = cached
+            return
 
         # 构建完整链条
         for concept_name in self.concept_to_category.keys():
@@ -33,6 +175,35 @@ class ConceptRelations:
         # 构建反向索引
         self.concept_to_descendants = self._build_descendants()
 
+        # 构建闭包索引
+        self.closure = ConceptClosure(self.concept_to_category, self.concept_to_chains, self.concept_to_descendants)
+        self._save_closure_cache(cache_path)
+
+    @staticmethod
+    def _load_closure_cache(cache_path) -> Optional[Tuple[Dict[str, List[str]], Dict[str, Set[str]], ConceptClosure]]:
+        try:
+            with open(cache_path, 'rb') as file:
+                return pickle.load(file)
+        except FileNotFoundError:
+            return None
+        except (pickle.UnpicklingError, EOFError, AttributeError, ValueError) as e:
+            logging.error(f"读取板块关系缓存 {cache_path} 失败: {e}")
+            return None
+
+    def _save_closure_cache(self, cache_path) -> None:
+        """先写临时文件再替换，同时删除其它版本的缓存"""
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = cache_path.with_name(f"{cache_path.stem}.{os.getpid()}.tmp")
+            with open(tmp_path, 'wb') as file:
+                pickle.dump((self.concept_to_chains, self.concept_to_descendants, self.closure), file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+            for stale_path in cache_path.parent.glob('*.pkl'):
+                if stale_path != cache_path:
+                    stale_path.unlink(missing_ok=True)
+        except OSError as e:
+            logging.error(f"写入板块关系缓存 {cache_path} 失败: {e}")
+
     def _build_full_chain(self, concept_name: str, visited: Optional[Set[str]] = None) -> List[str]:
         """
         优化：递归构建板块的完整父辈关系链条，确保按从子到父依次展开父级板块
@@ -141,14 +312,15 @@ class ConceptRelations:
         :param child_concept: 待判断的子板块名称
         :return: True 如果 parent_concept 是 child_concept 的父辈，否则 False
         """
-        if child_concept not in self.concept_to_chains:
-            return False
+        return self.closure.is_ancestor(parent_concept, child_concept)
 
-        # 获取 child_concept 的完整父辈链条
-        parent_chain = self.concept_to_chains[child_concept]
-
-        # 检查 parent_concept 是否在链条中
-        return parent_concept in parent_chain
+    def lowest_common_ancestor(self, concepts: Iterable[str]) -> Optional[str]:
+        """
+        获取多个板块的最近公共祖先（包括板块自身）
+        :param concepts: 板块名称列表
+        :return: 最近公共祖先，没有公共祖先时返回 None
+        """
+        return self.closure.lowest_common_ancestor(concepts)
 
 conceptRelations = ConceptRelations()
 
@@ -14,7 +14,7 @@ from a_trade.trade_calendar import TradeCalendar
 from a_trade.stocks_daily_data import update_stocks_daily_data_until
 from a_trade.index_daily_data import update_index_data_until
 from a_trade.limit_up_data_tushare import update_limit_up_data_until, fetch_reason_types_from_wencai_util, process_frequent_reasons_during
-from a_trade.market_analysis import update_market_daily_data_during
+from a_trade.market_analysis import update_market_daily_data_until
 from a_trade.market_chart import plot_market_indicators_recent_month
 from a_trade.wechat_bot import WechatBot
 from a_trade.concept_manager import conceptManager
@@ -53,8 +53,8 @@ def main(today: str =None):
     # 获取今日涨跌停数据并插入数据库
     limit_date_start_date = update_limit_up_data_until(today)
     
-    # 分析市场情绪
-    update_market_daily_data_during(limit_date_start_date, today)
+    # 分析市场情绪（水位线之后的交易日，以及重新拉取了涨跌停数据的交易日）
+    update_market_daily_data_until(today, recompute_from=limit_date_start_date)
 
     # 更新板块数据
     new_concept_infos = conceptManager.update_concept_info()
@@ -4,15 +4,18 @@
 import os
 from a_trade.settings import get_project_path
 import datetime
-from sqlalchemy import create_engine, MetaData, Table, text, Engine
+from sqlalchemy import create_engine, MetaData, Table, Column, String, text, Engine, event, inspect, select, literal_column
 from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
 import logging
 import traceback
-from typing import List
+from typing import Any, Dict, List, Optional, Sequence
 from contextlib import contextmanager
+from dataclasses import dataclass
 import a_trade.settings
+import pandas as pd
 
 # 确保数据库目录存在
 db_dir = get_project_path() / 'db'
@@ -21,10 +24,187 @@ db_dir.mkdir(parents=True, exist_ok=True)
 # 数据库基础配置
 Base = declarative_base()
 
-# 主数据库配置
+def now_timestamp() -> str:
+    """当前时间字符串，精确到微秒，可按字符串顺序比较，用作记录的最后修改时间"""
+    return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+
+class SyncWatermark(Base):
+    """
+    增量处理水位线，按 (来源, 表名) 记录已处理到的位置：
+        - 数据库同步：保存在目标数据库中，来源为源数据库
+        - 派生数据计算：保存在主数据库中，来源为计算模块名，水位线为已计算到的交易日
+    """
+    __tablename__ = 'sync_watermark'
+    source = Column(String, primary_key=True)
+    table_name = Column(String, primary_key=True)
+    watermark = Column(String)
+    synced_at = Column(String)
+
+# SQLite 连接参数配置，通过环境变量 TRADE_DB_PROFILE 选择
+#   default: pysqlite 默认行为（回滚日志、synchronous=FULL）
+#   performance: WAL 日志、synchronous=NORMAL、大页缓存与内存映射，适用于每日数据更新
+#   backtest: 在 performance 基础上加大页缓存与内存映射，适用于大区间回测（回测过程中仍会写入分时数据与回测记录）
+SQLITE_PROFILES = {
+    'default': {
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+    },
+    'performance': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -262144,        # 负数单位为KB，即 256MB
+        'mmap_size': 1073741824,      # 1GB
+        'temp_store': 'MEMORY',
+        'busy_timeout': 30000,        # 毫秒
+    },
+    'backtest': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -524288,        # 512MB
+        'mmap_size': 4294967296,      # 4GB
+        'temp_store': 'MEMORY',
+        'busy_timeout': 30000,
+    },
+}
+TRADE_DB_PROFILE = os.getenv('TRADE_DB_PROFILE', 'performance')
+
+def apply_sqlite_profile(target_engine: Engine, profile: str) -> None:
+    """在每个新建的数据库连接上执行对应配置的 PRAGMA"""
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"未知的 SQLite 配置 {profile}, 可选: {list(SQLITE_PROFILES.keys())}")
+    pragmas = SQLITE_PROFILES[profile]
+
+    @event.listens_for(target_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+def create_sqlite_engine(db_path, profile: str = TRADE_DB_PROFILE) -> Engine:
+    """创建应用指定 PRAGMA 配置的 SQLite Engine"""
+    sqlite_engine = create_engine(f'sqlite:///{db_path}', echo=False)
+    apply_sqlite_profile(sqlite_engine, profile)
+    return sqlite_engine
+
+def create_trade_engine(db_url: str, profile: str = TRADE_DB_PROFILE) -> Engine:
+    """
+    根据数据库地址创建 Engine，支持 SQLite、PostgreSQL 与 DuckDB
+
+    参数:
+        db_url: str, SQLAlchemy 数据库地址，如 sqlite:///a_data.db、postgresql+pg8000://...、duckdb:///a_data.duckdb
+        profile: str, SQLite 的 PRAGMA 配置名称，其它数据库忽略
+
+    返回:
+        Engine: 数据库 Engine
+    """
+    if db_url.startswith('duckdb'):
+        try:
+            import duckdb_engine  # noqa: F401
+        except ImportError as e:
+            raise ImportError("使用 DuckDB 需要先安装 duckdb 与 duckdb-engine: pip install duckdb duckdb-engine") from e
+    target_engine = create_engine(db_url, echo=False)
+    if target_engine.dialect.name == 'sqlite':
+        apply_sqlite_profile(target_engine, profile)
+    return target_engine
+
+def upsert_statement(table: Table, index_elements: Sequence[str], update_columns: Optional[Sequence[str]] = None, bind: Engine = None):
+    """
+    构造与数据库方言匹配的 INSERT ... ON CONFLICT DO UPDATE 语句，可直接用于 executemany
+
+    参数:
+        table: Table, 目标表
+        index_elements: Sequence[str], 冲突判断所用的主键/唯一键列
+        update_columns: Sequence[str], 冲突时更新的列，默认为除冲突键以外的全部列；为空列表时冲突记录保持不变
+        bind: Engine, 目标数据库，默认主数据库
+
+    返回:
+        Insert: 待执行的语句，参数为列名 -> 值 的字典列表
+    """
+    bind = bind or engine
+    dialect_name = bind.dialect.name
+    if dialect_name == 'sqlite':
+        stmt = sqlite_insert(table)
+    elif dialect_name in ('postgresql', 'duckdb'):
+        # duckdb-engine 基于 PostgreSQL 方言，ON CONFLICT 语法一致
+        stmt = postgresql_insert(table)
+    else:
+        raise NotImplementedError(f"不支持的数据库类型: {dialect_name}")
+
+    if update_columns is None:
+        update_columns = [column.name for column in table.columns if column.name not in index_elements]
+    if not update_columns:
+        return stmt.on_conflict_do_nothing(index_elements=list(index_elements))
+    return stmt.on_conflict_do_update(
+        index_elements=list(index_elements),
+        set_={column_name: stmt.excluded[column_name] for column_name in update_columns}
+    )
+
+UPSERT_CHUNK_SIZE = 5000
+
+def dataframe_to_rows(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """将 DataFrame 转换为可直接用于 executemany 的字典列表，NaN 转为 None，numpy 标量转为 Python 类型"""
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+def bulk_upsert_dataframe(df: pd.DataFrame, model, column_map: Optional[Dict[str, str]] = None,
+                          constants: Optional[Dict[str, Any]] = None, chunk_size: int = UPSERT_CHUNK_SIZE,
+                          bind: Engine = None) -> int:
+    """
+    将 DataFrame 批量写入 ORM 模型对应的表，主键冲突时更新已有记录，替代逐行 session.merge
+
+    只写入 DataFrame（映射后）与 constants 中出现的模型列，冲突时也只更新这些列，
+    未出现的列保持原值，与 merge 未赋值属性的行为一致。全部批次在同一个事务中提交。
+
+    参数:
+        df: pd.DataFrame, 待写入的数据
+        model: ORM 模型类
+        column_map: Dict[str, str], DataFrame 列名 -> 模型列名 的映射，同名列无需填写
+        constants: Dict[str, Any], 所有行统一写入的列值
+        chunk_size: int, 每批写入的行数
+        bind: Engine, 目标数据库，默认主数据库
+
+    返回:
+        int: 写入的记录数
+    """
+    if df is None or df.empty:
+        return 0
+    bind = bind or engine
+    table = model.__table__
+    primary_keys = [column.name for column in table.primary_key.columns]
+
+    df = df.rename(columns=column_map or {})
+    df = df.loc[:, ~df.columns.duplicated(keep='last')]
+    for column_name, value in (constants or {}).items():
+        df[column_name] = value
+    columns = [column.name for column in table.columns if column.name in df.columns]
+    missing_keys = [key for key in primary_keys if key not in columns]
+    if missing_keys:
+        raise ValueError(f"写入 {table.name} 缺少主键列: {missing_keys}")
+
+    # 同一批次内主键重复时 PostgreSQL 的 ON CONFLICT 会报错，保留最后一条，与逐行 merge 结果一致
+    df = df[columns].drop_duplicates(subset=primary_keys, keep='last')
+    rows = dataframe_to_rows(df)
+    stmt = upsert_statement(
+        table,
+        index_elements=primary_keys,
+        update_columns=[name for name in columns if name not in primary_keys],
+        bind=bind
+    )
+    with bind.begin() as conn:
+        for start in range(0, len(rows), chunk_size):
+            conn.execute(stmt, rows[start:start + chunk_size])
+    return len(rows)
+
+# 主数据库配置，设置环境变量 TRADE_DB_URL 可切换到 PostgreSQL 或 DuckDB
 trade_db_path = db_dir / "a_data.db"
-TRADE_DB_URL = f'sqlite:///{trade_db_path}'
-engine = create_engine(TRADE_DB_URL, echo=False)
+TRADE_DB_URL = os.getenv('TRADE_DB_URL', f'sqlite:///{trade_db_path}')
+engine = create_trade_engine(TRADE_DB_URL, TRADE_DB_PROFILE)
+if engine.dialect.name == 'sqlite':
+    logging.debug(f"主数据库 SQLite 配置: {TRADE_DB_PROFILE}")
+else:
+    logging.debug(f"主数据库类型: {engine.dialect.name}")
 Session = sessionmaker(bind=engine)  # 主数据库全局持久化 Session
 Base.metadata.create_all(engine)
 
@@ -66,6 +246,41 @@ def add_column_for_table(table_name: str, column_name: str, column_type: type, d
     else:
         print(f"Column '{column_name}' already exists in '{table_name}'.")
 
+def _add_missing_columns(table: Table, bind: Engine) -> List[str]:
+    """为已存在的表补齐 table 中声明但数据库中缺失的列，返回新增的列名"""
+    existing_columns = {column['name'] for column in inspect(bind).get_columns(table.name)}
+    added_columns = []
+    with bind.begin() as conn:
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            column_type_str = column.type.compile(dialect=bind.dialect)
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type_str}"))
+            added_columns.append(column.name)
+    if added_columns:
+        logging.info(f"表 {table.name} 新增列: {added_columns}")
+    return added_columns
+
+def ensure_table_columns(model, bind: Engine = None) -> None:
+    """为已存在的表补齐 ORM 模型中新增的列（create_all 不会修改已存在的表）"""
+    bind = bind or engine
+    table = model.__table__
+    if not inspect(bind).has_table(table.name):
+        return
+    _add_missing_columns(table, bind)
+
+def create_model_indexes(model, bind: Engine = None) -> None:
+    """
+    为已存在的表补建 ORM 模型中声明的索引（create_all 只在建表时创建索引）。
+    大表建索引耗时较长，只在迁移命令（db_index_advisor --create）中调用，不要在模块导入时调用
+    """
+    bind = bind or engine
+    table = model.__table__
+    if not inspect(bind).has_table(table.name):
+        return
+    for index in table.indexes:
+        index.create(bind=bind, checkfirst=True)
+
 def get_recent_trade_date_in_table(table_name: str, field_name: str = 'trade_date', default_start_date: str = '20200101') -> str:
     """获取数据库表中的最近交易日期"""
     session = Session()
@@ -83,6 +298,28 @@ def get_recent_trade_date_in_table(table_name: str, field_name: str = 'trade_dat
     finally:
         session.close()
 
+def read_watermark(source: str, table_name: str, bind: Engine = None) -> Optional[str]:
+    """读取水位线，不存在时返回 None"""
+    bind = bind or engine
+    SyncWatermark.__table__.create(bind=bind, checkfirst=True)
+    with bind.connect() as conn:
+        return conn.execute(
+            select(SyncWatermark.watermark).where(
+                SyncWatermark.source == source,
+                SyncWatermark.table_name == table_name
+            )
+        ).scalar()
+
+def write_watermark(source: str, table_name: str, watermark: str, bind: Engine = None) -> None:
+    """写入（覆盖）水位线"""
+    bind = bind or engine
+    SyncWatermark.__table__.create(bind=bind, checkfirst=True)
+    with bind.begin() as conn:
+        conn.execute(
+            upsert_statement(SyncWatermark.__table__, ['source', 'table_name'], bind=bind),
+            {'source': source, 'table_name': table_name, 'watermark': watermark, 'synced_at': now_timestamp()}
+        )
+
 def rename_table(old_table_name: str, new_table_name: str) -> None:
     """重命名数据库中的数据表"""
     alter_sql = text(f"ALTER TABLE {old_table_name} RENAME TO {new_table_name}")
@@ -103,19 +340,21 @@ def rename_column(table_name: str, old_column_name: str, new_column_name: str) -
     except SQLAlchemyError as e:
         print(f"Error renaming column: {e}")
 
-def copy_table(source_engine: Engine, target_engine: Engine, table_name: str, primary_key_columns: List[str]) -> None:
+COPY_BATCH_SIZE = 5000
+
+def copy_table(source_engine: Engine, target_engine: Engine, table_name: str, primary_key_columns: List[str],
+               batch_size: int = COPY_BATCH_SIZE) -> None:
     """
     将指定表的数据从源数据库复制到目标数据库，使用UPSERT处理主键冲突。
+    源表按批流式读取，每批写入后单独提交，内存占用与表大小无关，中断后重新执行即可继续覆盖写入。
 
     参数：
         source_engine (Engine): 源数据库的SQLAlchemy Engine对象。
         target_engine (Engine): 目标数据库的SQLAlchemy Engine对象。
         table_name (str): 要复制的数据表名称。
         primary_key_columns (list): 主键列的名称列表，用于处理唯一约束冲突。
+        batch_size (int): 每批读取与写入的记录数。
     """
-    source_session = sessionmaker(bind=source_engine)()
-    target_session = sessionmaker(bind=target_engine)()
-    
     try:
         # 获取源表结构
         source_metadata = MetaData()
@@ -125,8 +364,9 @@ def copy_table(source_engine: Engine, target_engine: Engine, table_name: str, pr
         target_metadata = MetaData()
         target_metadata.reflect(bind=target_engine)
         if table_name not in target_metadata.tables:
-            # 创建表
-            source_table.create(bind=target_engine)
+            # 创建表，优先使用 ORM 模型中的定义以便在不同类型数据库之间迁移
+            model_table = Base.metadata.tables.get(table_name)
+            (model_table if model_table is not None else source_table).create(bind=target_engine)
             logging.info(f"在目标数据库中创建表 {table_name}")
             # 重新反射以获取新创建的表
             target_metadata.reflect(bind=target_engine)
@@ -135,27 +375,28 @@ def copy_table(source_engine: Engine, target_engine: Engine, table_name: str, pr
         
         # 获取目标表
         target_table = target_metadata.tables[table_name]
+        column_names = [column.name for column in source_table.columns if column.name in target_table.columns]
+        stmt = upsert_statement(
+            target_table,
+            index_elements=primary_key_columns,
+            update_columns=[name for name in column_names if name not in primary_key_columns],
+            bind=target_engine
+        )
         
-        # 从源表读取所有数据
-        data = source_session.query(source_table).all()
+        # 从源表分批读取并写入
+        copied_count = 0
+        with source_engine.connect() as source_conn:
+            result = source_conn.execution_options(yield_per=batch_size).execute(
+                select(*[source_table.c[name] for name in column_names])
+            )
+            for partition in result.mappings().partitions(batch_size):
+                with target_engine.begin() as target_conn:
+                    target_conn.execute(stmt, [dict(row) for row in partition])
+                copied_count += len(partition)
+                logging.debug(f"表 {table_name} 已复制 {copied_count} 条记录")
         
-        if data:
-            # 将每一行数据转换为字典
-            rows = [
-                {column.name: getattr(row, column.name) for column in source_table.columns}
-                for row in data
-            ]
-            
-            # 使用事务进行批量插入或更新
-            with target_engine.begin() as conn:
-                for row in rows:
-                    stmt = sqlite_insert(target_table).values(**row)
-                    stmt = stmt.on_conflict_do_update(
-                        index_elements=primary_key_columns,  # 主键列
-                        set_=row
-                    )
-                    conn.execute(stmt)
-            logging.info(f"成功将表 {table_name} 的数据复制到目标数据库，共复制 {len(data)} 条记录")
+        if copied_count:
+            logging.info(f"成功将表 {table_name} 的数据复制到目标数据库，共复制 {copied_count} 条记录")
             
             # 验证插入的数据
             with target_engine.connect() as conn:
@@ -168,37 +409,156 @@ def copy_table(source_engine: Engine, target_engine: Engine, table_name: str, pr
     except Exception as e:
         logging.error(f"复制表 {table_name} 数据到目标数据库失败: {e}")
         logging.error(traceback.format_exc())
-    finally:
-        source_session.close()
-        target_session.close()
+
+@dataclass
+class SyncTableSpec:
+    """
+    增量同步的数据表配置
+
+    watermark_column 为空时使用 SQLite 的 rowid 作为水位线，只能发现新增的记录，适用于只追加的表；
+    否则使用该列（如最后修改时间、交易日期）作为水位线，每次同步大于等于上次水位线的记录，
+    该列需为可按字符串顺序比较的值。
+    """
+    table_name: str
+    primary_key_columns: List[str]
+    watermark_column: Optional[str] = None
+
+# 需要在主数据库与云端增量数据库之间同步的表
+SYNC_TABLE_SPECS = [
+    SyncTableSpec('limit_reason_to_concept', ['limit_reason'], watermark_column='updated_at'),
+]
+SYNC_BATCH_SIZE = 2000
+
+def _engine_identity(target_engine: Engine) -> str:
+    return target_engine.url.render_as_string(hide_password=True)
+
+def _prepare_sync_target(source_table: Table, target_engine: Engine) -> Table:
+    """目标表不存在时创建，存在时补齐源表中新增的列"""
+    if not inspect(target_engine).has_table(source_table.name):
+        model_table = Base.metadata.tables.get(source_table.name)
+        (model_table if model_table is not None else source_table).create(bind=target_engine)
+        logging.info(f"在目标数据库中创建表 {source_table.name}")
+    else:
+        _add_missing_columns(source_table, target_engine)
+    return Table(source_table.name, MetaData(), autoload_with=target_engine)
+
+def sync_table(source_engine: Engine, target_engine: Engine, spec: SyncTableSpec, batch_size: int = SYNC_BATCH_SIZE) -> int:
+    """
+    按水位线将源数据库中新增或修改的记录增量同步到目标数据库
+
+    水位线记录在目标数据库的 sync_watermark 表中，与数据写入在同一事务内提交。
+    首次同步（无水位线）时复制全部记录。
+
+    参数:
+        source_engine: Engine, 源数据库
+        target_engine: Engine, 目标数据库
+        spec: SyncTableSpec, 同步配置
+        batch_size: int, 每批读取与写入的记录数
+
+    返回:
+        int: 同步的记录数
+    """
+    if spec.watermark_column is None and source_engine.dialect.name != 'sqlite':
+        raise ValueError(f"表 {spec.table_name} 使用 rowid 水位线，仅支持 SQLite 源数据库")
+
+    source_table = Table(spec.table_name, MetaData(), autoload_with=source_engine)
+    target_table = _prepare_sync_target(source_table, target_engine)
+    SyncWatermark.__table__.create(bind=target_engine, checkfirst=True)
+    source_name = _engine_identity(source_engine)
+
+    with target_engine.connect() as conn:
+        last_watermark = conn.execute(
+            select(SyncWatermark.watermark).where(
+                SyncWatermark.source == source_name,
+                SyncWatermark.table_name == spec.table_name
+            )
+        ).scalar()
+
+    column_names = [column.name for column in source_table.columns if column.name in target_table.columns]
+    if spec.watermark_column is None:
+        watermark_expr = literal_column('rowid')
+        last_value = int(last_watermark) if last_watermark is not None else None
+    else:
+        watermark_expr = source_table.c[spec.watermark_column]
+        last_value = last_watermark
+    stmt = select(*[source_table.c[name] for name in column_names], watermark_expr.label('_sync_watermark'))
+    if last_value is not None:
+        # rowid 唯一，取大于；修改时间/交易日期可能重复，取大于等于，重复写入的记录由 upsert 保证幂等
+        stmt = stmt.where(watermark_expr > last_value if spec.watermark_column is None else watermark_expr >= last_value)
+    stmt = stmt.order_by(watermark_expr)
+
+    upsert = upsert_statement(
+        target_table,
+        index_elements=spec.primary_key_columns,
+        update_columns=[name for name in column_names if name not in spec.primary_key_columns],
+        bind=target_engine
+    )
+    synced_count = 0
+    new_watermark = last_watermark
+    with source_engine.connect() as source_conn, target_engine.begin() as target_conn:
+        result = source_conn.execution_options(yield_per=batch_size).execute(stmt)
+        for partition in result.mappings().partitions(batch_size):
+            target_conn.execute(upsert, [{name: row[name] for name in column_names} for row in partition])
+            synced_count += len(partition)
+            batch_watermark = partition[-1]['_sync_watermark']
+            if batch_watermark is not None:
+                new_watermark = str(batch_watermark)
+
+        if new_watermark is None:
+            # 源表为空或水位线列全为空（加列前的历史记录），记录最小水位线，避免下次再次全量同步
+            new_watermark = '0' if spec.watermark_column is None else ''
+        if new_watermark != last_watermark:
+            target_conn.execute(
+                upsert_statement(SyncWatermark.__table__, ['source', 'table_name'], bind=target_engine),
+                {'source': source_name, 'table_name': spec.table_name, 'watermark': new_watermark, 'synced_at': now_timestamp()}
+            )
+
+    logging.info(f"表 {spec.table_name} 增量同步 {synced_count} 条记录, 水位线 {last_watermark} -> {new_watermark}")
+    return synced_count
+
+def sync_tables(source_engine: Engine, target_engine: Engine, specs: Optional[List[SyncTableSpec]] = None) -> Dict[str, int]:
+    """按配置增量同步多张表，单张表失败不影响其它表"""
+    results = {}
+    for spec in specs or SYNC_TABLE_SPECS:
+        try:
+            results[spec.table_name] = sync_table(source_engine, target_engine, spec)
+        except Exception as e:
+            logging.error(f"增量同步表 {spec.table_name} 失败: {e}")
+            logging.error(traceback.format_exc())
+    return results
 
 def merge_db_data_from_base_to_sync() -> None:
-    tables_to_sync = {
-        'limit_reason_to_concept': ['limit_reason'],
-    }
     sync_engine = initialize_sync_db()
-    for table_name, primary_key_columns in tables_to_sync.items():
-        copy_table(
-            source_engine=engine,
-            target_engine=sync_engine,
-            table_name=table_name,
-            primary_key_columns=primary_key_columns
-        )
+    sync_tables(source_engine=engine, target_engine=sync_engine)
     logging.info('数据已同步至云端增量数据库')
 
 def merge_db_data_from_sync_to_base() -> None:
-    tables_to_sync = {
-        'limit_reason_to_concept': ['limit_reason'],
-    }
     sync_engine = initialize_sync_db()
-    for table_name, primary_key_columns in tables_to_sync.items():
+    sync_tables(source_engine=sync_engine, target_engine=engine)
+    logging.info('数据已同步至云端主数据库')
+
+def migrate_trade_db(target_db_url: str, table_names: Optional[List[str]] = None) -> None:
+    """
+    将主数据库中的行情数据表整体复制到另一个数据库（如 DuckDB），完成后设置 TRADE_DB_URL 指向新库即可切换
+
+    参数:
+        target_db_url: str, 目标数据库地址
+        table_names: List[str], 需要复制的表，默认复制主数据库中已注册 ORM 模型的全部表
+    """
+    target_engine = create_trade_engine(target_db_url)
+    source_table_names = set(inspect(engine).get_table_names())
+    tables: Dict[str, Table] = {
+        name: table for name, table in Base.metadata.tables.items()
+        if name in source_table_names and (table_names is None or name in table_names)
+    }
+    for table_name, table in tables.items():
         copy_table(
-            source_engine=sync_engine,
-            target_engine=engine,
+            source_engine=engine,
+            target_engine=target_engine,
             table_name=table_name,
-            primary_key_columns=primary_key_columns
+            primary_key_columns=[column.name for column in table.primary_key.columns]
         )
-    logging.info('数据已同步至云端主数据库')
+    logging.info(f"已将 {len(tables)} 张表复制到 {target_engine.url.render_as_string(hide_password=True)}")
 
 if __name__ == "__main__":
     # 使用示例：增加新列
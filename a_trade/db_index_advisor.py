@@ -0,0 +1,150 @@
+# coding: utf-8
+# 文件：db_index_advisor.py
+
+"""
+索引检查工具。
+
+对项目中高频查询的语句形态执行 EXPLAIN QUERY PLAN，找出全表扫描。
+新增高频查询时，在 QUERY_SHAPES 中补充对应的语句形态，运行本工具确认命中索引。
+
+索引不在导入模块时创建（大表建索引耗时很长），新增或调整索引后需显式运行一次 --create 迁移。
+
+用法:
+    python -m a_trade.db_index_advisor [--create]
+
+    --create: 先删除已废弃的索引，再为已存在的表补建 ORM 模型中声明的索引
+"""
+
+import sys
+import logging
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy import select, func, case, text
+
+from a_trade.db_base import engine, create_model_indexes
+from a_trade.stock_minute_data import StockMinuteData
+from a_trade.stocks_daily_data import StockDailyData
+from a_trade.trade_calendar import TradeCalendar
+from a_trade.limit_up_data_tushare import LimitUpTushare
+from a_trade.limit_attribution import LimitDailyAttribution
+
+INDEXED_MODELS = [StockMinuteData, StockDailyData, LimitUpTushare, LimitDailyAttribution]
+# 已被新索引取代、迁移时删除的索引
+OBSOLETE_INDEXES = ['ix_stock_minute_data_code_date', 'ix_stock_minute_data_trade_date']
+
+SAMPLE_DATE = '20240102'
+SAMPLE_CODES = ['000001.SZ', '600000.SH']
+
+# 查询名称 -> 构造语句的函数，语句形态与业务代码保持一致
+QUERY_SHAPES: Dict[str, Callable] = {
+    # StockDailyDataSource: 单只股票最近N日日线
+    'stocks_daily_data 按股票倒序取最近N日': lambda: select(StockDailyData).where(
+        StockDailyData.ts_code == SAMPLE_CODES[0],
+        StockDailyData.trade_date < SAMPLE_DATE
+    ).order_by(StockDailyData.trade_date.desc()).limit(5),
+    # get_stocks_daily_data: 多只股票日期区间
+    'stocks_daily_data 多股票日期区间': lambda: select(StockDailyData).where(
+        StockDailyData.ts_code.in_(SAMPLE_CODES),
+        StockDailyData.trade_date.between(SAMPLE_DATE, SAMPLE_DATE)
+    ),
+    # _calculate_market_daily_data: 全市场单日聚合
+    'stocks_daily_data 单日聚合': lambda: select(
+        func.sum(case((StockDailyData.pct_chg > 0, 1), else_=0)),
+        func.count()
+    ).where(StockDailyData.trade_date == SAMPLE_DATE),
+    # get_minute_data: 单只股票单日分时
+    'stock_minute_data 按股票与交易日': lambda: select(StockMinuteData).where(
+        StockMinuteData.stock_code == SAMPLE_CODES[0],
+        StockMinuteData.trade_date == SAMPLE_DATE
+    ).order_by(StockMinuteData.trade_time),
+    # get_minute_data_for_multiple_stocks / find_missing_minute_data
+    'stock_minute_data 多股票单日': lambda: select(StockMinuteData.stock_code).where(
+        StockMinuteData.trade_date == SAMPLE_DATE,
+        StockMinuteData.stock_code.in_(SAMPLE_CODES)
+    ).distinct(),
+    # calculate_avg_price: 单日全部分时
+    'stock_minute_data 单日全部': lambda: select(
+        StockMinuteData.stock_code, StockMinuteData.trade_time, StockMinuteData.amount, StockMinuteData.vol
+    ).where(StockMinuteData.trade_date == SAMPLE_DATE).order_by(StockMinuteData.stock_code, StockMinuteData.trade_time),
+    # LimitDataSource: 单日涨跌停数据
+    'limit_up_tushare 单日': lambda: select(LimitUpTushare).where(
+        LimitUpTushare.trade_date == SAMPLE_DATE
+    ).order_by(LimitUpTushare.first_time),
+    # find_recent_limit_up: 单只股票近期涨停
+    'limit_up_tushare 单股票近期涨停': lambda: select(LimitUpTushare).where(
+        LimitUpTushare.stock_code == SAMPLE_CODES[0],
+        LimitUpTushare.trade_date >= SAMPLE_DATE,
+        LimitUpTushare.trade_date < SAMPLE_DATE,
+        LimitUpTushare.limit_status == 'U'
+    ).order_by(LimitUpTushare.trade_date.desc()).limit(1),
+    # analysis_observed_stocks: 单日涨停归因
+    'limit_daily_attribution 单日': lambda: select(LimitDailyAttribution).where(
+        LimitDailyAttribution.trade_date == SAMPLE_DATE
+    ),
+    # TradeCalendar 索引加载
+    'trade_calendar 按交易所': lambda: select(TradeCalendar.cal_date, TradeCalendar.is_open).where(
+        TradeCalendar.exchange == 'SSE'
+    ).order_by(TradeCalendar.cal_date),
+}
+
+
+def migrate_indexes() -> None:
+    """删除已废弃的索引，并为已存在的表补建 ORM 模型中声明的索引"""
+    with engine.begin() as conn:
+        for index_name in OBSOLETE_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+    for model in INDEXED_MODELS:
+        logging.info(f"补建 {model.__tablename__} 的索引")
+        create_model_indexes(model)
+
+
+def explain_query(statement) -> List[str]:
+    """返回语句的 EXPLAIN QUERY PLAN 明细"""
+    sql = str(statement.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as conn:
+        rows = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+    return [row[-1] for row in rows]
+
+
+def is_full_scan(detail: str) -> bool:
+    """SCAN 且未使用任何索引即为全表扫描"""
+    detail = detail.upper()
+    return detail.startswith('SCAN') and 'USING' not in detail
+
+
+def check_query_shapes(shapes: Dict[str, Callable] = None) -> List[Tuple[str, str]]:
+    """
+    检查所有查询形态
+
+    返回:
+        List[Tuple[str, str]]: 出现全表扫描的 (查询名称, 执行计划明细) 列表
+    """
+    shapes = shapes or QUERY_SHAPES
+    full_scans = []
+    for name, build_statement in shapes.items():
+        try:
+            details = explain_query(build_statement())
+        except Exception as e:
+            logging.error(f"{name} 执行计划获取失败: {e}")
+            continue
+        for detail in details:
+            flag = '全表扫描' if is_full_scan(detail) else 'OK'
+            print(f"[{flag}] {name}: {detail}")
+            if is_full_scan(detail):
+                full_scans.append((name, detail))
+    return full_scans
+
+
+if __name__ == "__main__":
+    if engine.dialect.name != 'sqlite':
+        print(f"索引检查仅支持 SQLite，当前数据库类型: {engine.dialect.name}")
+        sys.exit(1)
+
+    if '--create' in sys.argv:
+        migrate_indexes()
+
+    full_scans = check_query_shapes()
+    if full_scans:
+        print(f"发现 {len(full_scans)} 处全表扫描")
+        sys.exit(1)
+    print("所有查询均命中索引")
@@ -4,7 +4,7 @@
 import logging
 from a_trade.settings import _get_tushare
 from sqlalchemy import Column, String, Float
-from a_trade.db_base import Session, Base
+from a_trade.db_base import Session, Base, bulk_upsert_dataframe
 from a_trade.trade_calendar import TradeCalendar
 
 class IndexDailyData(Base):
@@ -34,29 +34,10 @@ def update_index_data(ts_code: str, start_date: str, end_date: str) -> None:
     index_data = _get_tushare().pro_api().index_daily(ts_code=ts_code, start_date=start_date, end_date=end_date)
     logging.debug(index_data)
 
-    session = Session()
     try:
-        for _, row in index_data.iterrows():
-            new_record = IndexDailyData(
-                ts_code=row['ts_code'],
-                trade_date=row['trade_date'],
-                close=row['close'],
-                open=row['open'],
-                high=row['high'],
-                low=row['low'],
-                pre_close=row['pre_close'],
-                change=row['change'],
-                pct_chg=row['pct_chg'],
-                vol=row['vol'],
-                amount=row['amount']
-            )
-            session.merge(new_record)
-        session.commit()
+        bulk_upsert_dataframe(index_data, IndexDailyData)
     except Exception as e:
-        session.rollback()
         logging.error(f"指数日线数据更新失败: {e}")
-    finally:
-        session.close()
 
 def update_index_data_until(end_date: str) -> None:
     """更新所有主要指数数据直到指定日期
@@ -0,0 +1,107 @@
+# coding: utf-8
+# 文件：keyword_automaton.py
+
+"""
+多模式关键词匹配（Aho-Corasick 自动机）。
+
+所有关键词构建为一棵字典树并补齐失配指针，一次线性扫描即可找出文本中出现的全部关键词，
+耗时与关键词数量无关。新增关键词时直接插入字典树，失配指针在下一次匹配前统一重建。
+"""
+
+from collections import deque
+from typing import Dict, Hashable, Iterable, Iterator, List, Optional, Set, Tuple
+
+
+class KeywordAutomaton:
+    def __init__(self, keywords: Iterable[Tuple[str, Hashable]] = ()):
+        """
+        参数:
+            keywords: Iterable[Tuple[str, Hashable]], (关键词, 关联值) 列表，同一关键词可关联多个值
+        """
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # 以该节点结尾的关键词，非关键词结尾为 None
+        self._terminal: List[Optional[str]] = [None]
+        # 沿失配指针能到达的最近一个关键词结尾节点
+        self._output_link: List[int] = [0]
+        self._payloads: Dict[str, Set[Hashable]] = {}
+        self._linked = True
+        for keyword, payload in keywords:
+            self.add(keyword, payload)
+
+    def __len__(self) -> int:
+        return len(self._payloads)
+
+    def __contains__(self, keyword: str) -> bool:
+        return keyword in self._payloads
+
+    def add(self, keyword: str, payload: Hashable = None) -> None:
+        """插入关键词，空字符串忽略"""
+        if not keyword:
+            return
+        node = 0
+        for char in keyword:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._terminal.append(None)
+                self._output_link.append(0)
+                self._linked = False
+            node = next_node
+        if self._terminal[node] is None:
+            self._terminal[node] = keyword
+            self._linked = False
+        self._payloads.setdefault(keyword, set()).add(payload)
+
+    def _link(self) -> None:
+        """按层序遍历重建失配指针与输出指针"""
+        queue = deque()
+        for child in self._goto[0].values():
+            self._fail[child] = 0
+            self._output_link[child] = 0
+            queue.append(child)
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(char, 0)
+                self._fail[child] = fail
+                self._output_link[child] = fail if self._terminal[fail] is not None else self._output_link[fail]
+                queue.append(child)
+        self._linked = True
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, str]]:
+        """
+        扫描文本，按结束位置顺序返回全部命中（包含重叠命中）
+
+        返回:
+            Iterator[Tuple[int, int, str]]: (起始下标, 结束下标(不含), 关键词)
+        """
+        if not self._linked:
+            self._link()
+        goto, fail, terminal, output_link = self._goto, self._fail, self._terminal, self._output_link
+        node = 0
+        for index, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            output = node if terminal[node] is not None else output_link[node]
+            while output:
+                keyword = terminal[output]
+                yield index + 1 - len(keyword), index + 1, keyword
+                output = output_link[output]
+
+    def match(self, text: str) -> Set[Hashable]:
+        """返回文本中出现的全部关键词的关联值"""
+        result = set()
+        for _, _, keyword in self.iter_matches(text):
+            result |= self._payloads[keyword]
+        return result
+
+    def payloads(self, keyword: str) -> Set[Hashable]:
+        return self._payloads.get(keyword, set())
@@ -3,7 +3,7 @@
 
 import logging
 import datetime
-from sqlalchemy import Column, String, Float, Integer, func, and_
+from sqlalchemy import Column, String, Float, Integer, Index, func, and_
 from sqlalchemy.sql import exists
 from a_trade.db_base import engine, Base, Session, get_recent_trade_date_in_table
 from a_trade.trade_calendar import TradeCalendar
@@ -42,6 +42,10 @@ class LimitDailyAttribution(Base):
     concept_code = Column(String)
     concept_name = Column(String, primary_key=True)
 
+    __table_args__ = (
+        Index('ix_limit_daily_attribution_trade_date', 'trade_date'),
+    )
+
 file_manager = None
 
 def update_limit_daily_attribution_util(end_date):
@@ -427,6 +431,15 @@ def _sum_up_concept_stocks(concept_to_stocks, stock_code_to_name):
 
 
 # 对涨停股票进行题材日内归因
+def _split_reason_type(reason_type):
+    """按第一个出现的分隔符拆分涨停原因类别，没有分隔符时返回整个字符串"""
+    separators = ['+', '＋', ' ']
+    for sep in separators:
+        reasons = reason_type.split(sep)
+        if len(reasons) > 1:
+            return reasons
+    return [reason_type]
+
 def _update_limit_daily_attribution_for_day(trade_date):
     logging.info(f"开始对{trade_date}涨停股票日内归因")
     session = Session()
@@ -438,6 +451,11 @@ def _update_limit_daily_attribution_for_day(trade_date):
     stock_code_to_name = {}
     concept_to_stocks = {}  # 题材板块名称到今日涨停股票
     stocks_with_effect = set()
+
+    # 未记录的涨停原因先批量并发归因
+    reasonConceptManager.prefetch_reasons([
+        reason for stock in limit_up_stocks if stock.reason_type for reason in _split_reason_type(stock.reason_type)
+    ])
     logging.info(f"{trade_date} 第一次归类开始: 优先处理有涨停原因AI参考的股票")
     i = 0
     while True:
@@ -454,14 +472,7 @@ def _update_limit_daily_attribution_for_day(trade_date):
                 continue
 
             # 获取涨停原因类别
-            separators = ['+', '＋', ' ']
-            reasons = [reason_type]  # 默认值为整个字符串
-            for sep in separators:
-                new_reasons = reason_type.split(sep)
-                if len(new_reasons) > 1:
-                    reasons = new_reasons
-                    break
-                
+            reasons = _split_reason_type(reason_type)
             reason = reasons[i] if i < len(reasons) else None
             if reason is not None and has_available_reason == False:
                 has_available_reason = True
@@ -7,15 +7,20 @@ import logging
 import time
 import requests
 import pywencai
+import numpy as np
 import pandas as pd
-from typing import Optional, Dict
+from typing import Optional, Dict, List, Iterable, Tuple
 import sys
+from collections import Counter
 
 from a_trade.settings import _get_tushare
-from a_trade.trade_calendar import TradeCalendar
-from a_trade.stocks_daily_data import get_previous_trade_date, StockDailyData
-from sqlalchemy import Column, String, Float, Integer, func
-from a_trade.db_base import Session, get_recent_trade_date_in_table,Base
+from a_trade.trade_calendar import TradeCalendar, tradeCalendarIndex
+from a_trade.stocks_daily_data import StockDailyData, t_limit_open_condition
+from sqlalchemy import Column, String, Float, Integer, Boolean, Index, func, update, bindparam
+from a_trade.db_base import Session, engine, get_recent_trade_date_in_table, Base, ensure_table_columns, bulk_upsert_dataframe
+from a_trade.stock_minute_data import (
+    get_minute_columns_for_multiple_stocks, t_limit_from_columns, limit_open_minutes_from_columns, is_strong_limit_up_base_minute_data
+)
 from a_trade.trade_utils import code_with_exchange, timestamp_in_millis, strip_stock_name
 
 # 获取 pywencai 的日志记录器
@@ -33,6 +38,9 @@ pywencai_logger.addHandler(file_handler)
 # 确保 pywencai 的日志级别合适
 pywencai_logger.setLevel(logging.INFO)
 
+# 连板数计算时按股票代码分批查询的批大小（SQLite 单条语句的参数个数有限）
+LIMIT_STREAK_QUERY_CHUNK_SIZE = 500
+
 # 定义数据库模型
 class LimitUpTushare(Base):
     __tablename__ = 'limit_up_tushare'
@@ -58,6 +66,13 @@ class LimitUpTushare(Base):
     end_date = Column(String)
     continuous_limit_up_count = Column(Integer)
     reason_type = Column(String)
+    # 基于分时数据的派生字段，由 update_limit_minute_flags 计算，is_t_limit 为空表示尚未计算
+    is_t_limit = Column(Boolean)
+    limit_open_minutes = Column(Integer)  # 首次封板到最后封板之间的开板分钟数，日线判定为强势板时不计算
+
+    __table_args__ = (
+        Index('ix_limit_up_tushare_code_status_date', 'stock_code', 'limit_status', 'trade_date'),
+    )
 
     def get_daily_data(self):    
         with Session() as session:
@@ -81,6 +96,10 @@ class LimitUpTushare(Base):
     def __repr__(self):
         return f"<LimitUpTushare(stock_code={self.stock_code}, trade_time={self.trade_date}, stock_name={self.stock_name})>"
 
+# 创建表格（如果不存在的话），分时与日线数据写入时会清空本表的分时派生字段
+Base.metadata.create_all(engine)
+ensure_table_columns(LimitUpTushare)
+
 class LimitDataSource():
     def __init__(self, trade_date):
         self.trade_date = trade_date
@@ -115,8 +134,14 @@ class LimitDataSource():
             }
 
             # 初始化内存缓存
-            self.pct_chg_cache = {}
+            # (股票代码, 天数) -> 累计涨幅
+            self.pct_chg_cache: Dict[Tuple[str, int], float] = {}
+            self.pct_chg_cache_hits = 0
+            self.pct_chg_cache_misses = 0
             self.daily_data_cache = {}
+            self.t_limit_cache: Dict[str, bool] = {
+                record.stock_code: record.is_t_limit for record in result if record.is_t_limit is not None
+            }
             self.load_daily_data()
 
     def get_name_to_code(self):
@@ -166,67 +191,249 @@ class LimitDataSource():
                 return daily_data
         assert False, f"{stock_code} {self.trade_date}没有日线数据"
 
-    def get_pct_chg(self, stock_code):
+    def _up_stat_days(self, stock_code: str) -> int:
+        """up_stat（N天M板）中的天数，没有 up_stat 时为 0"""
+        up_stat = self.all_limit_map[stock_code].up_stat
+        return int(up_stat.split('/')[1]) if up_stat else 0
+
+    def get_pct_chg(self, stock_code: str, days: Optional[int] = None) -> float:
         """
         获取指定股票在指定周期内的涨幅（带缓存）。
         
         :param stock_code: 股票代码
-        :param days: 涨幅计算的天数
+        :param days: 涨幅计算的天数，默认取 up_stat 中的天数
         :return: 涨幅值（百分比）
         """
         limit_data = self.all_limit_map.get(stock_code)
-        days_ago = 0
-        if limit_data.up_stat:
-            boards, days_ago = map(int, limit_data.up_stat.split('/'))
+        days_ago = self._up_stat_days(stock_code) if days is None else days
 
-        if not limit_data.up_stat or days_ago == 0:
-            logging.info(f"{limit_data.stock_name} {days_ago}天{boards}板 累计涨幅 0.0")
+        if days_ago == 0:
+            logging.info(f"{limit_data.stock_name} {limit_data.up_stat} 累计涨幅 0.0")
             return 0.0
 
         # 检查缓存
-        if (stock_code, days_ago) in self.pct_chg_cache:
-            logging.info(f"{limit_data.stock_name} {days_ago}天{boards}板 累计涨幅 {self.pct_chg_cache[stock_code]}")
-            return self.pct_chg_cache[stock_code]
+        cache_key = (stock_code, days_ago)
+        if cache_key in self.pct_chg_cache:
+            self.pct_chg_cache_hits += 1
+            logging.info(f"{limit_data.stock_name} {days_ago}天 累计涨幅 {self.pct_chg_cache[cache_key]}")
+            return self.pct_chg_cache[cache_key]
+        self.pct_chg_cache_misses += 1
 
         # 查询数据库，获取 start_date 和 trade_date 的收盘价
         with Session() as session:
-            daily_data = session.query(StockDailyData).filter(
+            daily_data = session.query(StockDailyData.open, StockDailyData.close).filter(
                 StockDailyData.ts_code == stock_code,
                 StockDailyData.trade_date <= self.trade_date
             ).order_by(StockDailyData.trade_date.desc()).limit(days_ago + 1).all()
+        pct_chg = self._compute_pct_chg(stock_code, days_ago, [row.open for row in daily_data], [row.close for row in daily_data])
+        logging.info(f"{limit_data.stock_name} {days_ago}天 累计涨幅 {pct_chg}")
+        return pct_chg
+
+    def _compute_pct_chg(self, stock_code: str, days_ago: int, opens: List[float], closes: List[float]) -> float:
+        """
+        根据按交易日倒序排列的开盘价、收盘价计算 days_ago 天累计涨幅并写入缓存。
+        数据不足 days_ago 天时返回 0.0 且不缓存；恰好 days_ago 天视为新股，涨幅为 0.0
+        """
+        limit_data = self.all_limit_map[stock_code]
         # 检查数据完整性
-        if len(daily_data) < days_ago:
+        if len(closes) < days_ago:
             logging.error(f"股票 {limit_data.stock_name} 在 {self.trade_date} 之前的数据不足 {days_ago} 天，无法计算涨幅")
             return 0.0
-        
-        # 检查是否包含跌停数据
-        # for day in daily_data:
-        #     if day.pct_chg and day.pct_chg <= -9.8:
-        #         logging.info(f"股票 {stock_code} 包含跌停数据，累计涨幅视为 0.0")
-        #         self.pct_chg_cache[stock_code] = 0.0
-        #         return 0.0
-
-        if len(daily_data) == days_ago:
-            # 新股情况：取第一天开盘价作为起始值
+
+        if len(closes) == days_ago:
+            # 新股情况：累计涨幅视为 0.0
             logging.info(f"股票 {stock_code} {limit_data.stock_name} 是新股，累计涨幅视为 0.0")
-            self.pct_chg_cache[stock_code] = 0.0
-            return 0.0
-            # start_data = daily_data[-1]
-            # close_start = start_data.open
+            pct_chg = 0.0
         else:
             # 正常情况：取倒数第 days_ago+1 天的收盘价作为起始值
-            start_data = daily_data[-1]
-            close_start = start_data.close if start_data.close else start_data.open
+            close_start = closes[days_ago] if closes[days_ago] else opens[days_ago]
+            close_end = closes[0]     # 最近一个交易日的收盘价
+            pct_chg = round((close_end - close_start) / close_start * 100, 2)
 
-        close_end = daily_data[0].close     # 最近一个交易日的收盘价
+        self.pct_chg_cache[(stock_code, days_ago)] = pct_chg
+        return pct_chg
 
-        # 计算涨幅
-        pct_chg = round((close_end - close_start) / close_start * 100, 2)
+    def preload_pct_chg(self, horizons: Iterable[int] = (), stock_codes: Optional[Iterable[str]] = None) -> int:
+        """
+        一次查询加载多只股票最近若干个交易日的日线，批量计算累计涨幅写入缓存。
 
-        # 缓存结果
-        self.pct_chg_cache[stock_code] = pct_chg
-        logging.info(f"{limit_data.stock_name} {days_ago}天{boards}板 累计涨幅 {self.pct_chg_cache[stock_code]}")
-        return pct_chg
+        :param horizons: 额外计算的天数，每只股票还会计算其 up_stat 中的天数
+        :param stock_codes: 股票代码，默认为涨停与炸板股票
+        :return: 新写入缓存的条目数
+        """
+        if stock_codes is None:
+            stock_codes = list(self.limit_up_map.keys()) + list(self.limit_failed_map.keys())
+        horizons = {int(days) for days in horizons if days > 0}
+        pending: Dict[str, List[int]] = {}
+        for stock_code in dict.fromkeys(stock_codes):
+            days_list = horizons | {self._up_stat_days(stock_code)} - {0}
+            days_list = [days for days in days_list if (stock_code, days) not in self.pct_chg_cache]
+            if days_list:
+                pending[stock_code] = days_list
+        if not pending:
+            return 0
+
+        max_days = max(max(days_list) for days_list in pending.values())
+        # 窗口函数之前按交易日历限定日期下界，避免对每只股票的全部历史日线排序；
+        # 期间停牌导致日线不足的股票再不设下界单独查询，结果与不设下界一致
+        try:
+            start_date = TradeCalendar.get_previous_trade_date(self.trade_date, max_days)
+        except ValueError:
+            start_date = None
+        with Session() as session:
+            rows = self._query_recent_daily_rows(session, list(pending.keys()), max_days + 1, start_date)
+            if start_date is not None:
+                row_counts = Counter(row[0] for row in rows)
+                short_codes = {stock_code for stock_code in pending if row_counts[stock_code] < max_days + 1}
+                if short_codes:
+                    rows = [row for row in rows if row[0] not in short_codes]
+                    rows += self._query_recent_daily_rows(session, list(short_codes), max_days + 1)
+
+        frame = pd.DataFrame(rows, columns=['ts_code', 'row_number', 'open', 'close'])
+        # 行：股票代码，列：倒数第几个交易日（0 为当日）
+        closes = frame.pivot(index='ts_code', columns='row_number', values='close').reindex(columns=range(1, max_days + 2))
+        opens = frame.pivot(index='ts_code', columns='row_number', values='open').reindex(columns=range(1, max_days + 2))
+        counts = frame.groupby('ts_code').size()
+        close_values = closes.to_numpy(dtype=float)
+        open_values = opens.to_numpy(dtype=float)
+        # 起始价取收盘价，收盘价缺失时取开盘价
+        start_values = np.where(np.isnan(close_values) | (close_values == 0), open_values, close_values)
+        pct_values = (close_values[:, [0]] - start_values) / start_values * 100
+        positions = {stock_code: index for index, stock_code in enumerate(closes.index)}
+
+        loaded = 0
+        for stock_code, days_list in pending.items():
+            count = int(counts.get(stock_code, 0))
+            for days_ago in days_list:
+                if count < days_ago:
+                    logging.error(f"股票 {self.all_limit_map[stock_code].stock_name} 在 {self.trade_date} 之前的数据不足 {days_ago} 天，无法计算涨幅")
+                    continue
+                self.pct_chg_cache[(stock_code, days_ago)] = 0.0 if count == days_ago else round(float(pct_values[positions[stock_code], days_ago]), 2)
+                loaded += 1
+        logging.info(f"{self.trade_date} 批量计算累计涨幅 {len(pending)} 只股票, 写入缓存 {loaded} 条")
+        return loaded
+
+    def _query_recent_daily_rows(self, session, stock_codes: List[str], limit: int, start_date: Optional[str] = None) -> List[Tuple]:
+        """查询每只股票截至当日最近 limit 个交易日的 (股票代码, 倒数序号, 开盘价, 收盘价)，start_date 为日期下界"""
+        row_number = func.row_number().over(
+            partition_by=StockDailyData.ts_code,
+            order_by=StockDailyData.trade_date.desc()
+        ).label('row_number')
+        filters = [
+            StockDailyData.ts_code.in_(stock_codes),
+            StockDailyData.trade_date <= self.trade_date
+        ]
+        if start_date is not None:
+            filters.append(StockDailyData.trade_date >= start_date)
+        recent = session.query(StockDailyData.ts_code, StockDailyData.open, StockDailyData.close, row_number).filter(*filters).subquery()
+        return session.query(recent.c.ts_code, recent.c.row_number, recent.c.open, recent.c.close).filter(
+            recent.c.row_number <= limit
+        ).all()
+
+    def pct_chg_cache_stats(self) -> Dict[str, int]:
+        """累计涨幅缓存的命中、未命中次数及缓存条目数"""
+        return {
+            'hits': self.pct_chg_cache_hits,
+            'misses': self.pct_chg_cache_misses,
+            'size': len(self.pct_chg_cache),
+        }
+
+    def load_minute_flags(self, stock_codes: Optional[Iterable[str]] = None) -> int:
+        """
+        批量计算并持久化T字板、开板时长等分时派生字段，已计算过的股票直接读取数据库中的值
+
+        :param stock_codes: 股票代码，默认为涨停与炸板股票
+        :return: 本次读取的股票数
+        """
+        if stock_codes is None:
+            stock_codes = list(self.limit_up_map.keys()) + list(self.limit_failed_map.keys())
+        pending = [stock_code for stock_code in dict.fromkeys(stock_codes) if stock_code not in self.t_limit_cache]
+        if not pending:
+            return 0
+        flags = update_limit_minute_flags(self.trade_date, pending)
+        for stock_code, (is_t_limit, limit_open_minutes) in flags.items():
+            self.t_limit_cache[stock_code] = is_t_limit
+            record = self.all_limit_map.get(stock_code)
+            if record is not None:
+                record.is_t_limit = is_t_limit
+                record.limit_open_minutes = limit_open_minutes
+        return len(flags)
+
+    def is_t_limit(self, stock_code: str) -> bool:
+        """T字板判定（带缓存），优先使用持久化的派生字段，只有日线满足T字板形态的股票才会加载分时数据"""
+        if stock_code not in self.t_limit_cache:
+            self.load_minute_flags([stock_code])
+        if stock_code not in self.t_limit_cache:
+            self.t_limit_cache[stock_code] = self.get_daily_data(stock_code).is_t_limit()
+        return self.t_limit_cache[stock_code]
+
+    def strength_frame(self, stock_codes: Iterable[str]) -> pd.DataFrame:
+        """
+        批量计算股票强度比较所需的字段，索引为股票代码，顺序与传入顺序一致。
+
+        列:
+            is_limit_up: 是否涨停（炸板、跌停为 False）
+            continuous_limit_up_count: 连板数
+            is_t_limit: 是否T字板，仅对涨停股票计算
+            last_time: 最后封板时间（HHMMSS 数值）
+            recent_pct_chg: up_stat 周期内的累计涨幅
+        """
+        stock_codes = list(stock_codes)
+        missing = [stock_code for stock_code in stock_codes if stock_code not in self.all_limit_map]
+        if missing:
+            raise ValueError(f"股票代码{missing} {self.trade_date}不存在或不在交易数据中")
+        records = [self.all_limit_map[stock_code] for stock_code in stock_codes]
+        frame = pd.DataFrame({
+            'is_limit_up': [stock_code in self.limit_up_map for stock_code in stock_codes],
+            'continuous_limit_up_count': [record.continuous_limit_up_count or 0 for record in records],
+            'last_time': pd.to_numeric([record.last_time for record in records], errors='coerce'),
+        }, index=pd.Index(stock_codes, name='stock_code'))
+        frame['last_time'] = frame['last_time'].fillna(np.inf)
+
+        # T字板只对涨停股票计算
+        is_t_limit = np.zeros(len(stock_codes), dtype=bool)
+        limit_up_positions = np.flatnonzero(frame['is_limit_up'].to_numpy())
+        self.load_minute_flags([stock_codes[position] for position in limit_up_positions])
+        for position in limit_up_positions:
+            is_t_limit[position] = self.is_t_limit(stock_codes[position])
+        frame['is_t_limit'] = is_t_limit
+
+        self.preload_pct_chg(stock_codes=stock_codes)
+        frame['recent_pct_chg'] = [self.get_pct_chg(stock_code) for stock_code in stock_codes]
+        return frame
+
+    def rank_by_strength(self, stock_codes: Iterable[str], frame: pd.DataFrame = None) -> List[str]:
+        """
+        按强度从强到弱排序，排序结果与按传入顺序逐只调用 compare_stock_strength 的擂台结果一致：
+            涨停 > 非涨停；涨停之间依次比较连板数、T字板、最后封板时间（早者强），完全相同时后出现者强；
+            非涨停之间先出现者强
+        """
+        stock_codes = list(stock_codes)
+        if not stock_codes:
+            return []
+        frame = frame if frame is not None else self.strength_frame(stock_codes)
+        frame = frame.loc[stock_codes]
+        is_limit_up = frame['is_limit_up'].to_numpy()
+        position = np.arange(len(stock_codes))
+        keys = (
+            np.where(is_limit_up, position, -position),                                    # 同等强度的先后顺序
+            np.where(is_limit_up, -frame['last_time'].to_numpy(), 0),                     # 封板时间早者强
+            np.where(is_limit_up, frame['is_t_limit'].to_numpy(), False),                 # T字板强
+            np.where(is_limit_up, frame['continuous_limit_up_count'].to_numpy(), 0),      # 连板数高者强
+            is_limit_up,                                                                   # 涨停强
+        )
+        order = np.lexsort(keys)[::-1]
+        return [stock_codes[i] for i in order]
+
+    def rank_by_recent_height(self, stock_codes: Iterable[str], frame: pd.DataFrame = None) -> List[str]:
+        """按近期累计涨幅从高到低排序，涨幅相同时后出现者在前，与 compare_stock_recent_height 的擂台结果一致"""
+        stock_codes = list(stock_codes)
+        if not stock_codes:
+            return []
+        frame = frame if frame is not None else self.strength_frame(stock_codes)
+        pct_chg = frame.loc[stock_codes, 'recent_pct_chg'].to_numpy()
+        order = np.lexsort((np.arange(len(stock_codes)), pct_chg))[::-1]
+        return [stock_codes[i] for i in order]
 
     def compare_stock_strength(self, stock_code_a, stock_code_b):
         """
@@ -299,6 +506,120 @@ def is_strong_stock_base_limit_data(data: LimitUpTushare):
         return data.limit_status == 'U' and data.open_times < 1
     return False
 
+def update_limit_minute_flags(trade_date: str, stock_codes: Optional[Iterable[str]] = None, force: bool = False) -> Dict[str, Tuple[bool, Optional[int]]]:
+    """
+    批量计算涨停、炸板股票的分时派生字段并写回 limit_up_tushare：
+        is_t_limit: 日线满足T字板形态的股票，用分时数据确认封板后是否再开板，其余股票为 False
+        limit_open_minutes: 日线不能判定为强势板的涨停股票，首次封板到最后封板之间的开板分钟数
+    所需分时数据一次性加载，已计算过的记录直接返回数据库中的值。
+
+    :param trade_date: 交易日
+    :param stock_codes: 股票代码，默认为当日全部涨停与炸板股票
+    :param force: 是否重新计算已计算过的记录
+    :return: 股票代码 -> (is_t_limit, limit_open_minutes)，缺少日线数据的股票不返回
+    """
+    with Session() as session:
+        query = session.query(LimitUpTushare).filter(
+            LimitUpTushare.trade_date == trade_date,
+            LimitUpTushare.limit_status.in_(['U', 'Z'])
+        )
+        if stock_codes is not None:
+            query = query.filter(LimitUpTushare.stock_code.in_(list(stock_codes)))
+        records = query.all()
+        pending = [record for record in records if force or record.is_t_limit is None]
+        flags = {
+            record.stock_code: (record.is_t_limit, record.limit_open_minutes)
+            for record in records if not (force or record.is_t_limit is None)
+        }
+        if not pending:
+            return flags
+
+        daily_map = {
+            data.ts_code: data for data in session.query(StockDailyData).filter(
+                StockDailyData.ts_code.in_([record.stock_code for record in pending]),
+                StockDailyData.trade_date == trade_date
+            ).all()
+        }
+    missing = [record.stock_code for record in pending if record.stock_code not in daily_map]
+    if missing:
+        logging.error(f"{trade_date} 股票 {missing} 缺少日线数据，无法计算分时派生字段")
+    pending = [record for record in pending if record.stock_code in daily_map]
+    if not pending:
+        return flags
+
+    # 日线层面向量化筛选：T字板候选、需要统计开板时长的涨停股票
+    daily = [daily_map[record.stock_code] for record in pending]
+    open_price = np.array([data.open for data in daily], dtype=float)
+    high = np.array([data.high for data in daily], dtype=float)
+    low = np.array([data.low for data in daily], dtype=float)
+    close = np.array([data.close for data in daily], dtype=float)
+    pre_close = np.array([data.pre_close for data in daily], dtype=float)
+    t_candidate = ((open_price * 100 / pre_close - 100) > t_limit_open_condition) & (high - 0.02 <= close) & (open_price - low > (close - open_price) * 0.6)
+    need_open_minutes = np.array([
+        record.limit_status == 'U' and not (record.open_times is not None and record.open_times < 1)
+        and record.first_time is not None and record.last_time is not None
+        for record in pending
+    ], dtype=bool)
+
+    need_minutes = t_candidate | need_open_minutes
+    columns_by_stock = get_minute_columns_for_multiple_stocks(
+        [record.stock_code for record, needed in zip(pending, need_minutes) if needed], trade_date)
+
+    params = []
+    for index, record in enumerate(pending):
+        is_t_limit = bool(t_candidate[index]) and t_limit_from_columns(columns_by_stock[record.stock_code], pre_close[index], high[index])
+        limit_open_minutes = limit_open_minutes_from_columns(
+            columns_by_stock[record.stock_code], record.close, record.first_time, record.last_time) if need_open_minutes[index] else None
+        flags[record.stock_code] = (is_t_limit, limit_open_minutes)
+        params.append({'b_trade_date': trade_date, 'b_stock_code': record.stock_code, 'b_is_t_limit': is_t_limit, 'b_limit_open_minutes': limit_open_minutes})
+
+    stmt = (
+        update(LimitUpTushare.__table__)
+        .where(LimitUpTushare.__table__.c.trade_date == bindparam('b_trade_date'))
+        .where(LimitUpTushare.__table__.c.stock_code == bindparam('b_stock_code'))
+        .values(is_t_limit=bindparam('b_is_t_limit'), limit_open_minutes=bindparam('b_limit_open_minutes'))
+    )
+    try:
+        with engine.begin() as conn:
+            conn.execute(stmt, params)
+    except Exception as e:
+        logging.error(f"{trade_date} 分时派生字段写入失败: {e}")
+    logging.info(f"{trade_date} 计算分时派生字段 {len(params)} 只股票, 加载分时数据 {len(columns_by_stock)} 只")
+    return flags
+
+def clear_limit_minute_flags(trade_date: str, stock_codes: Optional[Iterable[str]] = None) -> int:
+    """
+    分时数据或日线数据重新写入后清空对应股票的分时派生字段，下次读取时由 update_limit_minute_flags 重新计算
+
+    :param trade_date: 交易日
+    :param stock_codes: 股票代码，默认为当日全部股票
+    :return: 清空的记录数
+    """
+    stmt = update(LimitUpTushare.__table__).where(
+        LimitUpTushare.__table__.c.trade_date == trade_date,
+        LimitUpTushare.__table__.c.is_t_limit.isnot(None)
+    ).values(is_t_limit=None, limit_open_minutes=None)
+    if stock_codes is not None:
+        stmt = stmt.where(LimitUpTushare.__table__.c.stock_code.in_(list(stock_codes)))
+    with engine.begin() as conn:
+        return conn.execute(stmt).rowcount
+
+def is_strong_limit_up(limit_info: LimitUpTushare, weak_limit_open_time: int = 10) -> bool:
+    """
+    强势板判定：日线未开板，或首次封板到最后封板之间开板时长小于 weak_limit_open_time 分钟。
+    开板时长优先读取持久化的派生字段，未计算时批量计算后写回
+    """
+    if is_strong_stock_base_limit_data(limit_info):
+        return True
+    if limit_info.is_t_limit is None:
+        flags = update_limit_minute_flags(limit_info.trade_date, [limit_info.stock_code])
+        if limit_info.stock_code in flags:
+            limit_info.is_t_limit, limit_info.limit_open_minutes = flags[limit_info.stock_code]
+    if limit_info.limit_open_minutes is not None:
+        logging.info(f"{limit_info.trade_date} {limit_info.stock_code} 分时强势板判断, 开板时长{limit_info.limit_open_minutes}分钟")
+        return limit_info.limit_open_minutes < weak_limit_open_time
+    return is_strong_limit_up_base_minute_data(limit_info.stock_code, limit_info.trade_date, limit_info.close, limit_info.first_time, limit_info.last_time, weak_limit_open_time)
+
 def find_recent_limit_up(stock_code: str, trade_date: str, pre_range: int) -> Optional[LimitUpTushare]:
     """
     查找指定股票在指定交易日之前 pre_range 个交易日内的最近一个涨停数据。
@@ -380,89 +701,170 @@ def update_limit_up_data(start_date, end_date):
     update_continuous_limit_up_count(start_date, end_date)
 
 def _write_to_db(data, start_date, end_date):
-    session = Session()
     try:
-        for _, row in data.iterrows():
-            new_record = LimitUpTushare(
-                trade_date=row['trade_date'],
-                stock_code=row['ts_code'],
-                stock_name=strip_stock_name(row['name']),
-                industry=row['industry'],
-                close=row['close'],
-                pct_chg=row['pct_chg'],
-                amount=row['amount'],
-                limit_amount=row['limit_amount'],
-                float_mv=row['float_mv'],
-                total_mv=row['total_mv'],
-                turnover_ratio=row['turnover_ratio'],
-                fd_amount=row['fd_amount'],
-                first_time=row['first_time'],
-                last_time=row['last_time'],
-                open_times=row['open_times'],
-                up_stat=row['up_stat'],
-                limit_times=row['limit_times'],
-                limit_status=row['limit'],
-                start_date=start_date,
-                end_date=end_date,
-                continuous_limit_up_count=0  # 初始化为0
-            )
-            session.merge(new_record)  # 使用merge方法保证主键重复时更新现有记录
-        session.commit()
+        data = data.assign(name=data['name'].map(strip_stock_name))
+        # 主键重复时更新现有记录，reason_type 等未返回的列保持原值
+        bulk_upsert_dataframe(
+            data,
+            LimitUpTushare,
+            column_map={'ts_code': 'stock_code', 'name': 'stock_name', 'limit': 'limit_status'},
+            constants={
+                'start_date': start_date,
+                'end_date': end_date,
+                'continuous_limit_up_count': 0,  # 初始化为0
+                # 分时派生字段依赖封板时间等涨停数据，重新写入后清空等待重新计算
+                'is_t_limit': None,
+                'limit_open_minutes': None
+            }
+        )
     except Exception as e:
-        session.rollback()
         logging.error(f"数据写入失败: {e}")
-    finally:
-        session.close()
+
+def _load_limit_streak_frame(session, start_date: str, end_date: str) -> pd.DataFrame:
+    """
+    加载区间内全部涨停表记录，以及区间内出现过的股票在区间开始前的最后一条记录（作为连板数起点）
+
+    返回:
+        pd.DataFrame: 列为 stock_code, trade_date, limit_status, stored_count, in_range，按股票、日期排序
+    """
+    columns = ['stock_code', 'trade_date', 'limit_status', 'stored_count']
+    in_range_rows = session.query(
+        LimitUpTushare.stock_code, LimitUpTushare.trade_date, LimitUpTushare.limit_status, LimitUpTushare.continuous_limit_up_count
+    ).filter(LimitUpTushare.trade_date.between(start_date, end_date)).all()
+    in_range = pd.DataFrame(in_range_rows, columns=columns).assign(in_range=True)
+    if in_range.empty:
+        return in_range
+
+    stock_codes = in_range.loc[in_range['limit_status'] == 'U', 'stock_code'].unique().tolist()
+    row_number = func.row_number().over(
+        partition_by=LimitUpTushare.stock_code,
+        order_by=LimitUpTushare.trade_date.desc()
+    ).label('row_number')
+    seed_rows = []
+    for offset in range(0, len(stock_codes), LIMIT_STREAK_QUERY_CHUNK_SIZE):
+        previous = session.query(
+            LimitUpTushare.stock_code, LimitUpTushare.trade_date, LimitUpTushare.limit_status, LimitUpTushare.continuous_limit_up_count, row_number
+        ).filter(
+            LimitUpTushare.stock_code.in_(stock_codes[offset:offset + LIMIT_STREAK_QUERY_CHUNK_SIZE]),
+            LimitUpTushare.trade_date < start_date
+        ).subquery()
+        seed_rows.extend(session.query(
+            previous.c.stock_code, previous.c.trade_date, previous.c.limit_status, previous.c.continuous_limit_up_count
+        ).filter(previous.c.row_number == 1).all())
+    seeds = pd.DataFrame(seed_rows, columns=columns).assign(in_range=False)
+
+    frame = pd.concat([seeds, in_range], ignore_index=True) if not seeds.empty else in_range
+    frame['stored_count'] = frame['stored_count'].fillna(0).astype(np.int64)
+    return frame.sort_values(['stock_code', 'trade_date'], kind='stable').reset_index(drop=True)
+
+def _load_previous_traded_dates(session, frame: pd.DataFrame, start_date: str, end_date: str) -> pd.Series:
+    """
+    查询需要判断停牌的涨停记录在日线中的上一有效交易日，一次窗口查询完成
+
+    返回:
+        pd.Series: 索引为 (stock_code, trade_date)，值为上一有效交易日
+    """
+    if frame.empty:
+        return pd.Series(dtype=object)
+    lower_date = frame['previous_date'].min()
+    daily = session.query(
+        StockDailyData.ts_code.label('ts_code'),
+        StockDailyData.trade_date.label('trade_date'),
+        func.lag(StockDailyData.trade_date).over(
+            partition_by=StockDailyData.ts_code,
+            order_by=StockDailyData.trade_date
+        ).label('previous_traded_date')
+    ).filter(StockDailyData.trade_date.between(lower_date, end_date)).subquery()
+    rows = session.query(daily.c.ts_code, daily.c.trade_date, daily.c.previous_traded_date).join(
+        LimitUpTushare,
+        (LimitUpTushare.stock_code == daily.c.ts_code) & (LimitUpTushare.trade_date == daily.c.trade_date)
+    ).filter(
+        LimitUpTushare.limit_status == 'U',
+        LimitUpTushare.trade_date.between(start_date, end_date)
+    ).all()
+    result = pd.DataFrame(rows, columns=['stock_code', 'trade_date', 'previous_traded_date'])
+    return result.set_index(['stock_code', 'trade_date'])['previous_traded_date']
+
+def _streak_links(frame: pd.DataFrame) -> Tuple[pd.Series, pd.Series]:
+    """
+    返回 (相连, 待判断停牌)：
+        相连: 与同一股票的上一条记录相隔一个交易日
+        待判断停牌: 区间内的涨停记录，上一条记录也是涨停但相隔多个交易日，需要结合日线判断是否停牌
+    """
+    ordinals = frame['trade_date'].map(tradeCalendarIndex.get().ordinal_map).astype(float)
+    same_stock = frame['stock_code'].eq(frame['stock_code'].shift())
+    linked = same_stock & ordinals.diff().eq(1)
+    is_limit_up = frame['limit_status'].eq('U')
+    suspension_gap = same_stock & ~linked & frame['in_range'] & is_limit_up & is_limit_up.shift(fill_value=False)
+    return linked, suspension_gap
+
+def compute_continuous_limit_up_counts(frame: pd.DataFrame, previous_traded_dates: Optional[pd.Series] = None) -> pd.Series:
+    """
+    按 (股票, 交易日序号) 计算区间内涨停记录的连板数。
+
+    记录与同一股票的上一条涨停表记录相连的条件：上一条记录在上一个交易日，或股票停牌（日线中的上一有效交易日即为上一条涨停记录的日期）。
+    相连时连板数为上一条记录的连板数 + 1（炸板、跌停记录的连板数为库中的值，即 0），否则为 1。
+
+    参数:
+        frame: pd.DataFrame, _load_limit_streak_frame 的结果
+        previous_traded_dates: pd.Series, 索引为 (stock_code, trade_date)，值为日线中的上一有效交易日
+
+    返回:
+        pd.Series: 与 frame 同索引，区间内涨停记录的连板数，其余记录为 NaN
+    """
+    linked, gap = _streak_links(frame)
+    previous_date = frame['trade_date'].shift()
+
+    # 相隔多个交易日的涨停记录，用日线中的上一有效交易日判断是否为停牌
+    if previous_traded_dates is not None and gap.any():
+        keys = pd.MultiIndex.from_arrays([frame.loc[gap, 'stock_code'], frame.loc[gap, 'trade_date']])
+        traded = pd.Series(previous_traded_dates.reindex(keys).to_numpy(), index=frame.index[gap])
+        linked.loc[gap] = traded.eq(previous_date.loc[gap]).to_numpy()
+
+    is_limit_up = frame['limit_status'].eq('U')
+    computed = frame['in_range'] & is_limit_up
+    # 连续的区间内涨停记录组成一段，段首的连板数由上一条记录决定，段内依次加 1
+    continues_run = linked & computed & computed.shift(fill_value=False)
+    run_id = (~continues_run).cumsum()
+    previous_count = frame['stored_count'].shift(fill_value=0)
+    run_start = np.where(linked, previous_count + 1, 1)
+    counts = pd.Series(run_start, index=frame.index).groupby(run_id).transform('first') + frame.groupby(run_id).cumcount()
+    return counts.where(computed)
 
 def update_continuous_limit_up_count(start_date, end_date):
+    """集合方式重新计算 [start_date, end_date] 区间内涨停记录的连板数，一次批量写回"""
     if not TradeCalendar.validate_date_range(start_date, end_date):
         return
-    
-    def update_continuous_limit_up_count_for_day(trade_date):
-        logging.info(f"计算 {trade_date} 连板数")
-        previous_date = TradeCalendar.get_previous_trade_date(trade_date)
-        today_data_source = LimitDataSource(trade_date)
-        pre_data_source = LimitDataSource(previous_date)
-
-        continuous_count = 0
-        update_batch = []
-        for stock_code, stock_record in today_data_source.limit_up_map.items():
-            if stock_code in pre_data_source.all_limit_map:      
-                previous_record = pre_data_source.all_limit_map[stock_code]
-                continuous_count = previous_record.continuous_limit_up_count + 1
-            else:
-                # 如果默认上一交易日无数据，使用动态查询上一有效交易日
-                actual_previous_date = get_previous_trade_date(trade_date, stock_code)
-                if actual_previous_date and actual_previous_date != previous_date:
-                    logging.info(f"{trade_date} {stock_code} 存在停牌，上一有效交易日 {actual_previous_date}")
-                    actual_previous_data_source = LimitDataSource(actual_previous_date)
-                    if stock_code in actual_previous_data_source.all_limit_map:
-                        previous_record = actual_previous_data_source.all_limit_map[stock_code]
-                        continuous_count = previous_record.continuous_limit_up_count + 1
-                    else:
-                        continuous_count = 1
-                else:
-                    continuous_count = 1
-
-            # 更新当前股票的连续涨停计数
-            update_batch.append({
-                'trade_date': stock_record.trade_date,
-                'stock_code': stock_code,
-                'continuous_limit_up_count': continuous_count
-            })
-
-        if update_batch:
-            session = Session()
-            try:
-                session.bulk_update_mappings(LimitUpTushare, update_batch)
-                session.commit()
-            except Exception as e:
-                session.rollback()
-                logging.error(f"更新连板计数失败: {e}")
-            finally:
-                session.close()
 
-    TradeCalendar.iterate_trade_days(start_date, end_date, update_continuous_limit_up_count_for_day)
+    start_time = time.time()
+    with Session() as session:
+        frame = _load_limit_streak_frame(session, start_date, end_date)
+        if frame.empty:
+            return
+        _, gap = _streak_links(frame)
+        previous_traded_dates = None
+        if gap.any():
+            gap_frame = frame.loc[gap, ['stock_code', 'trade_date']].assign(previous_date=frame['trade_date'].shift()[gap])
+            previous_traded_dates = _load_previous_traded_dates(session, gap_frame, start_date, end_date)
+
+    counts = compute_continuous_limit_up_counts(frame, previous_traded_dates)
+    computed = counts.notna()
+    update_batch = [
+        {'trade_date': trade_date, 'stock_code': stock_code, 'continuous_limit_up_count': int(count)}
+        for stock_code, trade_date, count in zip(frame.loc[computed, 'stock_code'], frame.loc[computed, 'trade_date'], counts[computed])
+    ]
+
+    if update_batch:
+        session = Session()
+        try:
+            session.bulk_update_mappings(LimitUpTushare, update_batch)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logging.error(f"更新连板计数失败: {e}")
+        finally:
+            session.close()
+    logging.info(f"计算 {start_date} - {end_date} 连板数, 共 {len(update_batch)} 条涨停记录, 耗时: {time.time() - start_time:.2f} 秒")
     
 def fetch_reason_types_from_limitpool(start_date, end_date):
     TradeCalendar.iterate_trade_days(start_date, end_date, fetch_reason_types_from_limitpool_for_day)
@@ -13,6 +13,7 @@ class TZTAICaller(LLMCaller):
         self.client = OpenAI(
             api_key=os.getenv("302AI_API_KEY"),
             base_url="https://api.302.ai/v1",
+            max_retries=0,
         )
 
     def extract_json_from_marked_string(self, input_string):
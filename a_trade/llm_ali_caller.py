@@ -16,6 +16,7 @@ class ALICaller(LLMCaller):
         self.client = OpenAI(
             api_key=os.getenv("ALI_API_KEY"),
             base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
+            max_retries=0,
         )
 
     def call_text_model_api(self, system_prompt: str, user_prompt: str = None, temperature: float = 0.1, max_tokens: int = 2000) -> str:
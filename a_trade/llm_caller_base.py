@@ -3,6 +3,10 @@
 from abc import ABC, abstractmethod
 
 class LLMCaller(ABC):
+    # 文本/多模态模型名称，用于响应缓存的键
+    text_model: str = None
+    visual_model: str = None
+
     @abstractmethod
     def call_text_model_api(
         self,
@@ -40,3 +44,9 @@ class LLMCaller(ABC):
         :return: 模型的响应文本
         """
         pass
+
+    def discard_last_response(self) -> None:
+        """
+        丢弃上一次调用的响应（如响应无法解析时），避免重试时再次命中缓存。无缓存的调用器无需处理。
+        """
+        pass
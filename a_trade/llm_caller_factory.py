@@ -12,11 +12,18 @@ class LLMCallerFactory:
     @staticmethod
     def get_caller(model_type: str) -> LLMCaller:
         """
-        根据模型类型返回相应的LLM调用器实例。
+        根据模型类型返回相应的LLM调用器实例。同一模型类型复用调用池中的同一个客户端，
+        并受调用池的并发、token 速率与重试限制，响应缓存由环境变量 LLM_CACHE 控制。
 
         :param model_type: 模型类型，如 'openai', 'doubao', 'deepseek'
         :return: LLMCaller的实例
         """
+        from a_trade.llm_caller_pool import llmCallerPool
+        return llmCallerPool.get_caller(model_type)
+
+    @staticmethod
+    def create_caller(model_type: str) -> LLMCaller:
+        """创建新的 LLM 调用器实例（每次都会新建 SDK 客户端）"""
         if model_type.lower() == "openai":
             return OpenAICaller()
         elif model_type.lower() == "doubao":
@@ -0,0 +1,219 @@
+# coding: utf-8
+# 文件：llm_caller_pool.py
+
+"""
+LLM 调用池。
+
+每个服务商只创建一次 SDK 客户端，并按服务商限制：
+    - 并发请求数
+    - 每分钟 token 数（令牌桶，按提示词长度 + max_tokens 预估）
+接口异常（不含 429 以外的 4xx）按指数退避重试，响应解析失败时丢弃缓存后重新请求，两者均有次数上限。
+接口重试只在这里进行，各服务商的 SDK 客户端均以 max_retries=0 创建，避免两层重试次数相乘。
+同步调用（LLMCallerFactory.get_caller 返回的调用器）与批量调用（map）共用同一套限制。
+"""
+
+import time
+import random
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from a_trade.llm_caller_base import LLMCaller
+
+# 图片请求的 token 预估值
+IMAGE_TOKEN_ESTIMATE = 1000
+# 解析失败时的最大重新请求次数
+LLM_PARSE_RETRIES = 2
+
+
+@dataclass
+class ProviderLimits:
+    max_concurrency: int = 4
+    tokens_per_minute: int = 60000
+    max_retries: int = 3           # 接口异常最大重试次数
+    base_delay: float = 1.0        # 首次重试等待秒数，之后每次翻倍
+    max_delay: float = 20.0        # 单次重试等待上限
+
+
+PROVIDER_LIMITS = {
+    'openai': ProviderLimits(max_concurrency=8, tokens_per_minute=150000),
+    'deepseek': ProviderLimits(max_concurrency=8, tokens_per_minute=100000),
+    'doubao': ProviderLimits(max_concurrency=4, tokens_per_minute=60000),
+    'kimi': ProviderLimits(max_concurrency=2, tokens_per_minute=32000),
+    'ali': ProviderLimits(max_concurrency=4, tokens_per_minute=60000),
+    '302ai': ProviderLimits(max_concurrency=4, tokens_per_minute=60000),
+}
+
+
+@dataclass
+class LLMRequest:
+    """
+    一次 LLM 请求。image_path 不为空时调用多模态接口。
+    parse 用于解析响应文本，抛出 ValueError/SyntaxError 视为解析失败并重新请求。
+    """
+    system_prompt: str
+    user_prompt: Optional[str] = None
+    image_path: Optional[str] = None
+    temperature: Optional[float] = None
+    max_tokens: int = 2000
+    parse: Optional[Callable[[str], Any]] = None
+
+    def estimate_tokens(self) -> int:
+        prompt_tokens = len(self.system_prompt or '') + len(self.user_prompt or '')
+        if self.image_path:
+            prompt_tokens += IMAGE_TOKEN_ESTIMATE
+        return prompt_tokens + self.max_tokens
+
+
+class TokenBucket:
+    """线程安全的令牌桶，容量为每分钟 token 数"""
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = float(tokens_per_minute)
+        self.rate = self.capacity / 60
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int) -> float:
+        """取出 tokens 个令牌，不足时阻塞等待，返回等待秒数"""
+        tokens = min(float(tokens), self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return waited
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class PooledLLMCaller(LLMCaller):
+    """按服务商限制并发与 token 速率、接口异常有限次重试的调用器，线程安全"""
+
+    def __init__(self, caller: LLMCaller, provider: str, limits: ProviderLimits):
+        self.caller = caller
+        self.provider = provider
+        self.limits = limits
+        self.bucket = TokenBucket(limits.tokens_per_minute)
+        self.semaphore = threading.BoundedSemaphore(limits.max_concurrency)
+
+    def __getattr__(self, name):
+        if name == 'caller':
+            raise AttributeError(name)
+        return getattr(self.caller, name)
+
+    @property
+    def text_model(self) -> Optional[str]:
+        return self.caller.text_model
+
+    @property
+    def visual_model(self) -> Optional[str]:
+        return self.caller.visual_model
+
+    def discard_last_response(self) -> None:
+        self.caller.discard_last_response()
+
+    def _call_with_retry(self, call: Callable[[], str], tokens: int) -> str:
+        limits = self.limits
+        for attempt in range(limits.max_retries + 1):
+            self.bucket.acquire(tokens)
+            try:
+                with self.semaphore:
+                    return call()
+            except Exception as e:
+                # 除限流(429)外的 4xx 错误重试无意义
+                status_code = getattr(e, 'status_code', None)
+                if isinstance(status_code, int) and 400 <= status_code < 500 and status_code != 429:
+                    raise
+                if attempt >= limits.max_retries:
+                    logging.error(f"{self.provider} 调用失败，已重试 {attempt} 次: {e}")
+                    raise
+                delay = min(limits.max_delay, limits.base_delay * (2 ** attempt)) * random.uniform(0.5, 1.0)
+                logging.warning(f"{self.provider} 调用失败: {e}，{delay:.1f} 秒后第 {attempt + 1} 次重试")
+                time.sleep(delay)
+
+    def call_text_model_api(self, system_prompt: str, user_prompt: str = None, temperature: float = None, max_tokens: int = 2000) -> str:
+        kwargs = {'max_tokens': max_tokens} if temperature is None else {'temperature': temperature, 'max_tokens': max_tokens}
+        tokens = LLMRequest(system_prompt, user_prompt, max_tokens=max_tokens).estimate_tokens()
+        return self._call_with_retry(lambda: self.caller.call_text_model_api(system_prompt, user_prompt, **kwargs), tokens)
+
+    def call_visual_model_api(self, system_prompt: str, image_path: str, temperature: float = None, max_tokens: int = 2000) -> str:
+        kwargs = {'max_tokens': max_tokens} if temperature is None else {'temperature': temperature, 'max_tokens': max_tokens}
+        tokens = LLMRequest(system_prompt, image_path=image_path, max_tokens=max_tokens).estimate_tokens()
+        return self._call_with_retry(lambda: self.caller.call_visual_model_api(system_prompt, image_path, **kwargs), tokens)
+
+
+class LLMCallerPool:
+    def __init__(self, limits: Dict[str, ProviderLimits] = None, parse_retries: int = LLM_PARSE_RETRIES):
+        self.limits = dict(PROVIDER_LIMITS, **(limits or {}))
+        self.parse_retries = parse_retries
+        self._callers: Dict[str, PooledLLMCaller] = {}
+        self._lock = threading.Lock()
+
+    def get_caller(self, provider: str) -> PooledLLMCaller:
+        """获取服务商的调用器，同一服务商只创建一次"""
+        provider = provider.lower()
+        with self._lock:
+            caller = self._callers.get(provider)
+            if caller is None:
+                from a_trade.llm_caller_factory import LLMCallerFactory
+                from a_trade.llm_response_cache import CachedLLMCaller, LLM_CACHE_ENABLED
+
+                caller = LLMCallerFactory.create_caller(provider)
+                if LLM_CACHE_ENABLED:
+                    caller = CachedLLMCaller(caller, provider)
+                caller = PooledLLMCaller(caller, provider, self.limits.get(provider, ProviderLimits()))
+                self._callers[provider] = caller
+            return caller
+
+    def call(self, provider: str, request: LLMRequest) -> Any:
+        """
+        同步执行一次请求，返回 request.parse 的结果（未指定 parse 时返回响应文本）。
+        解析失败超过 parse_retries 次后抛出最后一次的解析异常。
+        """
+        caller = self.get_caller(provider)
+        for attempt in range(self.parse_retries + 1):
+            if request.image_path:
+                response_text = caller.call_visual_model_api(request.system_prompt, request.image_path,
+                                                             temperature=request.temperature, max_tokens=request.max_tokens)
+            else:
+                response_text = caller.call_text_model_api(request.system_prompt, request.user_prompt,
+                                                           temperature=request.temperature, max_tokens=request.max_tokens)
+            if request.parse is None:
+                return response_text
+            try:
+                return request.parse(response_text)
+            except (ValueError, SyntaxError) as e:
+                caller.discard_last_response()
+                logging.error(f"{provider} 响应解析失败(第 {attempt + 1} 次): {e}, 返回文本是 {response_text}")
+                if attempt >= self.parse_retries:
+                    raise
+
+    async def acall(self, provider: str, request: LLMRequest) -> Any:
+        return await asyncio.to_thread(self.call, provider, request)
+
+    async def map_async(self, provider: str, requests: Sequence[LLMRequest], return_exceptions: bool = True) -> List[Any]:
+        """并发执行一批请求，结果与 requests 顺序一致；return_exceptions 为 True 时失败的请求返回异常对象"""
+        semaphore = asyncio.Semaphore(self.get_caller(provider).limits.max_concurrency)
+
+        async def run(request: LLMRequest) -> Any:
+            async with semaphore:
+                return await self.acall(provider, request)
+
+        return await asyncio.gather(*(run(request) for request in requests), return_exceptions=return_exceptions)
+
+    def map(self, provider: str, requests: Sequence[LLMRequest], return_exceptions: bool = True) -> List[Any]:
+        """map_async 的同步入口，不能在事件循环内调用"""
+        if not requests:
+            return []
+        return asyncio.run(self.map_async(provider, requests, return_exceptions))
+
+
+llmCallerPool = LLMCallerPool()
@@ -6,10 +6,11 @@ from a_trade.llm_caller_base import LLMCaller
 
 class DeepseekCaller(LLMCaller):
     def __init__(self):
-        
+        self.text_model = "deepseek-chat"
         self.client = OpenAI(
             api_key=os.getenv("DEEPSEEK_API_KEY"),
             base_url="https://api.deepseek.com/beta",
+            max_retries=0,
         )
 
     def call_text_model_api(self, system_prompt: str, user_prompt: str = None, temperature: float = 0, max_tokens: int = 2000) -> str:
@@ -26,7 +27,7 @@ class DeepseekCaller(LLMCaller):
 
             response = self.client.chat.completions.create(
                 messages=messages,
-                model="deepseek-chat",
+                model=self.text_model,
                 max_tokens=max_tokens,
                 temperature=temperature,
                 response_format={
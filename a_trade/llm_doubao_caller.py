@@ -13,6 +13,7 @@ class DoubaoCaller(LLMCaller):
         self.client = Ark(
             base_url='https://ark.cn-beijing.volces.com/api/v3',
             api_key=os.getenv('DOUBAO_API_KEY'),
+            max_retries=0,
         )
 
     
@@ -16,6 +16,7 @@ class KimiCaller(LLMCaller):
         self.client = OpenAI(
             api_key=os.getenv("KIMI_API_KEY"),
             base_url="https://api.moonshot.cn/v1",
+            max_retries=0,
         )
 
     def call_text_model_api(self, system_prompt: str, user_prompt: str = None, temperature: float = 0.1, max_tokens: int = 2000) -> str:
@@ -9,6 +9,7 @@ from a_trade.llm_caller_base import LLMCaller
 
 class OpenAICaller(LLMCaller):
     def __init__(self):
+        self.text_model = "gpt-4o"
         self.visual_model = "gpt-4-turbo"
         self.api_key = os.getenv("OPENAI_API_KEY")
         proxy_http_url = os.getenv('PROXY_HTTP')
@@ -20,11 +21,13 @@ class OpenAICaller(LLMCaller):
                     proxy=proxy_http_url,
                     transport=httpx.HTTPTransport(local_address="0.0.0.0"),
                     verify=False
-                )
+                ),
+                max_retries=0,
             )
         else:
             self.client = OpenAI(
-                api_key=self.api_key
+                api_key=self.api_key,
+                max_retries=0,
             )
     def call_text_model_api(self, system_prompt: str, user_prompt: str = None, temperature: float = 0, max_tokens: int = 2000) -> str:
         try:
@@ -39,7 +42,7 @@ class OpenAICaller(LLMCaller):
             
             response = self.client.chat.completions.create(
                 messages=messages,
-                model="gpt-4o",
+                model=self.text_model,
                 max_tokens=max_tokens,
                 temperature=temperature
             )
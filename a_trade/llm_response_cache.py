@@ -0,0 +1,200 @@
+# coding: utf-8
+# 文件：llm_response_cache.py
+
+"""
+LLM 响应持久化缓存。
+
+以 (服务商, 模型, 调用类型, 提示词, 图片内容, 生成参数) 的 SHA-256 作为键，将模型响应保存在独立的
+SQLite 文件 db/llm_cache.db 中（WAL 日志 + busy_timeout，多个进程可同时读写）。
+重新对历史区间做涨停归因或媒体图片解析时，相同的请求直接命中缓存，不再调用接口。
+
+环境变量:
+    LLM_CACHE=0 关闭缓存
+    LLM_CACHE_TTL_DAYS 缓存有效天数，默认 90
+"""
+
+import os
+import json
+import hashlib
+import logging
+import datetime
+import threading
+from typing import Optional
+
+from sqlalchemy import Column, String, Text, Index, select, delete
+from sqlalchemy.orm import declarative_base
+
+from a_trade.db_base import db_dir, create_sqlite_engine, upsert_statement, now_timestamp
+from a_trade.llm_caller_base import LLMCaller
+
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE', '1') != '0'
+LLM_CACHE_TTL_DAYS = float(os.getenv('LLM_CACHE_TTL_DAYS', '90'))
+
+LLMCacheBase = declarative_base()
+
+class LLMResponseCache(LLMCacheBase):
+    __tablename__ = 'llm_response_cache'
+    cache_key = Column(String, primary_key=True)
+    provider = Column(String, nullable=False)
+    model = Column(String)
+    call_type = Column(String, nullable=False)
+    response = Column(Text, nullable=False)
+    created_at = Column(String, nullable=False)
+    expires_at = Column(String, nullable=False)
+
+    __table_args__ = (
+        Index('ix_llm_response_cache_expires_at', 'expires_at'),
+    )
+
+llm_cache_db_path = db_dir / 'llm_cache.db'
+llm_cache_engine = create_sqlite_engine(llm_cache_db_path, 'performance')
+LLMCacheBase.metadata.create_all(llm_cache_engine)
+
+
+def llm_cache_key(provider: str, model: Optional[str], call_type: str, system_prompt: str, user_prompt: Optional[str] = None,
+                  image_bytes: Optional[bytes] = None, temperature: float = None, max_tokens: int = None) -> str:
+    """计算请求内容的 SHA-256 作为缓存键"""
+    payload = json.dumps({
+        'provider': provider,
+        'model': model,
+        'call_type': call_type,
+        'system_prompt': system_prompt,
+        'user_prompt': user_prompt,
+        'image': hashlib.sha256(image_bytes).hexdigest() if image_bytes is not None else None,
+        'temperature': temperature,
+        'max_tokens': max_tokens,
+    }, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def read_cached_response(cache_key: str) -> Optional[str]:
+    """读取未过期的缓存响应，不存在时返回 None"""
+    with llm_cache_engine.connect() as conn:
+        return conn.execute(
+            select(LLMResponseCache.response).where(
+                LLMResponseCache.cache_key == cache_key,
+                LLMResponseCache.expires_at > now_timestamp()
+            )
+        ).scalar()
+
+
+def write_cached_response(cache_key: str, provider: str, model: Optional[str], call_type: str, response: str,
+                          ttl_days: float = LLM_CACHE_TTL_DAYS) -> None:
+    """写入（覆盖）缓存响应"""
+    now = datetime.datetime.now()
+    with llm_cache_engine.begin() as conn:
+        conn.execute(
+            upsert_statement(LLMResponseCache.__table__, ['cache_key'], bind=llm_cache_engine),
+            {
+                'cache_key': cache_key,
+                'provider': provider,
+                'model': model,
+                'call_type': call_type,
+                'response': response,
+                'created_at': now.strftime("%Y-%m-%d %H:%M:%S.%f"),
+                'expires_at': (now + datetime.timedelta(days=ttl_days)).strftime("%Y-%m-%d %H:%M:%S.%f"),
+            }
+        )
+
+
+def delete_cached_response(cache_key: str) -> None:
+    """删除指定缓存"""
+    with llm_cache_engine.begin() as conn:
+        conn.execute(delete(LLMResponseCache).where(LLMResponseCache.cache_key == cache_key))
+
+
+def purge_expired_responses() -> int:
+    """删除已过期的缓存，返回删除条数"""
+    with llm_cache_engine.begin() as conn:
+        return conn.execute(delete(LLMResponseCache).where(LLMResponseCache.expires_at <= now_timestamp())).rowcount
+
+
+class CachedLLMCaller(LLMCaller):
+    """
+    为任意 LLMCaller 增加持久化缓存。接口异常与空响应不写入缓存。
+    """
+    _purged = False
+    _purge_lock = threading.Lock()
+
+    def __init__(self, caller: LLMCaller, provider: str, ttl_days: float = LLM_CACHE_TTL_DAYS):
+        self.caller = caller
+        self.provider = provider
+        self.ttl_days = ttl_days
+        self.hits = 0
+        self.misses = 0
+        # 每个线程记录自己上一次调用的缓存键，供调用池并发使用
+        self._local = threading.local()
+        with CachedLLMCaller._purge_lock:
+            if not CachedLLMCaller._purged:
+                CachedLLMCaller._purged = True
+                try:
+                    purged = purge_expired_responses()
+                    if purged:
+                        logging.info(f"清理过期 LLM 缓存 {purged} 条")
+                except Exception as e:
+                    logging.error(f"清理过期 LLM 缓存失败: {e}")
+
+    def __getattr__(self, name):
+        if name in ('caller', '_local'):
+            raise AttributeError(name)
+        return getattr(self.caller, name)
+
+    @property
+    def text_model(self) -> Optional[str]:
+        return self.caller.text_model
+
+    @property
+    def visual_model(self) -> Optional[str]:
+        return self.caller.visual_model
+
+    def discard_last_response(self) -> None:
+        cache_key = getattr(self._local, 'cache_key', None)
+        if cache_key is None:
+            return
+        try:
+            delete_cached_response(cache_key)
+        except Exception as e:
+            logging.error(f"删除 LLM 缓存失败: {e}")
+        self._local.cache_key = None
+
+    def _cached_call(self, model: Optional[str], call_type: str, cache_key: str, call) -> str:
+        self._local.cache_key = cache_key
+        try:
+            cached = read_cached_response(cache_key)
+        except Exception as e:
+            logging.error(f"读取 LLM 缓存失败: {e}")
+            cached = None
+        if cached is not None:
+            self.hits += 1
+            logging.debug(f"LLM 缓存命中 {self.provider}/{model} {cache_key[:12]}")
+            return cached
+
+        self.misses += 1
+        response = call()
+        if response and isinstance(response, str):
+            try:
+                write_cached_response(cache_key, self.provider, model, call_type, response, self.ttl_days)
+            except Exception as e:
+                logging.error(f"写入 LLM 缓存失败: {e}")
+        return response
+
+    def call_text_model_api(self, system_prompt: str, user_prompt: str = None, temperature: float = None, max_tokens: int = 2000) -> str:
+        model = self.text_model
+        cache_key = llm_cache_key(self.provider, model, 'text', system_prompt, user_prompt,
+                                  temperature=temperature, max_tokens=max_tokens)
+        # 未指定 temperature 时沿用各调用器自己的默认值
+        kwargs = {'max_tokens': max_tokens} if temperature is None else {'temperature': temperature, 'max_tokens': max_tokens}
+        return self._cached_call(model, 'text', cache_key,
+                                 lambda: self.caller.call_text_model_api(system_prompt, user_prompt, **kwargs))
+
+    def call_visual_model_api(self, system_prompt: str, image_path: str, temperature: float = None, max_tokens: int = 2000) -> str:
+        if not image_path or not os.path.exists(image_path):
+            return self.caller.call_visual_model_api(system_prompt, image_path)
+        with open(image_path, 'rb') as image_file:
+            image_bytes = image_file.read()
+        model = self.visual_model
+        cache_key = llm_cache_key(self.provider, model, 'visual', system_prompt, image_bytes=image_bytes,
+                                  temperature=temperature, max_tokens=max_tokens)
+        kwargs = {'max_tokens': max_tokens} if temperature is None else {'temperature': temperature, 'max_tokens': max_tokens}
+        return self._cached_call(model, 'visual', cache_key,
+                                 lambda: self.caller.call_visual_model_api(system_prompt, image_path, **kwargs))
@@ -4,14 +4,19 @@
 import logging
 import datetime
 import sys
+import time
 from typing import Dict, List, Optional, TypedDict
+import pandas as pd
 from sqlalchemy import Column, String, Integer, Float, func, case
-from a_trade.db_base import Session, Base
+from a_trade.db_base import Session, Base, get_recent_trade_date_in_table, read_watermark, write_watermark
 from a_trade.stocks_daily_data import get_stocks_daily_data, StockDailyData
 from a_trade.trade_calendar import TradeCalendar
 from a_trade.limit_up_data_tushare import LimitUpTushare, LimitDataSource
 import a_trade.settings
 
+# 市场情绪计算水位线的来源名，水位线为已计算到的交易日
+MARKET_ANALYSIS_WATERMARK_SOURCE = 'market_analysis'
+
 class MarketDailyDataDict(TypedDict):
     trade_date: str
     up_num: int
@@ -164,20 +169,155 @@ def _calculate_market_daily_data(trade_date: str) -> Optional[MarketDailyDataDic
     finally:
         session.close()
 
+def _rate(count: int, total: int) -> float:
+    return round(count / total, 2) if total > 0 else 0
+
+def _load_limit_frame(session, start_date: str, end_date: str) -> pd.DataFrame:
+    rows = session.query(
+        LimitUpTushare.trade_date, LimitUpTushare.stock_code, LimitUpTushare.limit_status, LimitUpTushare.close,
+        LimitUpTushare.amount, LimitUpTushare.open_times, LimitUpTushare.first_time, LimitUpTushare.continuous_limit_up_count
+    ).filter(LimitUpTushare.trade_date.between(start_date, end_date)).all()
+    frame = pd.DataFrame(rows, columns=['trade_date', 'stock_code', 'limit_status', 'close', 'amount', 'open_times', 'first_time', 'continuous_limit_up_count'])
+    frame['first_time'] = pd.to_numeric(frame['first_time'], errors='coerce')
+    frame['open_times'] = pd.to_numeric(frame['open_times'], errors='coerce')
+    frame['amount'] = pd.to_numeric(frame['amount'], errors='coerce')
+    return frame
+
+def calculate_market_daily_data_batch(start_date: str, end_date: str) -> List[MarketDailyDataDict]:
+    """
+    批量计算区间内每个交易日的市场情绪数据，结果与逐日调用 _calculate_market_daily_data 一致。
+
+    全市场涨跌家数为一次分组聚合查询；涨跌停数据与昨日涨停股票的次日日线各一次查询，
+    之后按交易日 groupby 计算，次日相关指标直接使用前一交易日的涨停数据，不再重复加载。
+    """
+    trade_days = TradeCalendar.get_trade_dates(start_date, end_date)
+    if not trade_days:
+        return []
+    prev_dates = {trade_date: TradeCalendar.get_previous_trade_date(trade_date) for trade_date in trade_days}
+    first_prev_date = prev_dates[trade_days[0]]
+
+    with Session() as session:
+        market_rows = session.query(
+            StockDailyData.trade_date,
+            func.sum(case((StockDailyData.pct_chg > 0, 1), else_=0)).label("up_num"),
+            func.sum(case((StockDailyData.pct_chg < 0, 1), else_=0)).label("down_num"),
+            func.count().label("a_total")
+        ).filter(
+            StockDailyData.trade_date.between(trade_days[0], trade_days[-1])
+        ).group_by(StockDailyData.trade_date).all()
+
+        limit_frame = _load_limit_frame(session, first_prev_date, trade_days[-1])
+
+        # 昨日涨停股票（非一字板、实体板）在当日的日线，按 (股票, 交易日) 一次查询
+        limit_up_frame = limit_frame[limit_frame['limit_status'] == 'U']
+        prev_limit_up = limit_up_frame[limit_up_frame['trade_date'] < trade_days[-1]]
+        next_daily_rows = []
+        if not prev_limit_up.empty:
+            next_daily_rows = session.query(StockDailyData.ts_code, StockDailyData.trade_date, StockDailyData.open, StockDailyData.close).filter(
+                StockDailyData.ts_code.in_(session.query(LimitUpTushare.stock_code).filter(
+                    LimitUpTushare.limit_status == 'U',
+                    LimitUpTushare.trade_date.between(first_prev_date, trade_days[-1])
+                ).distinct()),
+                StockDailyData.trade_date.between(trade_days[0], trade_days[-1])
+            ).all()
+    market_stats = {row.trade_date: row for row in market_rows}
+    next_daily = pd.DataFrame(next_daily_rows, columns=['stock_code', 'next_date', 'next_open', 'next_close'])
+
+    # 当日涨跌停统计
+    is_limit_up = limit_frame['limit_status'] == 'U'
+    stats = pd.DataFrame({
+        'trade_date': limit_frame['trade_date'],
+        'limit_up': is_limit_up,
+        'one_word': is_limit_up & (limit_frame['open_times'] == 0) & (limit_frame['first_time'] <= 93000),
+        'limit_up_amount': limit_frame['amount'].where(limit_frame['limit_status'].isin(['U', 'Z']), 0).fillna(0),
+        'limit_down': limit_frame['limit_status'] == 'D',
+        'blow_up': limit_frame['limit_status'] == 'Z',
+        'limit_up_count': limit_frame['continuous_limit_up_count'].where(is_limit_up),
+    }).groupby('trade_date').agg(
+        limit_up_num=('limit_up', 'sum'),
+        one_word_limit_up_num=('one_word', 'sum'),
+        limit_up_amount=('limit_up_amount', 'sum'),
+        limit_down_num=('limit_down', 'sum'),
+        blow_up_num=('blow_up', 'sum'),
+        highest_continuous_up_count=('limit_up_count', 'max'),
+    )
+
+    # 昨日涨停在当日的表现：按昨日涨停记录的次一交易日关联当日日线
+    next_date_map = {prev_date: trade_date for trade_date, prev_date in prev_dates.items()}
+    prev_records = limit_up_frame.assign(next_date=limit_up_frame['trade_date'].map(next_date_map)).dropna(subset=['next_date'])
+    prev_records = prev_records.assign(
+        non_one_word=(prev_records['open_times'] > 0) | (prev_records['first_time'] > 93000),
+        physical=prev_records['first_time'] > 93000,
+    )
+    today_limit_up = set(zip(limit_up_frame['trade_date'], limit_up_frame['stock_code']))
+    merged = prev_records.merge(next_daily, on=['stock_code', 'next_date'])
+    merged = merged.assign(
+        high_open=merged['next_open'] > merged['close'],
+        success=merged['next_close'] > merged['close'],
+        next_limit_up=[(next_date, stock_code) in today_limit_up for next_date, stock_code in zip(merged['next_date'], merged['stock_code'])],
+    )
+    non_one_word = merged[merged['non_one_word']].groupby('next_date').agg(
+        trading_count=('stock_code', 'size'), high_open_count=('high_open', 'sum'), success_count=('success', 'sum'))
+    physical = merged[merged['physical']].groupby('next_date').agg(
+        trading_count=('stock_code', 'size'), next_day_limit_up_count=('next_limit_up', 'sum'))
+
+    market_daily_data_list: List[MarketDailyDataDict] = []
+    for trade_date in trade_days:
+        market = market_stats.get(trade_date)
+        up_num, down_num, a_total = (market.up_num, market.down_num, market.a_total) if market else (None, None, 0)
+        day = stats.loc[trade_date] if trade_date in stats.index else None
+        limit_up_num = int(day['limit_up_num']) if day is not None else 0
+        blow_up_num = int(day['blow_up_num']) if day is not None else 0
+        highest_continuous_up_count = day['highest_continuous_up_count'] if day is not None else None
+        trading_count, high_open_count, success_count = (
+            non_one_word.loc[trade_date].tolist() if trade_date in non_one_word.index else (0, 0, 0))
+        physical_count, next_day_limit_up_count = (
+            physical.loc[trade_date].tolist() if trade_date in physical.index else (0, 0))
+        market_daily_data_list.append({
+            'trade_date': trade_date,
+            'up_num': up_num,
+            'down_num': down_num,
+            'limit_up_num': limit_up_num,
+            'non_one_word_limit_up_num': limit_up_num - (int(day['one_word_limit_up_num']) if day is not None else 0),
+            'limit_up_amount': float(day['limit_up_amount']) if day is not None else 0,
+            'limit_down_num': int(day['limit_down_num']) if day is not None else 0,
+            'blow_up_rate': _rate(blow_up_num, blow_up_num + limit_up_num),
+            'prev_limit_up_high_open_rate': _rate(int(high_open_count), int(trading_count)),
+            'prev_limit_up_success_rate': _rate(int(success_count), int(trading_count)),
+            'physical_board_next_day_limit_up_rate': _rate(int(next_day_limit_up_count), int(physical_count)),
+            'sentiment_index': round(up_num * 100 / a_total) if a_total > 0 else 0,
+            'highest_continuous_up_count': 0 if highest_continuous_up_count is None or pd.isna(highest_continuous_up_count) else int(highest_continuous_up_count),
+        })
+    return market_daily_data_list
+
 def update_market_daily_data_during(start_date: str, end_date: str) -> None:
     logging.info(f"正在分析 从 {start_date} 到 {end_date} 的市场情绪")
     if not  TradeCalendar.validate_date_range(start_date, end_date):
         return
-    
-    market_daily_data_list: List[MarketDailyDataDict] = []
-    trade_days = TradeCalendar.get_trade_dates(start_date, end_date)
-    for current_date in trade_days:
-        market_daily_data = _calculate_market_daily_data(current_date)
-        if market_daily_data:
-            market_daily_data_list.append(market_daily_data)
 
+    start_time = time.time()
+    market_daily_data_list = calculate_market_daily_data_batch(start_date, end_date)
     write_market_daily_data_to_db_batch(market_daily_data_list)
-    logging.info(f"市场情绪数据从 {start_date} 到 {end_date} 已写入数据库")
+    if market_daily_data_list:
+        last_date = market_daily_data_list[-1]['trade_date']
+        watermark = read_watermark(MARKET_ANALYSIS_WATERMARK_SOURCE, MarketDailyData.__tablename__)
+        if watermark is None or last_date > watermark:
+            write_watermark(MARKET_ANALYSIS_WATERMARK_SOURCE, MarketDailyData.__tablename__, last_date)
+    logging.info(f"市场情绪数据从 {start_date} 到 {end_date} 已写入数据库, 共 {len(market_daily_data_list)} 个交易日, 耗时: {time.time() - start_time:.2f} 秒")
+
+def update_market_daily_data_until(end_date: str, recompute_from: Optional[str] = None) -> None:
+    """
+    按水位线增量计算市场情绪数据：从水位线之后的交易日计算到 end_date。
+    recompute_from 早于水位线时从 recompute_from 开始重新计算（例如涨跌停数据重新拉取的起始日）
+    """
+    watermark = read_watermark(MARKET_ANALYSIS_WATERMARK_SOURCE, MarketDailyData.__tablename__)
+    start_date = TradeCalendar.get_next_trade_date(watermark) if watermark else None
+    if start_date is None or (recompute_from and recompute_from < start_date):
+        start_date = recompute_from or get_recent_trade_date_in_table(MarketDailyData.__tablename__)
+    if start_date > end_date:
+        logging.info(f"市场情绪数据已计算到 {watermark}，无需更新")
+        return
+    update_market_daily_data_during(start_date, end_date)
 
 def write_market_daily_data_to_db_batch(market_daily_data_list: List[MarketDailyDataDict]) -> None:
     if len(market_daily_data_list) <= 0:
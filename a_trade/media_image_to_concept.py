@@ -10,7 +10,7 @@ from a_trade.db_base import Base, engine, Session, String
 from a_trade.media_data_process import WechatLimitArticle, is_black_background
 from a_trade.trade_calendar import TradeCalendar
 from a_trade.settings import get_project_path
-from a_trade.concept_llm_analysis import analyze_concept_datas_from_media_image
+from a_trade.concept_llm_analysis import analyze_concept_datas_from_media_images
 from a_trade.limit_attribution import LimitDailyAttribution
 from a_trade.trade_utils import code_with_exchange
 from a_trade.limit_up_data_tushare import LimitDataSource
@@ -56,46 +56,48 @@ def translate_image_to_json_for_day(trade_date: str) -> None:
     if len(files) > 2:
         files = files[:-2]
     
+    # 黑色背景子图之后才是真正的表格图片
+    table_image_paths = []
     for filename in files:
         file_path = os.path.join(image_dir, filename)
         try:
-            logging.info(f"正在处理图片: {file_path}")
             if black_image_path:
-                # 黑色背景子图之后才是真正的表格图片,利用视觉理解模型提取表格数据至JSON
-                json_data = analyze_concept_datas_from_media_image(file_path)
-                
-                # 处理JSON文件合并
-                existing_data: Dict[str, Any] = {}
-                if os.path.exists(json_path):
-                    try:
-                        with open(json_path, 'r', encoding='utf-8') as f:
-                            existing_data = json.load(f)
-                    except json.JSONDecodeError:
-                        logging.warning(f"JSON文件格式错误，将覆盖: {json_path}")
-                        existing_data = {}
-                
-                # 合并新数据，一级分类采用覆盖逻辑
-                if isinstance(json_data, list):
-                    # 如果是列表，遍历每个字典并合并
-                    for data_dict in json_data:
-                        for category, concepts in data_dict.items():
-                            # 直接覆盖一级分类下的所有数据
-                            existing_data[category] = concepts
-                else:
-                    # 如果是字典，直接覆盖一级分类下的所有数据
-                    for category, concepts in json_data.items():
-                        existing_data[category] = concepts
-                
-                # 写入更新后的数据
-                with open(json_path, 'w', encoding='utf-8') as f:
-                    json.dump(existing_data, f, ensure_ascii=False, indent=2)
-                logging.info(f"成功更新概念数据到: {json_path}")
-
+                table_image_paths.append(file_path)
             if is_black_background(file_path):
                 black_image_path = file_path
         except Exception as e:
             logging.error(f"处理图片失败: {file_path}, 错误: {e}")
 
+    # 利用视觉理解模型并发提取表格数据至JSON，再按文件顺序合并
+    logging.info(f"即将解析 {len(table_image_paths)} 张表格图片")
+    json_datas = analyze_concept_datas_from_media_images(table_image_paths)
+    existing_data: Dict[str, Any] = {}
+    for file_path, json_data in zip(table_image_paths, json_datas):
+        if isinstance(json_data, Exception):
+            logging.error(f"处理图片失败: {file_path}, 错误: {json_data}")
+            continue
+        try:
+            # 合并新数据，一级分类采用覆盖逻辑
+            if isinstance(json_data, list):
+                # 如果是列表，遍历每个字典并合并
+                for data_dict in json_data:
+                    for category, concepts in data_dict.items():
+                        # 直接覆盖一级分类下的所有数据
+                        existing_data[category] = concepts
+            else:
+                # 如果是字典，直接覆盖一级分类下的所有数据
+                for category, concepts in json_data.items():
+                    existing_data[category] = concepts
+            logging.info(f"成功解析图片: {file_path}")
+        except Exception as e:
+            logging.error(f"处理图片失败: {file_path}, 错误: {e}")
+
+    if table_image_paths:
+        # 写入更新后的数据
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(existing_data, f, ensure_ascii=False, indent=2)
+        logging.info(f"成功更新概念数据到: {json_path}")
+
 def traslate_json_to_db(trade_date: str) -> None:
     """
     JSON文件数据结构如下
@@ -0,0 +1,215 @@
+# coding: utf-8
+# 文件：minute_bar_store.py
+
+"""
+分时数据列式存储。
+
+每只股票每个交易日的分时数据保存为一个 .npy 文件，数组形状为 (字段数, 分钟数)，
+每一行对应 MINUTE_BAR_FIELDS 中的一个字段，时间字段为当日零点起的秒数。
+读取时使用内存映射，回测中反复读取同一交易日的数据时无需再经过 ORM 实例化。
+"""
+
+import os
+import datetime
+import functools
+import logging
+import shutil
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from a_trade.db_base import db_dir
+
+MINUTE_BAR_FIELDS = ('time', 'open', 'high', 'low', 'close', 'vol', 'amount', 'avg', 'pre_close', 'change', 'pct_chg')
+FIELD_INDEX = {name: index for index, name in enumerate(MINUTE_BAR_FIELDS)}
+
+# 设置环境变量 MINUTE_BAR_STORE=0 可关闭列式存储，直接读取数据库
+MINUTE_BAR_STORE_ENABLED = os.getenv('MINUTE_BAR_STORE', '1') != '0'
+
+
+def trade_time_to_seconds(trade_time: str) -> int:
+    """将 'YYYY-MM-DD HH:MM:SS' 格式的时间转换为当日零点起的秒数"""
+    return int(trade_time[11:13]) * 3600 + int(trade_time[14:16]) * 60 + int(trade_time[17:19])
+
+
+def seconds_to_trade_time(trade_date: str, seconds: int) -> str:
+    """将交易日期与当日秒数转换为 'YYYY-MM-DD HH:MM:SS' 格式的时间"""
+    hours, remainder = divmod(int(seconds), 3600)
+    minutes, secs = divmod(remainder, 60)
+    return f"{trade_date[:4]}-{trade_date[4:6]}-{trade_date[6:8]} {hours:02d}:{minutes:02d}:{secs:02d}"
+
+
+@functools.lru_cache(maxsize=4096)
+def trade_date_midnight(trade_date: str) -> datetime.datetime:
+    """交易日 'YYYYMMDD' 的零点时间"""
+    return datetime.datetime.strptime(trade_date, "%Y%m%d")
+
+
+class MinuteBar:
+    """
+    列式分时数据中单根分钟K线的只读视图。
+
+    属性与下标访问方式与 StockMinuteData 保持一致，可直接替代 ORM 对象使用。
+    """
+    __slots__ = ('stock_code', 'trade_date', '_columns', '_index', '_midnight')
+
+    def __init__(self, stock_code: str, trade_date: str, columns: np.ndarray, index: int,
+                 midnight: Optional[datetime.datetime] = None):
+        self.stock_code = stock_code
+        self.trade_date = trade_date
+        self._columns = columns
+        self._index = index
+        # 交易日零点，同一交易日的K线共用，避免每次访问 bob 时解析日期
+        self._midnight = midnight if midnight is not None else trade_date_midnight(trade_date)
+
+    def _value(self, field: str) -> float:
+        return float(self._columns[FIELD_INDEX[field], self._index])
+
+    @property
+    def time(self) -> int:
+        """当日零点起的秒数"""
+        return int(self._columns[0, self._index])
+
+    @property
+    def trade_time(self) -> str:
+        return seconds_to_trade_time(self.trade_date, self.time)
+
+    @property
+    def bob(self) -> datetime.datetime:
+        return self._midnight + datetime.timedelta(seconds=self.time)
+
+    @property
+    def open(self) -> float:
+        return self._value('open')
+
+    @property
+    def high(self) -> float:
+        return self._value('high')
+
+    @property
+    def low(self) -> float:
+        return self._value('low')
+
+    @property
+    def close(self) -> float:
+        return self._value('close')
+
+    @property
+    def vol(self) -> float:
+        return self._value('vol')
+
+    @property
+    def amount(self) -> float:
+        return self._value('amount')
+
+    @property
+    def avg(self) -> float:
+        return self._value('avg')
+
+    @property
+    def pre_close(self) -> float:
+        return self._value('pre_close')
+
+    @property
+    def change(self) -> float:
+        return self._value('change')
+
+    @property
+    def pct_chg(self) -> float:
+        return self._value('pct_chg')
+
+    def __repr__(self):
+        return f"<MinuteBar(stock_code={self.stock_code}, trade_time={self.trade_time}, close={self.close}, avg={self.avg})>"
+
+    def __getitem__(self, key):
+        if key == 'volume':
+            return self.vol
+        if key in ('close', 'open', 'avg', 'trade_time', 'high', 'low', 'bob', 'amount'):
+            return getattr(self, key)
+        raise KeyError(f"Invalid key: {key}")
+
+
+def columns_from_records(records: Iterable) -> np.ndarray:
+    """
+    将按时间排序的分时记录（StockMinuteData 或具有相同属性的对象）转换为列式数组。
+
+    返回:
+        np.ndarray: 形状为 (len(MINUTE_BAR_FIELDS), 记录数) 的 float64 数组
+    """
+    rows = [
+        (trade_time_to_seconds(record.trade_time), record.open, record.high, record.low, record.close,
+         record.vol, record.amount, record.avg, record.pre_close, record.change, record.pct_chg)
+        for record in records
+    ]
+    if not rows:
+        return np.empty((len(MINUTE_BAR_FIELDS), 0), dtype=np.float64)
+    return np.array(rows, dtype=np.float64).T.copy()
+
+
+def bars_from_columns(stock_code: str, trade_date: str, columns: np.ndarray) -> List[MinuteBar]:
+    """将列式数组包装为 MinuteBar 列表"""
+    midnight = trade_date_midnight(trade_date)
+    return [MinuteBar(stock_code, trade_date, columns, index, midnight) for index in range(columns.shape[1])]
+
+
+class MinuteBarStore:
+    """分时数据列式文件存储，目录结构为 <root>/<trade_date>/<stock_code>.npy"""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def path_for(self, stock_code: str, trade_date: str) -> Path:
+        return self.root / trade_date / f"{stock_code}.npy"
+
+    def exists(self, stock_code: str, trade_date: str) -> bool:
+        return self.path_for(stock_code, trade_date).exists()
+
+    def load_columns(self, stock_code: str, trade_date: str) -> Optional[np.ndarray]:
+        """以内存映射方式读取列式数组，文件不存在时返回 None"""
+        path = self.path_for(stock_code, trade_date)
+        try:
+            return np.load(path, mmap_mode='r')
+        except FileNotFoundError:
+            return None
+        except (ValueError, OSError) as e:
+            logging.error(f"读取分时列式文件 {path} 失败: {e}")
+            return None
+
+    def save_columns(self, stock_code: str, trade_date: str, columns: np.ndarray) -> None:
+        """保存列式数组，先写临时文件再替换，保证并发读取时文件完整"""
+        if columns.shape[1] == 0:
+            return
+        path = self.path_for(stock_code, trade_date)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.ascontiguousarray(columns, dtype=np.float64))
+        os.replace(tmp_path, path)
+
+    def get_bars(self, stock_code: str, trade_date: str) -> Optional[List[MinuteBar]]:
+        columns = self.load_columns(stock_code, trade_date)
+        if columns is None:
+            return None
+        return bars_from_columns(stock_code, trade_date, columns)
+
+    def save_records(self, stock_code: str, trade_date: str, records: Iterable) -> np.ndarray:
+        columns = columns_from_records(records)
+        self.save_columns(stock_code, trade_date, columns)
+        return columns
+
+    def invalidate(self, trade_date: str, stock_code: Optional[str] = None) -> None:
+        """删除指定交易日（或指定股票）的列式文件，数据库数据变更后调用"""
+        if stock_code:
+            self.path_for(stock_code, trade_date).unlink(missing_ok=True)
+        else:
+            shutil.rmtree(self.root / trade_date, ignore_errors=True)
+
+    def stored_stock_codes(self, trade_date: str) -> List[str]:
+        day_dir = self.root / trade_date
+        if not day_dir.exists():
+            return []
+        return sorted(path.stem for path in day_dir.glob('*.npy'))
+
+
+minuteBarStore = MinuteBarStore(db_dir / 'minute_bars')
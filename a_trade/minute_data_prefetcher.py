@@ -0,0 +1,157 @@
+# coding: utf-8
+# 文件：minute_data_prefetcher.py
+
+"""
+回测分时数据预取。
+
+回测开始前一次性计算策略可能订阅的 (股票代码, 交易日期) 组合，找出数据库中缺失的部分，
+使用有界线程池并发调用 Tushare 拉取，并通过限流器控制调用频率不超过接口配额。
+下载在工作线程中进行，写库统一在调用线程完成，避免 SQLite 写锁竞争。
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterable, List, Set, Tuple
+
+from a_trade.settings import _get_tushare
+from a_trade.trade_calendar import TradeCalendar
+from a_trade.stock_minute_data import download_minute_dataframe, save_minute_dataframe, find_missing_minute_data
+from a_trade.minute_bar_store import minuteBarStore
+
+# Tushare 分钟接口每分钟调用次数上限，按账号权限调整
+TUSHARE_MINUTE_CALLS_PER_MINUTE = int(os.getenv('TUSHARE_MINUTE_CALLS_PER_MINUTE', '300'))
+# 并发下载线程数
+MINUTE_PREFETCH_WORKERS = int(os.getenv('MINUTE_PREFETCH_WORKERS', '4'))
+
+
+# 盘后分析选出的股票需要订阅分时数据的后续交易日数：买入日(N+1)与卖出日(N+2)
+OBSERVATION_HOLDING_DAYS = 2
+
+
+def holding_minute_requests(candidates: Dict[str, Iterable[str]], end_date: str,
+                            holding_days: int = OBSERVATION_HOLDING_DAYS) -> Dict[str, Set[str]]:
+    """
+    根据盘后分析日的候选股票，推算回测过程中才会生成的观察条目需要订阅的分时数据
+
+    参数:
+        candidates: Dict[str, Iterable[str]], 盘后分析日 -> 可能被选入观察的股票代码
+        end_date: str, 回测结束日期，晚于该日期的交易日不订阅
+        holding_days: int, 分析日之后需要订阅的交易日数
+
+    返回:
+        Dict[str, Set[str]]: 交易日期 -> 股票代码集合
+    """
+    requests: Dict[str, Set[str]] = {}
+    for trade_date, stock_codes in candidates.items():
+        stock_codes = set(stock_codes)
+        if not stock_codes:
+            continue
+        for delta in range(1, holding_days + 1):
+            next_date = TradeCalendar.get_next_trade_date(trade_date, delta)
+            if next_date is None or next_date > end_date:
+                break
+            requests.setdefault(next_date, set()).update(stock_codes)
+    return requests
+
+
+def merge_minute_requests(requests: Dict[str, Set[str]], other: Dict[str, Iterable[str]]) -> Dict[str, Set[str]]:
+    """将 other 中的订阅合并到 requests 中并返回 requests"""
+    for trade_date, stock_codes in other.items():
+        requests.setdefault(trade_date, set()).update(stock_codes)
+    return requests
+
+
+class RateLimiter:
+    """滑动窗口限流器，保证任意 period 秒内的调用次数不超过 max_calls，线程安全"""
+
+    def __init__(self, max_calls: int, period: float = 60.0):
+        if max_calls <= 0:
+            raise ValueError("max_calls 必须大于0")
+        self.max_calls = max_calls
+        self.period = period
+        self._calls = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._calls and now - self._calls[0] >= self.period:
+                    self._calls.popleft()
+                if len(self._calls) < self.max_calls:
+                    self._calls.append(now)
+                    return
+                wait_time = self.period - (now - self._calls[0])
+            time.sleep(max(wait_time, 0.01))
+
+
+class MinuteDataPrefetcher:
+    """
+    分时数据并发预取器。
+
+    参数:
+        client: 提供 pro_bar 接口的客户端，默认为已设置 token 的 tushare 模块，测试时可替换为本地假客户端
+        max_workers: int, 并发下载线程数
+        max_calls_per_minute: int, 每分钟最多调用次数
+    """
+
+    def __init__(self, client=None, max_workers: int = MINUTE_PREFETCH_WORKERS,
+                 max_calls_per_minute: int = TUSHARE_MINUTE_CALLS_PER_MINUTE):
+        self.client = client if client is not None else _get_tushare()
+        self.max_workers = max(1, max_workers)
+        self.rate_limiter = RateLimiter(max_calls_per_minute, 60.0)
+
+    def _download(self, stock_code: str, trade_date: str):
+        self.rate_limiter.acquire()
+        return download_minute_dataframe(stock_code, trade_date, client=self.client)
+
+    def prefetch(self, requests: Dict[str, Iterable[str]]) -> Tuple[int, List[Tuple[str, str]]]:
+        """
+        拉取并保存缺失的分时数据
+
+        参数:
+            requests: Dict[str, Iterable[str]], 交易日期 -> 股票代码集合
+
+        返回:
+            Tuple[int, List[Tuple[str, str]]]: (成功写入的股票日数量, 拉取失败的 (股票代码, 交易日期) 列表)
+        """
+        missing = find_missing_minute_data(requests)
+        total = sum(len(set(codes)) for codes in requests.values())
+        logging.info(f"分时数据预取: 共 {total} 个股票日, 缺失 {len(missing)} 个")
+        if not missing:
+            return 0, []
+
+        saved = 0
+        failed: List[Tuple[str, str]] = []
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(self._download, stock_code, trade_date): (stock_code, trade_date)
+                for stock_code, trade_date in missing
+            }
+            for future in as_completed(futures):
+                stock_code, trade_date = futures[future]
+                try:
+                    df = future.result()
+                    if df is None or len(df) == 0:
+                        logging.warning(f"{trade_date} {stock_code} 分时数据为空，可能停牌")
+                        failed.append((stock_code, trade_date))
+                        continue
+                    save_minute_dataframe(df)
+                    minuteBarStore.invalidate(trade_date, stock_code)
+                    saved += 1
+                except Exception as e:
+                    logging.error(f"{trade_date} {stock_code} 分时数据预取失败: {e}")
+                    failed.append((stock_code, trade_date))
+
+        logging.info(f"分时数据预取完成: 写入 {saved} 个, 失败 {len(failed)} 个, 耗时 {time.time() - start_time:.2f} 秒")
+        return saved, failed
+
+
+def prefetch_minute_data(requests: Dict[str, Iterable[str]], client=None) -> Tuple[int, List[Tuple[str, str]]]:
+    """使用默认配置预取分时数据"""
+    return MinuteDataPrefetcher(client=client).prefetch(requests)
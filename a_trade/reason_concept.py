@@ -1,5 +1,5 @@
 # coding: utf-8
-from a_trade.db_base import Base, Session
+from a_trade.db_base import Base, Session, ensure_table_columns, now_timestamp
 from sqlalchemy import Column, String, or_, and_
 import os
 import json
@@ -7,14 +7,15 @@ from a_trade.trade_utils import strip_list, concepts_equal
 import logging
 import jieba
 from a_trade.baidu_translate import translate_to_chinese
-from a_trade.concept_llm_analysis import analyze_related_concept_with_limit_reason, analyze_key_word_with_limit_reason
+from a_trade.concept_llm_analysis import analyze_related_concept_with_limit_reason, analyze_related_concepts_with_limit_reasons, analyze_key_word_with_limit_reason, ConceptAnalysisError
 from a_trade.bing_caller import search_word_from_bing
 import re
 from a_trade.settings import get_project_path
 import a_trade.split_words
 import random
 import time
-from a_trade.concept_manager import ConceptInfo, target_conditions, conceptManager
+from a_trade.concept_manager import ConceptInfo, ConceptNameIndex, conceptManager
+from a_trade.keyword_automaton import KeywordAutomaton
 from a_trade.concept_relations import conceptRelations
 
 JSON_FILE_PATH = get_project_path() / "custom_concept_words.json"
@@ -25,6 +26,9 @@ class LimitReasonToConcept(Base):
     limit_reason = Column(String, primary_key=True)
     pre_concept_names = Column(String)
     concept_names = Column(String)
+    updated_at = Column(String, default=now_timestamp, onupdate=now_timestamp)  # 最后修改时间，用作增量同步水位线
+
+ensure_table_columns(LimitReasonToConcept)
 
 class ReasonConceptManger:
     def __init__(self):
@@ -46,6 +50,25 @@ class ReasonConceptManger:
             "融资融券", "深股通", "沪股通", "标普道琼斯A股", "中证500成份股", "上证380成份股", "沪深300样本股", "同花顺漂亮100"
         ]
 
+        self._build_keyword_automaton()
+
+    def _build_keyword_automaton(self):
+        """构建关键词自动机与自定义板块关键词索引"""
+        # 关键词自动机：自定义板块关键词、无助于归因的词，一次扫描涨停原因得到全部命中
+        self.keyword_automaton = KeywordAutomaton()
+        # 自定义板块关键词索引，用于查找包含某个分词的关键词
+        self.custom_keyword_index = ConceptNameIndex([], fold_ascii_case=False)
+        for return_word in self.return_words:
+            self.keyword_automaton.add(return_word, ('return', return_word))
+        for custom_concept, keywords in self.custom_concept_words.items():
+            self._add_custom_keywords(custom_concept, keywords)
+
+    def _add_custom_keywords(self, custom_concept, keywords):
+        self.keyword_automaton.add(custom_concept, ('custom', custom_concept))
+        for keyword in keywords:
+            self.keyword_automaton.add(keyword, ('custom', custom_concept))
+            self.custom_keyword_index.add(keyword)
+
     def _load_custom_concepts(self):
         """
         读取 JSON 文件中的板块关键词数据
@@ -71,6 +94,7 @@ class ReasonConceptManger:
         else:
             # 新增板块
             self.custom_concept_words[concept_name] = keywords
+        self._add_custom_keywords(concept_name, keywords)
 
         with open(JSON_FILE_PATH, 'w', encoding='utf-8') as file:
             json.dump(self.custom_concept_words, file, ensure_ascii=False, indent=4)
@@ -95,7 +119,12 @@ class ReasonConceptManger:
                     return None
             else:
                 logging.info(f"{reason_str} 未记录在数据表里")
-                concept_names = self.analyze_concept_from_reason(reason_str)
+                try:
+                    concept_names = self.analyze_concept_from_reason(reason_str)
+                except ConceptAnalysisError as e:
+                    # 解码失败不写入数据表也不缓存，下次遇到该原因时重新分析
+                    logging.error(f"{reason_str} 板块归因失败，暂不记录: {e}")
+                    return None
                 self.reason_to_concept_cache[reason_str] = concept_names  # 缓存新分析的结果
                 return concept_names
         finally:
@@ -141,10 +170,10 @@ class ReasonConceptManger:
         final_words = strip_list(final_words)
         logging.info(f"{reason_str} 最终分词结果是:{final_words}")
 
-        # 处理自定义板块逻辑
-        for custom_concept, keywords in self.custom_concept_words.items():
-            for keyword in keywords:
-                if any(word in keyword for word in final_words):
+        # 处理自定义板块逻辑：分词是某个关键词的一部分
+        for keyword in self.custom_keyword_index.search_many(final_words):
+            for kind, custom_concept in self.keyword_automaton.payloads(keyword):
+                if kind == 'custom':
                     related_custom_concepts.add(custom_concept)
 
         final_words = strip_list(final_words)
@@ -153,30 +182,15 @@ class ReasonConceptManger:
         if not final_words and not related_custom_concepts:
             return None
 
-        # 查询 ConceptInfo 数据表中符合条件的板块
-        conditions = target_conditions[:]
-
-        # 动态构造查询条件，适配 final_words 的实际长度
-        like_conditions = [ConceptInfo.name.like(f"%{word}%") for word in final_words]
-        conditions.append(or_(*like_conditions))
+        # 通过概念名称索引一次查找全部分词的候选板块，等价于 ConceptInfo.name LIKE '%word%'
+        db_concepts = conceptManager.query_concepts_by_words(final_words)
+        logging.info(f"数据库匹配的板块: {list(db_concepts)}")
 
-        session = Session()
-        try:
-            # 查询数据库中的板块信息
-            concept_infos = session.query(ConceptInfo).filter(*conditions).all()
-            db_concepts = {concept.name for concept in concept_infos}
-            logging.info(f"数据库匹配的板块: {list(db_concepts)}")
+        # 合并自定义板块和数据库查询结果
+        all_concepts = list(db_concepts.union(related_custom_concepts))
+        logging.info(f"{reason_str} 可能的板块有: {all_concepts}。若非空，即将openai调用归因")
 
-            # 合并自定义板块和数据库查询结果
-            all_concepts = list(db_concepts.union(related_custom_concepts))
-            logging.info(f"{reason_str} 可能的板块有: {all_concepts}。若非空，即将openai调用归因")
-
-            return all_concepts if all_concepts else None
-        except Exception as e:
-            logging.error(f"涨停原因 {reason_str} 分词 查询板块失败: {e}")
-            return None
-        finally:
-            session.close()
+        return all_concepts if all_concepts else None
 
     def _analyze_concept_from_split_words(self, reason_str, words, enbale_search=False):
         pre_concept_name_list = self._query_concepts_from_split_words(reason_str, words)
@@ -284,15 +298,25 @@ class ReasonConceptManger:
             return new_concept_name_list
         return []
 
+    def _split_reason(self, reason_str):
+        """jieba 分词，并判断是否有分词包含无助于归因的词"""
+        tokens = list(jieba.tokenize(reason_str))
+        jieba_words = [word for word, _, _ in tokens]
+        # 无助于归因的词需落在同一个分词内
+        token_end_at = {}
+        for _, start, end in tokens:
+            for index in range(start, end):
+                token_end_at[index] = end
+        for start, end, keyword in self.keyword_automaton.iter_matches(reason_str):
+            if ('return', keyword) in self.keyword_automaton.payloads(keyword) and end <= token_end_at.get(start, -1):
+                return jieba_words, True
+        return jieba_words, False
+
     def _analyze_concept_from_reason_by_AI(self, reason_str):
-        jieba_words = jieba.lcut(reason_str)
-        for word in jieba_words:
-            word = word.strip()
-                    
-            for return_word in self.return_words:
-                if return_word in word:
-                    logging.info(f"涨停原因 {reason_str} 属于个股股性、复牌等行为，无助于归因板块")
-                    return None
+        jieba_words, is_return_reason = self._split_reason(reason_str)
+        if is_return_reason:
+            logging.info(f"涨停原因 {reason_str} 属于个股股性、复牌等行为，无助于归因板块")
+            return None
 
         concept_name_list = self._analyze_concept_from_split_words(reason_str, jieba_words, False)
         if not concept_name_list:
@@ -313,7 +337,47 @@ class ReasonConceptManger:
 
         return concept_name_list
 
-    # 根据涨停原因字符串分析板块
+    def prefetch_reasons(self, reasons):
+        """
+        批量分析未记录的涨停原因：规则匹配之后，将首轮 AI 板块归因通过调用池并发请求。
+        首轮即得到板块的原因直接写入数据表，其余原因仍由 _get_concept_from_reason 逐个走完整流程。
+        """
+        pending = [reason for reason in strip_list(reasons) if reason and reason not in self.reason_to_concept_cache]
+        if not pending:
+            return
+        recorded = set()
+        with Session() as session:
+            for i in range(0, len(pending), 500):
+                recorded.update(row.limit_reason for row in session.query(LimitReasonToConcept.limit_reason).filter(
+                    LimitReasonToConcept.limit_reason.in_(pending[i:i + 500])
+                ))
+
+        items = []
+        for reason in pending:
+            if reason in recorded or self._analyze_concept_from_reason_by_rule(reason):
+                continue
+            jieba_words, is_return_reason = self._split_reason(reason)
+            if is_return_reason:
+                continue
+            pre_concept_name_list = self._query_concepts_from_split_words(reason, jieba_words)
+            if pre_concept_name_list:
+                items.append((reason, pre_concept_name_list))
+        if not items:
+            return
+
+        logging.info(f"并发分析 {len(items)} 个涨停原因的板块归因")
+        results = analyze_related_concepts_with_limit_reasons(items)
+        for (reason, pre_concept_name_list), result in zip(items, results):
+            concept_name_list = result.get("output")
+            if concept_name_list:
+                concept_name_list = self.refine_output_with_relationships(concept_name_list)
+            if not concept_name_list:
+                continue
+            logging.info(f"{reason} 经过关系过滤后的参考板块是 {concept_name_list}")
+            self._save_reason_data(reason, ','.join(pre_concept_name_list), ','.join(concept_name_list))
+            self.reason_to_concept_cache[reason] = concept_name_list
+
+    # 根据涨停原因字符串分析板块，AI 归因解码失败时抛出 ConceptAnalysisError 且不写入数据表
     def analyze_concept_from_reason(self, reason_str):
         concept_result = self._analyze_concept_from_reason_by_rule(reason_str)
         if not concept_result:
@@ -441,19 +505,10 @@ class ReasonConceptManger:
         if not output or len(output) == 1:
             return output
 
-        output_set = set(output)
-        visited = set()
-        chains = []
-
-        for concept in output:
-            if concept not in visited:
-                chain = set()
-                self.build_chain(concept, chain, visited)
-                # Filter the chain to only include nodes in the output
-                filtered_chain = chain & output_set
-                if filtered_chain:
-                    chains.append(filtered_chain)
-                    logging.info(f"构建链条关系 '{concept}': {filtered_chain}")
+        # 按父子关系的连通分量分组，每组即为输出中相互关联的板块
+        chains = conceptRelations.closure.group_by_component(output)
+        for chain in chains:
+            logging.info(f"构建链条关系: {chain}")
 
         if len(chains) == 1:
             leaf_nodes = self.find_leaf_nodes(chains[0])
@@ -480,59 +535,15 @@ class ReasonConceptManger:
             leaf_nodes.update(chain_leaf_nodes)
         return list(leaf_nodes)
 
-    def build_chain(self, node, chain, visited):
-        chain.add(node)
-        visited.add(node)
-        for child in conceptRelations.concept_to_descendants.get(node, []):
-            if child not in visited:
-                self.build_chain(child, chain, visited)
-        for parent in conceptRelations.concept_to_category.get(node, []):
-            if parent not in visited:
-                self.build_chain(parent, chain, visited)
-
     def find_leaf_nodes(self, chain):
-        leaf_nodes = set()
-        for node in chain:
-            children = conceptRelations.concept_to_descendants.get(node, [])
-            if not children or not set(children) & chain:
-                leaf_nodes.add(node)
-        return leaf_nodes
+        return conceptRelations.closure.leaf_concepts(chain)
 
     def find_root_node(self, chain, leaf_nodes):
         lca = self.lowest_common_ancestor(list(leaf_nodes))
         return lca
 
     def lowest_common_ancestor(self, nodes):
-        ancestor_lists = []
-        for node in nodes:
-            # 获取每个节点的祖先链，包括自身
-            ancestors = [node] + conceptRelations.concept_to_chains.get(node, [])
-            ancestor_lists.append(ancestors)
-        
-        # 找到所有节点祖先链的交集
-        common_ancestors = set(ancestor_lists[0])
-        for ancestors in ancestor_lists[1:]:
-            common_ancestors &= set(ancestors)
-        
-        if not common_ancestors:
-            return None
-        
-        # 从共同祖先中，找到深度最小的节点（即距离当前节点最近的祖先）
-        lca = None
-        min_depth = float('inf')
-        for ancestor in common_ancestors:
-            # 计算每个节点到该祖先的深度
-            depths = []
-            for ancestors in ancestor_lists:
-                if ancestor in ancestors:
-                    depth = ancestors.index(ancestor)
-                    depths.append(depth)
-            # 取所有节点到该祖先的最大深度
-            depth = max(depths)
-            if depth < min_depth:
-                min_depth = depth
-                lca = ancestor
-        return lca
+        return conceptRelations.lowest_common_ancestor(nodes)
 
     
 reasonConceptManager = ReasonConceptManger()
@@ -4,7 +4,7 @@ import logging
 from a_trade.settings import get_project_path
 from pathlib import Path
 from typing import Dict, List, NoReturn, Set, Any
-from a_trade.concept_manager import ConceptManager
+from a_trade.concept_manager import conceptManager
 
 def get_frequecy_dict_path() -> Path:
     """获取词频字典路径
@@ -46,7 +46,7 @@ def prepare_split_concepts() -> NoReturn:
     统计概念词频并写入词频字典文件
     """
     concept_word_to_frequecy: Dict[str, int] = {}
-    result = ConceptManager.concept_info_cache.values()
+    result = conceptManager.concept_info_cache.values()
     ignore_words: Set[str] = {'(', ')', 'Ⅲ'}
     
     # 统计词频
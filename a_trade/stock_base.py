@@ -4,7 +4,7 @@
 import logging
 from a_trade.settings import _get_tushare
 from sqlalchemy import Column, String
-from a_trade.db_base import Session, Base
+from a_trade.db_base import Session, Base, bulk_upsert_dataframe
 from a_trade.trade_calendar import TradeCalendar
 from a_trade.stocks_daily_data import StockDailyData
 
@@ -51,22 +51,9 @@ def update_new_stocks(recent_trade_date: str):
                 ts_code=','.join(new_stocks),
                 fields='ts_code,symbol,name,area,industry,market,exchange,list_status,list_date,delist_date,is_hs'
             )
-            for _, row in new_stocks_data.iterrows():
-                new_record = StockBase(
-                    ts_code=row['ts_code'],
-                    symbol=row['symbol'],
-                    name=row['name'],
-                    area=row['area'],
-                    industry=row['industry'],
-                    market=row['market'],
-                    exchange=row['exchange'],
-                    list_status=row['list_status'],
-                    list_date=row['list_date'],
-                    delist_date=row.get('delist_date', None),
-                    is_hs=row['is_hs']
-                )
-                session.merge(new_record)
-            session.commit()
+            if 'delist_date' not in new_stocks_data.columns:
+                new_stocks_data['delist_date'] = None
+            bulk_upsert_dataframe(new_stocks_data, StockBase)
         else:
             logging.info("没有需要更新的新股信息")
     except Exception as e:
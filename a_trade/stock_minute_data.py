@@ -1,13 +1,18 @@
 # coding: utf-8
-from sqlalchemy import Column, String, Float
+from sqlalchemy import Column, String, Float, Index, select, update, bindparam
 from sqlalchemy.orm import joinedload
 import tushare as ts
+import numpy as np
+import pandas as pd
 import datetime
-from a_trade.db_base import Session, Base, engine
+from a_trade.db_base import Session, Base, engine, bulk_upsert_dataframe
 from a_trade.settings import _get_tushare
 import logging
 import sys
-from typing import List
+from typing import Dict, Iterable, List, Tuple
+from a_trade.minute_bar_store import (
+    MINUTE_BAR_STORE_ENABLED, FIELD_INDEX, MinuteBar, minuteBarStore, bars_from_columns, columns_from_records
+)
 
 # 定义分时数据表
 class StockMinuteData(Base):
@@ -26,6 +31,12 @@ class StockMinuteData(Base):
     pct_chg = Column(Float)
     avg = Column(Float)
 
+    # 分时查询均按交易日过滤（单日多股票、单日全部、区间构建列式存储），按股票的查询同时带交易日，
+    # 一个 (trade_date, stock_code) 复合索引即可覆盖，主键 (stock_code, trade_time) 覆盖按股票的查询
+    __table_args__ = (
+        Index('ix_stock_minute_data_date_code', 'trade_date', 'stock_code'),
+    )
+
     def __repr__(self):
         return f"<MinuteData(stock_code={self.stock_code}, trade_time={self.trade_time}, close={self.close}, avg={self.avg})>"
     
@@ -54,8 +65,52 @@ class StockMinuteData(Base):
 # 创建表格（如果不存在的话）
 Base.metadata.create_all(engine)
 
-# 方法1: 获取并保存数据
-def fetch_and_save_data(stock_code, trade_date):
+MINUTE_DATA_COLUMNS = [column.name for column in StockMinuteData.__table__.columns]
+
+def _avg_price_from_totals(total_amount: np.ndarray, total_vol: np.ndarray) -> np.ndarray:
+    """累计成交额/累计成交量，累计成交量为0时均价记为0"""
+    safe_vol = np.where(total_vol > 0, total_vol, 1.0)
+    return np.where(total_vol > 0, np.round(total_amount / safe_vol, 2), 0.0)
+
+def calculate_cumulative_avg_price(amount: np.ndarray, vol: np.ndarray) -> np.ndarray:
+    """根据 cumsum(amount)/cumsum(vol) 计算分时均价"""
+    return _avg_price_from_totals(np.cumsum(amount, dtype=np.float64), np.cumsum(vol, dtype=np.float64))
+
+def save_minute_dataframe(df: pd.DataFrame) -> int:
+    """
+    将单只股票单个交易日的分时DataFrame计算均价后整体写入数据库
+
+    参数:
+        df: pd.DataFrame, Tushare pro_bar 返回的分钟数据
+
+    返回:
+        int: 写入的记录数
+    """
+    df = df.sort_values(by='trade_time').reset_index(drop=True)
+    df['avg'] = calculate_cumulative_avg_price(df['amount'].to_numpy(), df['vol'].to_numpy())
+    df = df.rename(columns={'ts_code': 'stock_code'})[MINUTE_DATA_COLUMNS]
+    saved = bulk_upsert_dataframe(df, StockMinuteData)
+    # 涨停数据中基于分时数据计算的派生字段随之失效
+    from a_trade.limit_up_data_tushare import clear_limit_minute_flags
+    for trade_date, stock_codes in df.groupby('trade_date')['stock_code'].unique().items():
+        clear_limit_minute_flags(trade_date, stock_codes)
+    return saved
+
+def download_minute_dataframe(stock_code: str, trade_date: str, client=None) -> pd.DataFrame:
+    """
+    调用 Tushare 获取单只股票单个交易日的1分钟数据
+
+    参数:
+        stock_code: str, 股票代码
+        trade_date: str, 交易日期 (格式: YYYYMMDD)
+        client: 提供 pro_bar 接口的客户端，默认为 tushare 模块
+
+    返回:
+        pd.DataFrame: 分钟数据，接口无数据时返回 None 或空 DataFrame
+    """
+    if client is None:
+        client = ts
+
     # 将传入的日期字符串转换为datetime对象
     date_object = datetime.datetime.strptime(trade_date, "%Y%m%d")
     
@@ -68,55 +123,55 @@ def fetch_and_save_data(stock_code, trade_date):
     end_date_formatted = end_datetime.strftime("%Y-%m-%d %H:%M:%S")
 
     logging.info(f"调用Tushare 获取{trade_date} {stock_code} {start_date_formatted} - {end_date_formatted} 分时数据")
-    session = Session()
+    return client.pro_bar(ts_code=stock_code, freq='1min', start_date=start_date_formatted, end_date=end_date_formatted)
+
+# 方法1: 获取并保存数据
+def fetch_and_save_data(stock_code, trade_date):
     try:
-        df = ts.pro_bar(ts_code=stock_code, freq='1min', start_date=start_date_formatted, end_date=end_date_formatted)
-        
-        # 按 trade_time 升序排序
-        df = df.sort_values(by='trade_time').reset_index(drop=True)
-        print(df)
-        if len(df) == 0:
+        df = download_minute_dataframe(stock_code, trade_date)
+        if df is None or len(df) == 0:
+            logging.error(f"{trade_date} {stock_code} 分时数据为空")
             sys.exit(1)
 
-        # 初始化累计数据
-        total_amount = 0
-        total_vol = 0
-        
-        for index, row in df.iterrows():
-            # 累计计算总金额和总成交量
-            total_amount += row['amount']
-            total_vol += row['vol']
-
-            # 计算动态平均成交价
-            avg_price = round(total_amount / total_vol, 2) if total_vol > 0 else 0
-
-            minute_data = StockMinuteData(
-                stock_code=row['ts_code'],
-                trade_time=row['trade_time'],
-                close=row['close'],
-                open=row['open'],
-                high=row['high'],
-                low=row['low'],
-                vol=row['vol'],
-                amount=row['amount'],
-                trade_date=row['trade_date'],
-                pre_close=row['pre_close'],
-                change=row['change'],
-                pct_chg=row['pct_chg'],
-                avg=avg_price  # 设置平均成交价
-            )
-            session.add(minute_data)
-        session.commit()
+        save_minute_dataframe(df)
+        minuteBarStore.invalidate(trade_date, stock_code)
     except Exception as e:
-        sys.exit(1)
         logging.error(e)
-    finally:
-        session.close()
+        sys.exit(1)
+
+def find_missing_minute_data(requests: Dict[str, Iterable[str]]) -> List[Tuple[str, str]]:
+    """
+    找出数据库中尚不存在分时数据的 (股票代码, 交易日期) 组合
+
+    参数:
+        requests: Dict[str, Iterable[str]], 交易日期 -> 股票代码集合
+
+    返回:
+        List[Tuple[str, str]]: 缺失数据的 (股票代码, 交易日期) 列表，按交易日期、股票代码排序
+    """
+    missing = []
+    with Session() as session:
+        for trade_date in sorted(requests.keys()):
+            stock_codes = set(requests[trade_date])
+            if not stock_codes:
+                continue
+            existing = {row[0] for row in session.query(StockMinuteData.stock_code).filter(
+                StockMinuteData.trade_date == trade_date,
+                StockMinuteData.stock_code.in_(stock_codes)
+            ).distinct().all()}
+            missing.extend((stock_code, trade_date) for stock_code in sorted(stock_codes - existing))
+    return missing
+
+def _load_minute_records(session, stock_code: str, trade_date: str) -> List[StockMinuteData]:
+    return session.query(StockMinuteData).filter_by(
+        stock_code=stock_code,
+        trade_date=trade_date
+    ).order_by(StockMinuteData.trade_time).all()
 
 # 方法2: 获取数据
-def get_minute_data(stock_code: str, trade_date: str, trade_time: datetime.datetime=None) -> List[StockMinuteData]:
+def get_minute_data(stock_code: str, trade_date: str, trade_time: datetime.datetime=None) -> List[MinuteBar]:
     """
-    获取指定股票在指定交易日的分钟数据
+    获取指定股票在指定交易日的分钟数据。优先读取列式存储，不存在时从数据库（或Tushare）加载并写入列式存储
 
     参数:
         stock_code: str, 股票代码
@@ -124,73 +179,164 @@ def get_minute_data(stock_code: str, trade_date: str, trade_time: datetime.datet
         trade_time: datetime.datetime, 交易时间，返回指定trade_time的数据，默认为空
 
     返回:
-        List[StockMinuteData]: 按时间排序的分钟数据列表
+        List[MinuteBar]: 按时间排序的分钟数据列表，访问方式与 StockMinuteData 一致
     """
-    with Session() as session:
-        query = session.query(StockMinuteData).filter_by(
-            stock_code=stock_code, 
-            trade_date=trade_date
-        )
-        
-        # 如果指定了trade_time，则添加时间过滤条件
-        if trade_time:
-            trade_time_str = trade_time.strftime("%Y-%m-%d %H:%M:%S")
-            query = query.filter(StockMinuteData.trade_time == trade_time_str)
-            
-        result = query.order_by(StockMinuteData.trade_time).all()
-        
-        if not result:
-            fetch_and_save_data(stock_code, trade_date)
-            result = session.query(StockMinuteData).filter_by(
-                stock_code=stock_code, 
-                trade_date=trade_date
-            ).order_by(StockMinuteData.trade_time).all()
-            
-            # 如果指定了trade_time，再次过滤结果
-            if trade_time:
-                trade_time_str = trade_time.strftime("%Y-%m-%d %H:%M:%S")
-                result = [data for data in result if data.trade_time == trade_time_str]
-                
-        return result
+    result = minuteBarStore.get_bars(stock_code, trade_date) if MINUTE_BAR_STORE_ENABLED else None
+
+    if result is None:
+        with Session() as session:
+            records = _load_minute_records(session, stock_code, trade_date)
+            if not records:
+                fetch_and_save_data(stock_code, trade_date)
+                records = _load_minute_records(session, stock_code, trade_date)
+            columns = minuteBarStore.save_records(stock_code, trade_date, records) if MINUTE_BAR_STORE_ENABLED else columns_from_records(records)
+            result = bars_from_columns(stock_code, trade_date, columns)
+
+    # 如果指定了trade_time，则按当日秒数过滤
+    if trade_time:
+        trade_seconds = trade_time.hour * 3600 + trade_time.minute * 60 + trade_time.second
+        result = [data for data in result if data.time == trade_seconds]
+
+    return result
     
-def get_minute_data_for_multiple_stocks(stock_codes, trade_date):
+def get_minute_columns_for_multiple_stocks(stock_codes, trade_date) -> Dict[str, np.ndarray]:
     """
-    获取多个股票在指定交易日的分钟数据。如果数据不存在，会调用 `fetch_and_save_data` 进行拉取。
+    获取多个股票在指定交易日的列式分钟数据（字段顺序见 MINUTE_BAR_FIELDS）。优先读取列式存储，
+    其余股票一次性从数据库加载，数据库中仍不存在的股票会调用 `fetch_and_save_data` 进行拉取。
 
     参数:
         stock_codes: list，股票代码列表
         trade_date: string，交易日期，例如 "20240102"
 
     返回:
-        dict，每个股票代码对应的分钟数据列表，例如:
-        {
-            "000001": [StockMinuteData对象, ...],
-            "000002": [StockMinuteData对象, ...],
-        }
+        dict，股票代码 -> 形状为 (字段数, 分钟数) 的数组
     """
+    columns_by_stock = {}
+    pending_stocks = []
+    for stock_code in stock_codes:
+        columns = minuteBarStore.load_columns(stock_code, trade_date) if MINUTE_BAR_STORE_ENABLED else None
+        if columns is None:
+            pending_stocks.append(stock_code)
+        else:
+            columns_by_stock[stock_code] = columns
+
+    if not pending_stocks:
+        return columns_by_stock
+
     with Session() as session:
-        # 查询所有股票的数据
+        # 查询列式存储中缺失股票的数据
         result = session.query(StockMinuteData).filter(
-            StockMinuteData.stock_code.in_(stock_codes),
+            StockMinuteData.stock_code.in_(pending_stocks),
             StockMinuteData.trade_date == trade_date
         ).order_by(StockMinuteData.stock_code, StockMinuteData.trade_time).all()
 
         # 将查询结果按股票代码分组
-        data_by_stock = {stock_code: [] for stock_code in stock_codes}
+        records_by_stock = {stock_code: [] for stock_code in pending_stocks}
         for record in result:
-            data_by_stock[record.stock_code].append(record)
+            records_by_stock[record.stock_code].append(record)
+
+        for stock_code, records in records_by_stock.items():
+            # 拉取数据库中缺失股票的数据
+            if not records:
+                fetch_and_save_data(stock_code, trade_date)
+                records = _load_minute_records(session, stock_code, trade_date)
+            columns_by_stock[stock_code] = minuteBarStore.save_records(stock_code, trade_date, records) if MINUTE_BAR_STORE_ENABLED else columns_from_records(records)
+
+        return columns_by_stock
+
+def get_minute_data_for_multiple_stocks(stock_codes, trade_date) -> Dict[str, List[MinuteBar]]:
+    """
+    获取多个股票在指定交易日的分钟数据，数据来源同 `get_minute_columns_for_multiple_stocks`。
+
+    参数:
+        stock_codes: list，股票代码列表
+        trade_date: string，交易日期，例如 "20240102"
+
+    返回:
+        dict，每个股票代码对应的分钟数据列表，例如:
+        {
+            "000001": [MinuteBar对象, ...],
+            "000002": [MinuteBar对象, ...],
+        }
+    """
+    columns_by_stock = get_minute_columns_for_multiple_stocks(stock_codes, trade_date)
+    return {
+        stock_code: bars_from_columns(stock_code, trade_date, columns_by_stock[stock_code])
+        for stock_code in stock_codes
+    }
+
+def build_minute_bar_store(start_date: str, end_date: str, overwrite: bool = False) -> int:
+    """
+    将数据库中 [start_date, end_date] 区间内已有的分时数据转换为列式存储文件
+
+    参数:
+        start_date: str, 开始日期 (格式: YYYYMMDD)
+        end_date: str, 结束日期 (格式: YYYYMMDD)
+        overwrite: bool, 是否覆盖已存在的列式文件
+
+    返回:
+        int: 写入的文件数量
+    """
+    written = 0
+    with Session() as session:
+        trade_dates = [row[0] for row in session.query(StockMinuteData.trade_date).filter(
+            StockMinuteData.trade_date >= start_date,
+            StockMinuteData.trade_date <= end_date
+        ).distinct().order_by(StockMinuteData.trade_date).all()]
+
+        for trade_date in trade_dates:
+            stored = set() if overwrite else set(minuteBarStore.stored_stock_codes(trade_date))
+            records = session.query(StockMinuteData).filter(
+                StockMinuteData.trade_date == trade_date
+            ).order_by(StockMinuteData.stock_code, StockMinuteData.trade_time).all()
+
+            records_by_stock: Dict[str, List[StockMinuteData]] = {}
+            for record in records:
+                records_by_stock.setdefault(record.stock_code, []).append(record)
+
+            for stock_code, stock_records in records_by_stock.items():
+                if stock_code in stored:
+                    continue
+                minuteBarStore.save_records(stock_code, trade_date, stock_records)
+                written += 1
+            session.expunge_all()
+            logging.info(f"交易日 {trade_date} 分时列式存储构建完成，共 {len(records_by_stock)} 只股票")
+    return written
+
+def _hhmmss_to_seconds(value) -> int:
+    """将 HHMMSS 格式的时间（字符串或整数）转换为当日零点起的秒数"""
+    value = int(value)
+    return value // 10000 * 3600 + value // 100 % 100 * 60 + value % 100
+
+def t_limit_from_columns(columns: np.ndarray, pre_close: float, day_high: float) -> bool:
+    """
+    根据列式分钟数据判断T字板：首次触及涨停（最高价涨幅超过9.7%）之后，存在最低价低于当日最高价的分钟（封板后再开板）
 
-        # 检查是否有缺失数据的股票
-        missing_stocks = [stock_code for stock_code in stock_codes if not data_by_stock[stock_code]]
+    参数:
+        columns: np.ndarray, 列式分钟数据
+        pre_close: float, 昨收价
+        day_high: float, 当日最高价
+    """
+    high = columns[FIELD_INDEX['high']]
+    low = columns[FIELD_INDEX['low']]
+    touched = np.flatnonzero(high * 100 / pre_close - 100 > 9.7)
+    if len(touched) == 0:
+        return False
+    return bool((low[touched[0] + 1:] < day_high).any())
 
-        # 拉取缺失股票的数据
-        for stock_code in missing_stocks:
-            fetch_and_save_data(stock_code, trade_date)
-            # 再次查询缺失的数据并填充
-            fetched_data = session.query(StockMinuteData).filter_by(stock_code=stock_code, trade_date=trade_date).order_by(StockMinuteData.trade_time).all()
-            data_by_stock[stock_code] = fetched_data
+def limit_open_minutes_from_columns(columns: np.ndarray, limit_price: float, start_time, end_time) -> int:
+    """
+    统计 [start_time, end_time] 之间最高价低于涨停价的分钟数（开板时长）
 
-        return data_by_stock
+    参数:
+        columns: np.ndarray, 列式分钟数据
+        limit_price: float, 涨停价
+        start_time: 首次封板时间 (HHMMSS)
+        end_time: 最后封板时间 (HHMMSS)
+    """
+    seconds = columns[FIELD_INDEX['time']]
+    in_range = (seconds >= _hhmmss_to_seconds(start_time)) & (seconds <= _hhmmss_to_seconds(end_time))
+    return int((in_range & (columns[FIELD_INDEX['high']] < limit_price)).sum())
 
 # 方法3: 判断强势涨停板
 def is_strong_limit_up_base_minute_data(stock_code, trade_date, limit_price, start_time, end_time, weak_limit_open_time=10):
@@ -212,37 +358,38 @@ def is_strong_limit_up_base_minute_data(stock_code, trade_date, limit_price, sta
     return is_strong
 
 def calculate_avg_price(trade_date):
-    with Session() as session:
+    with engine.connect() as conn:
         # 获取指定交易日的数据，并按 `stock_code` 和 `trade_time` 排序
-        minute_data = session.query(StockMinuteData).filter(
-            StockMinuteData.trade_date == trade_date
-        ).order_by(StockMinuteData.stock_code, StockMinuteData.trade_time).all()
+        minute_data = pd.DataFrame(conn.execute(
+            select(StockMinuteData.stock_code, StockMinuteData.trade_time, StockMinuteData.amount, StockMinuteData.vol)
+            .where(StockMinuteData.trade_date == trade_date)
+            .order_by(StockMinuteData.stock_code, StockMinuteData.trade_time)
+        ).all(), columns=['stock_code', 'trade_time', 'amount', 'vol'])
+
+    if minute_data.empty:
+        print(f"交易日 {trade_date} 没有数据")
+        return
+
+    # 按股票代码分组累计成交额与成交量
+    totals = minute_data.groupby('stock_code', sort=False)[['amount', 'vol']].cumsum()
+    avg_prices = _avg_price_from_totals(totals['amount'].to_numpy(dtype=np.float64), totals['vol'].to_numpy(dtype=np.float64))
+
+    params = [
+        {'b_stock_code': stock_code, 'b_trade_time': trade_time, 'b_avg': float(avg)}
+        for stock_code, trade_time, avg in zip(minute_data['stock_code'], minute_data['trade_time'], avg_prices)
+    ]
+    stmt = (
+        update(StockMinuteData.__table__)
+        .where(StockMinuteData.__table__.c.stock_code == bindparam('b_stock_code'))
+        .where(StockMinuteData.__table__.c.trade_time == bindparam('b_trade_time'))
+        .values(avg=bindparam('b_avg'))
+    )
 
-        if not minute_data:
-            print(f"交易日 {trade_date} 没有数据")
-            return
-
-        # 按股票代码分组
-        stock_data_by_code = {}
-        for data in minute_data:
-            if data.stock_code not in stock_data_by_code:
-                stock_data_by_code[data.stock_code] = []
-            stock_data_by_code[data.stock_code].append(data)
-
-        # 更新每个股票的 avg
-        for _, data_list in stock_data_by_code.items():
-            total_amount = 0
-            total_vol = 0
-
-            for data in data_list:
-                total_amount += data.amount
-                total_vol += data.vol
-                avg_price = round(total_amount / total_vol, 2) if total_vol > 0 else 0
-                data.avg = avg_price
-
-        # 提交更新
-        session.commit()
-        print(f"交易日 {trade_date} 的平均成交价计算完成并更新")
+    # 提交更新
+    with engine.begin() as conn:
+        conn.execute(stmt, params)
+    minuteBarStore.invalidate(trade_date)
+    print(f"交易日 {trade_date} 的平均成交价计算完成并更新")
 
 # 示例用法
 if __name__ == "__main__":
@@ -4,8 +4,8 @@
 import datetime
 import logging
 from a_trade.settings import _get_tushare
-from sqlalchemy import Column, String, Float
-from a_trade.db_base import Session, get_recent_trade_date_in_table, Base
+from sqlalchemy import Column, String, Float, Index
+from a_trade.db_base import Session, get_recent_trade_date_in_table, Base, bulk_upsert_dataframe
 from a_trade.trade_calendar import TradeCalendar
 from a_trade.stock_minute_data import get_minute_data
 
@@ -27,12 +27,21 @@ class StockDailyData(Base):
     vol = Column(Float)
     amount = Column(Float)
 
+    # 主键 (ts_code, trade_date) 已覆盖按股票倒序取最近N日的查询，这里补充按交易日全市场查询的索引
+    __table_args__ = (
+        Index('ix_stocks_daily_data_trade_date', 'trade_date'),
+    )
+
     def __repr__(self):
         return f"<StockDailyData(stock_code={self.ts_code}, close={self.close}, pre_close={self.pre_close})>"
 
+    def is_t_limit_candidate(self):
+        """日线层面满足T字板形态（高开、收于最高价附近、下影线足够长），需再结合分时数据确认"""
+        return (self.open*100 / self.pre_close - 100) > t_limit_open_condition and (self.high - 0.02 <= self.close) and  self.open - self.low > (self.close - self.open)*0.6
+
     def is_t_limit(self):
         # avg_price_pch = (self.amount * 1000 /self.vol)/self.pre_close - 100
-        if (self.open*100 / self.pre_close - 100) > t_limit_open_condition and (self.high - 0.02 <= self.close) and  self.open - self.low > (self.close - self.open)*0.6:
+        if self.is_t_limit_candidate():
             minute_datas = get_minute_data(self.ts_code, self.trade_date)
             first_limit_time = None
             for data in minute_datas:
@@ -46,6 +55,7 @@ class StockDailyData(Base):
     def is_one_limit(self):
         return self.high == self.low and self.high > self.pre_close
     
+
 class StockDailyDataSource():
     def __init__(self, stock_code, end_date, previous_delta):
         self.stock_code = stock_code
@@ -131,7 +141,6 @@ def get_stocks_daily_data(stock_codes, start_date, end_date):
         return stocks_data
 
 def update_stocks_daily_data(trade_date):
-    session = Session()
     try:
         # 打印日志说明正在拉取交易数据的日期
         logging.debug(f"正在拉取交易数据的日期: {trade_date}")
@@ -141,29 +150,13 @@ def update_stocks_daily_data(trade_date):
             logging.warning(f"没有获取到交易数据: {trade_date}")
         else:
             logging.info(f"获取到的数据数量: {len(daily_data)}，交易日期: {trade_date}")
-            # 插入获取的数据
-            for _, row in daily_data.iterrows():
-                new_record = StockDailyData(
-                    ts_code=row['ts_code'],
-                    trade_date=row['trade_date'],
-                    open=row['open'],
-                    high=row['high'],
-                    low=row['low'],
-                    close=row['close'],
-                    pre_close=row['pre_close'],
-                    change=row['change'],
-                    pct_chg=row['pct_chg'],
-                    vol=row['vol'],
-                    amount=row['amount']
-                )
-                session.merge(new_record)
-
-            session.commit()
+            # 批量插入或更新获取的数据
+            bulk_upsert_dataframe(daily_data, StockDailyData)
+            # 涨停数据中依赖日线判定的分时派生字段随之失效
+            from a_trade.limit_up_data_tushare import clear_limit_minute_flags
+            clear_limit_minute_flags(trade_date)
     except Exception as e:
-        session.rollback()
         logging.error(f"数据写入失败: {e}")
-    finally:
-        session.close()
 
 def update_stocks_daily_data_until(end_date):
     logging.debug(f"正在拉取截止{end_date}的日线数据")
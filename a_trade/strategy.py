@@ -4,25 +4,34 @@ import json
 from dotenv import load_dotenv
 from enum import Enum as PyEnum
 from abc import ABC, abstractmethod
-from typing import Callable, Optional, Dict, Type, List, Tuple, Union, Any
+from typing import Callable, Optional, Dict, Type, List, Tuple, Union, Any, Set
 import logging
 from pydantic import BaseModel
+import copy
 import hashlib
+from contextlib import contextmanager, nullcontext
 import datetime
-from dataclasses import dataclass
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 from sqlalchemy import (
     and_, func, Column, String, DateTime, Integer, DECIMAL, create_engine,
     ForeignKey, UniqueConstraint, ForeignKeyConstraint, Date, Index)
 from sqlalchemy.dialects.postgresql import JSONB, ENUM
 from sqlalchemy.orm import relationship, sessionmaker, declarative_base
+from sqlalchemy.orm.attributes import flag_modified
 from sqlalchemy.exc import IntegrityError
 
 from a_trade.time_schedule import TimeScheduleBus
 from a_trade.trade_calendar import TradeCalendar
-from a_trade.stock_minute_data import get_minute_data
+from a_trade.stock_minute_data import get_minute_data, get_minute_data_for_multiple_stocks
+from a_trade.minute_bar_store import MINUTE_BAR_STORE_ENABLED
 from a_trade.wechat_bot import WechatBot
 from a_trade.settings import get_project_path
 from a_trade.xlsx_file_manager import XLSXFileManager
+from a_trade.strategy_performance import (
+    PerformanceReport, SELL_STRATEGY_TYPE_KEY, performanceCache, trades_frame, compute_performance)
 from decimal import Decimal
 
 # 策略数据库配置
@@ -40,6 +49,14 @@ logging.info(f"策略数据库地址: {STRATEGY_DB_URL}")
 strategy_engine = create_engine(STRATEGY_DB_URL, echo=False)
 StrategySession = sessionmaker(bind=strategy_engine)
 StrategyBase = declarative_base()
+
+# 本地回测进程数，大于1时盘后分析与分时数据加载在进程池中并行执行
+BACKTEST_WORKERS = int(os.getenv('BACKTEST_WORKERS', '1'))
+# 本地回测是否使用内存账本，设置为0时每笔交易与观察条目直接写库
+BACKTEST_MEMORY_LEDGER = os.getenv('BACKTEST_MEMORY_LEDGER', '1') != '0'
+# 内存账本每隔多少个交易日写库一次，0表示只在回测结束时写库
+BACKTEST_LEDGER_CHECKPOINT_DAYS = int(os.getenv('BACKTEST_LEDGER_CHECKPOINT_DAYS', '0'))
+LEDGER_QUERY_CHUNK_SIZE = 1000
 class StrategyTaskMode(PyEnum):
     MODE_BACKTEST_LOCAL = "MODE_BACKTEST_LOCAL"
     MODE_BACKTEST_EMQUANT = "MODE_BACKTEST_EMQUANT"
@@ -198,11 +215,38 @@ class SellInfoRecord():
         self.tactics_type = -1
         self.other_data = None
 
+@dataclass
+class CollectedObservations:
+    """并行回测中盘后分析的结果，由主进程按交易日顺序统一写库"""
+    cleared_dates: List[str] = field(default_factory=list)
+    entries: List[Tuple[str, str, str, dict]] = field(default_factory=list)  # (trade_date, stock_code, stock_name, variables)
+
+# 策略参数影响的回测阶段，通过 Field(json_schema_extra={"stage": ...}) 标注，未标注的参数视为影响盘后分析
+PARAM_STAGE_ANALYSIS = 'analysis'   # 盘后分析，决定下一交易日观察池
+PARAM_STAGE_TRADE = 'trade'         # 盘中买卖
+
 class StrategyParams(BaseModel, ABC):
     def to_md5(self) -> str:
         parameters_json = json.dumps(self.model_dump(), sort_keys=True)
         md5_hash = hashlib.md5(parameters_json.encode('utf-8')).hexdigest()
         return md5_hash
+
+    @classmethod
+    def param_stage(cls, name: str) -> str:
+        """返回参数影响的回测阶段"""
+        extra = cls.model_fields[name].json_schema_extra
+        if isinstance(extra, dict):
+            return extra.get('stage', PARAM_STAGE_ANALYSIS)
+        return PARAM_STAGE_ANALYSIS
+
+    def analysis_md5(self) -> str:
+        """只根据影响盘后分析的参数计算哈希，相同哈希的参数组合生成的观察池相同"""
+        analysis_params = {
+            name: value for name, value in self.model_dump().items()
+            if self.param_stage(name) == PARAM_STAGE_ANALYSIS
+        }
+        parameters_json = json.dumps(analysis_params, sort_keys=True)
+        return hashlib.md5(parameters_json.encode('utf-8')).hexdigest()
     
 class ObservationVarMode(BaseModel):
     @classmethod
@@ -222,6 +266,379 @@ class ObservationVarMode(BaseModel):
         """
         return cls(**observation_variable.variables)
   
+class StrategyLedger(ABC):
+    """
+    策略账本，负责观察条目、观察变量与交易记录的读写。
+        - DatabaseLedger: 每次操作直接读写策略数据库，实盘与默认回测使用
+        - MemoryLedger: 本地回测期间全部保存在内存中，结束或检查点时批量写库
+    """
+
+    def __init__(self, strategy: 'Strategy'):
+        self.strategy = strategy
+
+    @abstractmethod
+    def add_observation(self, trade_date: str, stock_code: str, stock_name: str, variables: dict) -> Optional[Tuple[StrategyObservationEntry, ObservationVariable]]:
+        """添加观察条目及变量，已存在时返回 None"""
+        pass
+
+    @abstractmethod
+    def observations(self, trade_date: str) -> List[Tuple[StrategyObservationEntry, ObservationVariable]]:
+        """指定日期的观察条目及变量"""
+        pass
+
+    @abstractmethod
+    def observations_between(self, start_date: str, end_date: str) -> List[StrategyObservationEntry]:
+        """日期区间内的观察条目"""
+        pass
+
+    @abstractmethod
+    def save_observations(self, items: List[Tuple[StrategyObservationEntry, ObservationVariable]]) -> None:
+        """保存对观察条目（交易日期）及观察变量的修改"""
+        pass
+
+    @abstractmethod
+    def clear_observations(self, trade_date: str) -> None:
+        """清理指定日期的观察条目、观察变量及当前模式的交易记录"""
+        pass
+
+    @abstractmethod
+    def open_positions(self, before: datetime.datetime) -> List[Tuple[TradeRecord, StrategyObservationEntry, ObservationVariable]]:
+        """当前模式下 before 之前买入且未卖出的持仓"""
+        pass
+
+    @abstractmethod
+    def add_trade_record(self, entry: StrategyObservationEntry, buy_price: Decimal, buy_time: datetime.datetime) -> TradeRecord:
+        pass
+
+    @abstractmethod
+    def close_position(self, stock_code: str, before: datetime.datetime, sell_price: Decimal, sell_time: datetime.datetime,
+                       fallback_price: Callable[[], Optional[Decimal]] = None, sell_type: Optional[int] = None) -> Optional[TradeRecord]:
+        """
+        卖出 before 之前买入的持仓，计算收益率
+
+        参数:
+            fallback_price: 卖出价格为0时调用，返回实际卖出价格（本地回测按卖出时刻收盘价）
+            sell_type: 触发卖出的卖出策略类型，记录在观察变量中用于收益归因
+        """
+        pass
+
+    def flush(self, reload: bool = True) -> None:
+        """将内存中的数据写入数据库"""
+        pass
+
+    @staticmethod
+    def _settle(record: TradeRecord, var: Optional[ObservationVariable], sell_price: Decimal, sell_time: datetime.datetime,
+                fallback_price: Callable[[], Optional[Decimal]] = None, sell_type: Optional[int] = None) -> None:
+        if sell_price == 0 and fallback_price is not None:
+            sell_price = fallback_price() or sell_price
+        record.sell_time = sell_time
+        record.sell_price = sell_price
+        record.profit_rate = round(((sell_price - record.buy_price) / record.buy_price) * 100, 2)
+        if sell_type is not None and var is not None:
+            var.variables[SELL_STRATEGY_TYPE_KEY] = int(sell_type)
+
+
+class DatabaseLedger(StrategyLedger):
+    """每次操作直接读写策略数据库"""
+
+    def add_observation(self, trade_date: str, stock_code: str, stock_name: str, variables: dict) -> Optional[Tuple[StrategyObservationEntry, ObservationVariable]]:
+        with StrategySession() as session:
+            try:
+                # 创建新的观察条目
+                new_entry = StrategyObservationEntry(
+                    strategy_id=self.strategy.strategy_id,
+                    version_id=self.strategy.version_id,
+                    trade_date=trade_date,
+                    stock_code=stock_code,
+                    stock_name=stock_name
+                )
+                
+                # 创建对应的观察变量
+                new_variable = ObservationVariable(
+                    observation_entry=new_entry,
+                    variables=variables
+                )
+                
+                # 添加并提交
+                session.add(new_entry)
+                session.add(new_variable)
+                session.commit()
+                logging.info(f"成功添加观察条目及变量: {new_entry}")
+                return new_entry, new_variable
+            except IntegrityError:
+                session.rollback()
+                logging.warning(f"观察条目已存在: {stock_code}@{trade_date}")
+                return None
+            except Exception as e:
+                session.rollback()
+                logging.error(f"添加观察条目及变量时发生错误: {e}")
+                raise
+
+    def observations(self, trade_date: str) -> List[Tuple[StrategyObservationEntry, ObservationVariable]]:
+        with StrategySession() as session:
+            return self.strategy.query_observation_data(session=session, include_observation_variable=True, filters=[
+                StrategyObservationEntry.trade_date == trade_date
+            ])
+
+    def observations_between(self, start_date: str, end_date: str) -> List[StrategyObservationEntry]:
+        with StrategySession() as session:
+            return self.strategy.query_observation_data(session=session, filters=[
+                StrategyObservationEntry.trade_date.between(start_date, end_date)
+            ])
+
+    def save_observations(self, items: List[Tuple[StrategyObservationEntry, ObservationVariable]]) -> None:
+        with StrategySession() as session:
+            for entry, var in items:
+                session.merge(entry)
+                merged_var = session.merge(var)
+                flag_modified(merged_var, "variables")
+            try:
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                logging.error(f"保存观察数据时发生错误: {e}")
+                raise
+
+    def clear_observations(self, trade_date: str) -> None:
+        with StrategySession() as session:
+            try:
+                deleted_count = self.strategy.delete_observation_records(session, [trade_date])
+                session.commit()
+                logging.info(f"成功删除 {deleted_count} 条当前策略版本的观察数据、关联变量及交易记录")
+            except Exception as e:
+                session.rollback()
+                logging.error(f"删除策略观察数据时发生错误: {e}")
+                raise
+
+    def open_positions(self, before: datetime.datetime) -> List[Tuple[TradeRecord, StrategyObservationEntry, ObservationVariable]]:
+        with StrategySession() as session:
+            return self.strategy.query_trade_record_data(session=session, filters=[
+                TradeRecord.sell_price == None,
+                TradeRecord.buy_time < before
+            ])
+
+    def add_trade_record(self, entry: StrategyObservationEntry, buy_price: Decimal, buy_time: datetime.datetime) -> TradeRecord:
+        with StrategySession() as session:
+            new_record = TradeRecord(
+                entry_id=entry.entry_id,
+                mode=self.strategy.run_mode,
+                buy_price=buy_price,
+                buy_time=buy_time,
+                sell_price=None,
+                sell_time=None,
+                profit_rate=None,
+            )
+            session.add(new_record)
+            session.commit()
+            logging.info(f"记录买入交易: {new_record}")
+            return new_record
+
+    def close_position(self, stock_code: str, before: datetime.datetime, sell_price: Decimal, sell_time: datetime.datetime,
+                       fallback_price: Callable[[], Optional[Decimal]] = None, sell_type: Optional[int] = None) -> Optional[TradeRecord]:
+        with StrategySession() as session:
+            results = self.strategy.query_trade_record_data(session=session, filters=[
+                StrategyObservationEntry.stock_code == stock_code,
+                TradeRecord.sell_price == None,
+                TradeRecord.buy_time < before,
+            ])
+            if not results:
+                return None
+            record, _, var = results[0]
+            self._settle(record, var, sell_price, sell_time, fallback_price, sell_type)
+            if sell_type is not None:
+                flag_modified(var, "variables")
+            session.commit()
+            return record
+
+
+class MemoryLedger(StrategyLedger):
+    """
+    本地回测内存账本。
+
+    回测开始日期及之后的观察数据归账本所有：首次访问某个交易日时从数据库复制一份到内存（保留原有主键），
+    之后的读写全部在内存中完成；开始日期之前买入的持仓在内存中跟踪卖出结果。
+    flush 时在同一事务中删除账本所有交易日的数据库记录，再批量插入内存中的数据并更新持仓，
+    已有记录按原主键写回，回测期间持有的 entry_id 等主键在写库后仍然有效。
+    """
+
+    def __init__(self, strategy: 'Strategy', start_date: str, end_date: str, checkpoint_days: int = 0):
+        super().__init__(strategy)
+        self.start_date = start_date
+        self.end_date = end_date
+        self.checkpoint_days = checkpoint_days
+        self.mode = strategy.run_mode
+        self._load()
+
+    def _load(self) -> None:
+        # 交易日期 -> 股票代码 -> (观察条目, 观察变量)，观察条目及其交易记录均为未写库的新对象，已有记录保留原主键
+        self._observations: Dict[str, Dict[str, Tuple[StrategyObservationEntry, ObservationVariable]]] = {}
+        self._cleared_dates: Set[str] = set()
+        # 开始日期之前买入的持仓：(交易记录, 观察条目, 观察变量)，对象已脱离会话
+        self._external_positions: List[Tuple[TradeRecord, StrategyObservationEntry, ObservationVariable]] = []
+        # 已卖出的历史持仓：(交易记录, 需要同时更新的观察变量)
+        self._dirty_external: List[Tuple[TradeRecord, Optional[ObservationVariable]]] = []
+
+        last_date = TradeCalendar.get_next_trade_date(self.end_date) or self.end_date
+        with StrategySession() as session:
+            rows = self.strategy.query_observation_data(session=session, include_observation_variable=True, filters=[
+                StrategyObservationEntry.trade_date.between(self.start_date, last_date)
+            ])
+            self._add_copies(session, rows)
+            for trade_date in TradeCalendar.get_trade_dates(self.start_date, last_date):
+                self._observations.setdefault(trade_date, {})
+
+            self._external_positions = self.strategy.query_trade_record_data(session=session, filters=[
+                TradeRecord.sell_price == None,
+                TradeRecord.buy_time < datetime.datetime.strptime(self.start_date, '%Y%m%d'),
+                StrategyObservationEntry.trade_date < self.start_date
+            ])
+        logging.info(f"内存账本已加载 {self.start_date} - {last_date}: 观察条目 {len(rows)} 条, 历史持仓 {len(self._external_positions)} 条")
+
+    def _add_copies(self, session, rows: List[Tuple[StrategyObservationEntry, ObservationVariable]]) -> None:
+        """复制数据库中的观察条目、观察变量及全部模式的交易记录到内存"""
+        records_by_entry: Dict[int, List[TradeRecord]] = {}
+        entry_ids = [entry.entry_id for entry, _ in rows]
+        for start in range(0, len(entry_ids), LEDGER_QUERY_CHUNK_SIZE):
+            for record in session.query(TradeRecord).filter(TradeRecord.entry_id.in_(entry_ids[start:start + LEDGER_QUERY_CHUNK_SIZE])):
+                records_by_entry.setdefault(record.entry_id, []).append(record)
+
+        for entry, var in rows:
+            entry_copy = StrategyObservationEntry(
+                entry_id=entry.entry_id, strategy_id=entry.strategy_id, version_id=entry.version_id, trade_date=entry.trade_date,
+                stock_code=entry.stock_code, stock_name=entry.stock_name)
+            var_copy = ObservationVariable(
+                variable_id=var.variable_id, observation_entry=entry_copy, variables=copy.deepcopy(var.variables))
+            for record in records_by_entry.get(entry.entry_id, []):
+                TradeRecord(
+                    trade_id=record.trade_id, observation_entry=entry_copy, mode=record.mode, buy_time=record.buy_time,
+                    buy_price=record.buy_price, sell_time=record.sell_time, sell_price=record.sell_price, profit_rate=record.profit_rate)
+            self._observations.setdefault(entry.trade_date, {})[entry.stock_code] = (entry_copy, var_copy)
+
+    def _ensure_loaded(self, trade_date: str) -> Dict[str, Tuple[StrategyObservationEntry, ObservationVariable]]:
+        if trade_date < self.start_date:
+            raise ValueError(f"内存账本不支持修改回测开始日期 {self.start_date} 之前的观察数据: {trade_date}")
+        if trade_date not in self._observations:
+            with StrategySession() as session:
+                rows = self.strategy.query_observation_data(session=session, include_observation_variable=True, filters=[
+                    StrategyObservationEntry.trade_date == trade_date
+                ])
+                self._observations[trade_date] = {}
+                self._add_copies(session, rows)
+        return self._observations[trade_date]
+
+    def add_observation(self, trade_date: str, stock_code: str, stock_name: str, variables: dict) -> Optional[Tuple[StrategyObservationEntry, ObservationVariable]]:
+        date_observations = self._ensure_loaded(trade_date)
+        if stock_code in date_observations:
+            logging.warning(f"观察条目已存在: {stock_code}@{trade_date}")
+            return None
+        new_entry = StrategyObservationEntry(
+            strategy_id=self.strategy.strategy_id,
+            version_id=self.strategy.version_id,
+            trade_date=trade_date,
+            stock_code=stock_code,
+            stock_name=stock_name
+        )
+        new_variable = ObservationVariable(observation_entry=new_entry, variables=variables)
+        date_observations[stock_code] = (new_entry, new_variable)
+        return new_entry, new_variable
+
+    def observations(self, trade_date: str) -> List[Tuple[StrategyObservationEntry, ObservationVariable]]:
+        if trade_date < self.start_date:
+            return DatabaseLedger(self.strategy).observations(trade_date)
+        return list(self._ensure_loaded(trade_date).values())
+
+    def observations_between(self, start_date: str, end_date: str) -> List[StrategyObservationEntry]:
+        entries = []
+        if start_date < self.start_date:
+            # 开始日期之前的观察数据不归账本所有，直接读库
+            previous_date = TradeCalendar.get_previous_trade_date(self.start_date)
+            entries.extend(DatabaseLedger(self.strategy).observations_between(start_date, min(end_date, previous_date)))
+        for trade_date in TradeCalendar.get_trade_dates(max(start_date, self.start_date), end_date):
+            entries.extend(entry for entry, _ in self._ensure_loaded(trade_date).values())
+        return entries
+
+    def save_observations(self, items: List[Tuple[StrategyObservationEntry, ObservationVariable]]) -> None:
+        # 观察变量已在内存中修改，只需处理交易日期变化的条目
+        for entry, var in items:
+            for trade_date, date_observations in self._observations.items():
+                current = date_observations.get(entry.stock_code)
+                if current is not None and current[0] is entry and trade_date != entry.trade_date:
+                    del date_observations[entry.stock_code]
+                    target = self._ensure_loaded(entry.trade_date)
+                    if entry.stock_code in target:
+                        raise ValueError(f"观察条目已存在: {entry.stock_code}@{entry.trade_date}")
+                    target[entry.stock_code] = (entry, var)
+                    break
+
+    def clear_observations(self, trade_date: str) -> None:
+        self._ensure_loaded(trade_date)
+        self._observations[trade_date] = {}
+        self._cleared_dates.add(trade_date)
+
+    def _positions(self):
+        for date_observations in self._observations.values():
+            for entry, var in date_observations.values():
+                for record in entry.trade_records:
+                    if record.mode == self.mode:
+                        yield record, entry, var
+        yield from self._external_positions
+
+    def open_positions(self, before: datetime.datetime) -> List[Tuple[TradeRecord, StrategyObservationEntry, ObservationVariable]]:
+        return [
+            (record, entry, var) for record, entry, var in self._positions()
+            if record.sell_price is None and record.buy_time is not None and record.buy_time < before
+        ]
+
+    def add_trade_record(self, entry: StrategyObservationEntry, buy_price: Decimal, buy_time: datetime.datetime) -> TradeRecord:
+        new_record = TradeRecord(
+            observation_entry=entry,
+            mode=self.mode,
+            buy_price=buy_price,
+            buy_time=buy_time,
+            sell_price=None,
+            sell_time=None,
+            profit_rate=None,
+        )
+        logging.info(f"记录买入交易: {new_record}")
+        return new_record
+
+    def close_position(self, stock_code: str, before: datetime.datetime, sell_price: Decimal, sell_time: datetime.datetime,
+                       fallback_price: Callable[[], Optional[Decimal]] = None, sell_type: Optional[int] = None) -> Optional[TradeRecord]:
+        for record, entry, var in self.open_positions(before):
+            if entry.stock_code == stock_code:
+                self._settle(record, var, sell_price, sell_time, fallback_price, sell_type)
+                if any(record is external[0] for external in self._external_positions):
+                    self._dirty_external.append((record, var if sell_type is not None else None))
+                return record
+        return None
+
+    def flush(self, reload: bool = True) -> None:
+        """
+        在同一事务中替换账本所有交易日的数据库记录
+
+        参数:
+            reload: bool, 写库后是否重新加载，账本不再使用时传 False
+        """
+        owned_dates = sorted(set(self._observations.keys()) | self._cleared_dates)
+        entries = [entry for date_observations in self._observations.values() for entry, _ in date_observations.values()]
+        with StrategySession() as session:
+            try:
+                deleted_count = self.strategy.delete_observation_records(session, owned_dates)
+                session.add_all(entries)
+                for record, var in self._dirty_external:
+                    session.merge(record)
+                    if var is not None:
+                        flag_modified(session.merge(var), "variables")
+                session.commit()
+                logging.info(f"内存账本写库完成: 替换 {deleted_count} 条观察条目为 {len(entries)} 条, 更新历史持仓 {len(self._dirty_external)} 条")
+            except Exception as e:
+                session.rollback()
+                logging.error(f"内存账本写库时发生错误: {e}")
+                raise
+        if reload:
+            self._load()
+
+
 class StrategyTask(ABC):
     """
     通用策略任务基类，封装策略每日执行的通用流程。
@@ -229,6 +646,11 @@ class StrategyTask(ABC):
         - 监听bar数据，买卖股票
         - 盘后数据整理
     """
+    # 盘后分析（analysis_observed_stocks）只依赖行情数据、不依赖当日持仓时设为 True，
+    # 并行回测会在进程池中提前完成所有交易日的盘后分析
+    supports_parallel_analysis = False
+    # 策略任务的所有观察数据与交易记录读写都经过 ledger 时设为 True，本地回测可使用内存账本
+    supports_memory_ledger = False
 
     def __init__(self, strategy: 'Strategy', trade_date: str, mode: StrategyTaskMode = StrategyTaskMode.MODE_BACKTEST_LOCAL, enable_send_msg: bool = False):
         self.trade_date = trade_date
@@ -248,41 +670,47 @@ class StrategyTask(ABC):
         self.observe_stocks_to_sell: Dict[str, Tuple[TradeRecord, StrategyObservationEntry]] = {}
         self.sell_info_record_map: Dict[str, SellInfoRecord] = {}
         self.enable_send_msg = enable_send_msg
+
+        # 并行回测：盘后分析已提前完成，盘后流程中跳过
+        self.analysis_precomputed = False
+        # 并行回测：盘后分析只收集观察条目，不写库
+        self.collected_observations: Optional[CollectedObservations] = None
         logging.info(f"策略任务已创建 {self.run_mode} {self.trade_date}")
 
+    @property
+    def params(self) -> StrategyParams:
+        return self.strategy.params
+
+    @property
+    def ledger(self) -> StrategyLedger:
+        return self.strategy.ledger
+
     def prepare_sell_pool(self, subscribe=False):
-        with StrategySession() as session:
-            # 查询未完成卖出的交易记录，并联结观察条目以获取股票代码
-            trade_date_dt = datetime.datetime.strptime(self.trade_date, '%Y%m%d')
-            trade_records = self.strategy.query_trade_record_data(session=session, filters=[
-                TradeRecord.sell_price == None,
-                TradeRecord.buy_time < trade_date_dt
-            ])
-            
-            # 将查询结果存入 observe_stocks_to_sell 字典
-            self.observe_stocks_to_sell = {
-                entry.stock_code: (trade_record, entry) for trade_record, entry, _ in trade_records
-            }
+        # 查询未完成卖出的交易记录，并联结观察条目以获取股票代码
+        trade_date_dt = datetime.datetime.strptime(self.trade_date, '%Y%m%d')
+        trade_records = self.ledger.open_positions(trade_date_dt)
+        
+        # 将查询结果存入 observe_stocks_to_sell 字典
+        self.observe_stocks_to_sell = {
+            entry.stock_code: (trade_record, entry) for trade_record, entry, _ in trade_records
+        }
 
-            self.sell_info_record_map = {stock_code: SellInfoRecord() for stock_code in self.observe_stocks_to_sell.keys()}
+        self.sell_info_record_map = {stock_code: SellInfoRecord() for stock_code in self.observe_stocks_to_sell.keys()}
 
-            if subscribe:
-                self.will_subscribe_stocks(list(self.observe_stocks_to_sell.keys()))
+        if subscribe:
+            self.will_subscribe_stocks(list(self.observe_stocks_to_sell.keys()))
 
     def prepare_buy_pool(self, subscribe=False):
-        with StrategySession() as session:
-            entry_results = self.strategy.query_observation_data(session=session, include_observation_variable=True, filters=[
-                StrategyObservationEntry.trade_date == self.trade_date
-            ])
-            
-            # 将查询结果存入observe_stocks_to_buy字典
-            self.observe_stocks_to_buy = {
-                entry.stock_code: (entry, var) for entry, var in entry_results
-            }
-            
-            self.buy_info_record_map = {stock_code: BuyInfoRecord() for stock_code in self.observe_stocks_to_buy.keys()}
-            if subscribe:
-                self.will_subscribe_stocks(list(self.observe_stocks_to_buy.keys()))
+        entry_results = self.ledger.observations(self.trade_date)
+        
+        # 将查询结果存入observe_stocks_to_buy字典
+        self.observe_stocks_to_buy = {
+            entry.stock_code: (entry, var) for entry, var in entry_results
+        }
+        
+        self.buy_info_record_map = {stock_code: BuyInfoRecord() for stock_code in self.observe_stocks_to_buy.keys()}
+        if subscribe:
+            self.will_subscribe_stocks(list(self.observe_stocks_to_buy.keys()))
     
     def notice_observed_pool(self):    
         # 1) 整理“买入观察池”列表
@@ -347,21 +775,9 @@ class StrategyTask(ABC):
         if self._enable_send_msg():
             WechatBot.send_buy_stock_msg(stock_code, stock_name, buy_price, buy_time)
             
-        with StrategySession() as session:
-            new_record = TradeRecord(
-                entry_id=observe_stock.entry_id,
-                mode=self.run_mode,
-                buy_price=buy_price,
-                buy_time=buy_time,
-                sell_price=None,
-                sell_time=None,
-                profit_rate=None,
-            )
-            session.add(new_record)
-            session.commit()
-            logging.info(f"记录买入交易: {new_record}")
+        self.ledger.add_trade_record(observe_stock, buy_price, buy_time)
             
-    def sell_stock(self, stock_code: str, sell_price: float, trade_time: datetime.datetime, sell_reason: str=None):
+    def sell_stock(self, stock_code: str, sell_price: float, trade_time: datetime.datetime, sell_reason: str=None, sell_type: Optional[int]=None):
         sell_price = Decimal(sell_price)
         logging.info(f"卖出 {stock_code} {sell_price} {trade_time} 基于 {sell_reason}")
         observer_sell_info = self.sell_info_record_map[stock_code]
@@ -374,24 +790,18 @@ class StrategyTask(ABC):
 
         observer_sell_info.is_sell = True
         self.stop_subscribe_buy_stock(stock_code, SubscribeStopType.STOPTYPE_SELL)
-        with StrategySession() as session:
-            target_time = datetime.datetime.strptime(self.trade_date, '%Y%m%d')
-            results = self.strategy.query_trade_record_data(session=session, filters=[
-                StrategyObservationEntry.stock_code == stock_code,
-                TradeRecord.sell_price == None,
-                TradeRecord.buy_time < target_time,
-            ])
-            if len(results) > 0:
-                record = results[0][0]
-                if self.run_mode == StrategyTaskMode.MODE_BACKTEST_LOCAL and sell_price == 0:
-                    minutes_data = get_minute_data(stock_code, self.trade_date, trade_time)
-                    for minute in minutes_data:
-                        if datetime.datetime.strptime(minute.trade_time, "%Y-%m-%d %H:%M:%S") == trade_time:
-                            sell_price = Decimal(minute.close)
-                record.sell_time = trade_time
-                record.sell_price = sell_price
-                record.profit_rate = round(((sell_price - record.buy_price) / record.buy_price) * 100,2)
-                session.commit()
+
+        def minute_close_price() -> Optional[Decimal]:
+            minutes_data = get_minute_data(stock_code, self.trade_date, trade_time)
+            for minute in minutes_data:
+                if datetime.datetime.strptime(minute.trade_time, "%Y-%m-%d %H:%M:%S") == trade_time:
+                    return Decimal(minute.close)
+            return None
+
+        target_time = datetime.datetime.strptime(self.trade_date, '%Y%m%d')
+        self.ledger.close_position(stock_code, target_time, sell_price, trade_time,
+                                   fallback_price=minute_close_price if self.run_mode == StrategyTaskMode.MODE_BACKTEST_LOCAL else None,
+                                   sell_type=sell_type)
 
     def start_local_trade(self):
         if self.run_mode == StrategyTaskMode.MODE_BACKTEST_LOCAL:
@@ -416,40 +826,32 @@ class StrategyTask(ABC):
         if variables is None:
             variables = {}
 
-        with StrategySession() as session:
-            try:
-                # 创建新的观察条目
-                new_entry = StrategyObservationEntry(
-                    strategy_id=self.strategy.strategy_id,
-                    version_id=self.strategy.version_id,
-                    trade_date=trade_date,
-                    stock_code=stock_code,
-                    stock_name=stock_name
-                )
-                
-                # 创建对应的观察变量
-                new_variable = ObservationVariable(
-                    observation_entry=new_entry,
-                    variables=variables
-                )
-                
-                # 添加并提交
-                session.add(new_entry)
-                session.add(new_variable)
-                session.commit()
-                logging.info(f"成功添加观察条目及变量: {new_entry}")
-                if self.trade_date == trade_date and new_entry.stock_code not in self.observe_stocks_to_buy:
-                    self.observe_stocks_to_buy[stock_code] = (new_entry, new_variable)
-                return new_entry
-            except IntegrityError:
-                session.rollback()
-                logging.warning(f"观察条目已存在: {stock_code}@{trade_date}")
-                return None
-            except Exception as e:
-                session.rollback()
-                logging.error(f"添加观察条目及变量时发生错误: {e}")
-                raise
+        if self.collected_observations is not None:
+            self.collected_observations.entries.append((trade_date, stock_code, stock_name, variables))
+            return None
+
+        result = self.ledger.add_observation(trade_date, stock_code, stock_name, variables)
+        if result is None:
+            return None
+        new_entry, new_variable = result
+        if self.trade_date == trade_date and stock_code not in self.observe_stocks_to_buy:
+            self.observe_stocks_to_buy[stock_code] = (new_entry, new_variable)
+        return new_entry
             
+    def clear_observation_records(self, trade_date: str) -> None:
+        """清理指定日期当前策略版本的观察数据，收集模式下只记录日期，由主进程汇总时清理"""
+        if self.collected_observations is not None:
+            self.collected_observations.cleared_dates.append(trade_date)
+            return
+        self.strategy.clear_records(trade_date)
+
+    def analysis_observed_stocks(self):
+        """
+        盘后分析，生成下一交易日的观察池。子类按需实现，
+        实现只依赖行情数据时设置 supports_parallel_analysis = True 以支持并行回测。
+        """
+        pass
+
     def on_minute_data(self, stock_code: str, minute_data, trade_time: str):
         """
         处理分钟数据的回调函数，实现平均累计成交价的计算并保存。子类复写需要调用父类方法
@@ -653,6 +1055,7 @@ class Strategy(ABC):
                     # 如果版本已存在，直接使用现有ID
                     self.version_id = version_exists.version_id
 
+        self.ledger: StrategyLedger = DatabaseLedger(self)
         logging.info(f"策略已经创建: {self.strategy_name()} 版本v{self.version_id} 参数{self.params} mode {self.run_mode}")
 
     def publish(self, clear=False):
@@ -747,58 +1150,211 @@ class Strategy(ABC):
 
     def clear_records(self, trade_date) -> None:
         """
-        清理指定日期范围内的当前策略版本的观察数据
+        清理指定日期的当前策略版本的观察数据
 
         参数:
-            start_date: str, 开始日期 (格式: YYYYMMDD)
-            end_date: str, 结束日期 (格式: YYYYMMDD)
+            trade_date: str, 交易日期 (格式: YYYYMMDD)
         """
         if not hasattr(self, 'strategy_id') or not hasattr(self, 'version_id'):
             raise ValueError("请先创建策略版本")
+        self.ledger.clear_observations(trade_date)
 
-        with StrategySession() as session:
+    def delete_observation_records(self, session, trade_dates: List[str]) -> int:
+        """
+        在给定会话中删除指定日期当前策略版本的观察条目、关联变量及交易记录，不提交
+
+        返回:
+            int: 删除的观察条目数量
+        """
+        if not trade_dates:
+            return 0
+        # 构建删除条件，限定当前策略版本
+        delete_condition = and_(
+            StrategyObservationEntry.trade_date.in_(trade_dates),
+            StrategyObservationEntry.strategy_id == self.strategy_id,
+            StrategyObservationEntry.version_id == self.version_id
+        )
+        
+        # 获取要删除的entry_ids
+        entry_ids = session.query(StrategyObservationEntry.entry_id).filter(delete_condition).subquery()
+        
+        # 删除关联的交易记录
+        session.query(TradeRecord).filter(
+            TradeRecord.entry_id.in_(entry_ids),
+            TradeRecord.mode == self.run_mode  # 限定当前mode
+        ).delete(synchronize_session=False)
+        
+        # 删除关联的ObservationVariable
+        session.query(ObservationVariable).filter(
+            ObservationVariable.entry_id.in_(entry_ids)
+        ).delete(synchronize_session=False)
+        
+        # 删除StrategyObservationEntry
+        return session.query(StrategyObservationEntry).filter(delete_condition).delete(synchronize_session=False)
+
+    def minute_data_requests(self, start_date: str, end_date: str) -> Dict[str, Set[str]]:
+        """
+        计算回测区间内策略可能订阅的分时数据，子类可以重写以补充策略特有的股票
+
+        默认包含：
+            - 区间内已有的观察条目股票（买入日订阅）及其下一交易日（持仓卖出日订阅）
+            - 区间内每个盘后分析日的候选股票（observation_candidates）在之后的买入日与卖出日的数据，
+              覆盖首次回测时尚未生成的观察条目
+            - 回测开始前未卖出的持仓股票在开始日的数据
+
+        返回:
+            Dict[str, Set[str]]: 交易日期 -> 股票代码集合
+        """
+        from a_trade.minute_data_prefetcher import holding_minute_requests, merge_minute_requests
+        requests: Dict[str, Set[str]] = {}
+        trade_dates = TradeCalendar.get_trade_dates(start_date, end_date)
+        if not trade_dates:
+            return requests
+        next_dates = {trade_date: TradeCalendar.get_next_trade_date(trade_date) for trade_date in trade_dates}
+
+        for entry in self.ledger.observations_between(trade_dates[0], trade_dates[-1]):
+            requests.setdefault(entry.trade_date, set()).add(entry.stock_code)
+            next_date = next_dates.get(entry.trade_date)
+            if next_date and next_date <= end_date:
+                requests.setdefault(next_date, set()).add(entry.stock_code)
+
+        merge_minute_requests(requests, holding_minute_requests(self.observation_candidates(trade_dates), end_date))
+
+        holdings = self.ledger.open_positions(datetime.datetime.strptime(trade_dates[0], '%Y%m%d'))
+        for _, entry, _ in holdings:
+            requests.setdefault(trade_dates[0], set()).add(entry.stock_code)
+        return requests
+
+    def observation_candidates(self, trade_dates: List[str]) -> Dict[str, Set[str]]:
+        """
+        盘后分析日可能被选入观察的股票（需为实际结果的超集），用于预取回测中新生成观察条目的分时数据，
+        子类按策略的选股范围重写，默认不补充
+
+        返回:
+            Dict[str, Set[str]]: 盘后分析日 -> 股票代码集合
+        """
+        return {}
+
+    def prefetch_minute_data(self, start_date: str, end_date: str, client=None) -> None:
+        """回测开始前并发拉取缺失的分时数据"""
+        from a_trade.minute_data_prefetcher import MinuteDataPrefetcher
+        requests = self.minute_data_requests(start_date, end_date)
+        MinuteDataPrefetcher(client=client).prefetch(requests)
+
+    @contextmanager
+    def memory_ledger(self, start_date: str, end_date: str, checkpoint_days: int = BACKTEST_LEDGER_CHECKPOINT_DAYS):
+        """
+        在上下文中使用内存账本，退出时批量写库并恢复数据库账本。策略任务不支持或非本地回测时不做处理。
+        回测中途抛出异常时同样写库，保留异常前已完成的观察数据与交易记录
+
+        参数:
+            checkpoint_days: int, 每隔多少个交易日写库一次，0表示只在退出时写库
+        """
+        if not self.task_cls.supports_memory_ledger or self.run_mode != StrategyTaskMode.MODE_BACKTEST_LOCAL:
+            yield self.ledger
+            return
+        ledger = MemoryLedger(self, start_date, end_date, checkpoint_days)
+        self.ledger = ledger
+        try:
+            yield ledger
+        finally:
             try:
-                # 构建删除条件，限定当前策略版本
-                delete_condition = and_(
-                    StrategyObservationEntry.trade_date == trade_date,
-                    StrategyObservationEntry.strategy_id == self.strategy_id,
-                    StrategyObservationEntry.version_id == self.version_id
-                )
-                
-                # 获取要删除的entry_ids
-                entries_to_delete = session.query(StrategyObservationEntry).filter(delete_condition).all()
-                entry_ids = [entry.entry_id for entry in entries_to_delete]
-                
-                if entry_ids:
-                    # 删除关联的交易记录
-                    session.query(TradeRecord).filter(
-                        TradeRecord.entry_id.in_(entry_ids),
-                        TradeRecord.mode == self.run_mode  # 限定当前mode
-                    ).delete(synchronize_session=False)
-                    
-                    # 删除关联的ObservationVariable
-                    session.query(ObservationVariable).filter(
-                        ObservationVariable.entry_id.in_(entry_ids)
-                    ).delete(synchronize_session=False)
-                
-                # 删除StrategyObservationEntry
-                deleted_count = session.query(StrategyObservationEntry).filter(delete_condition).delete(synchronize_session=False)
-                
-                session.commit()
-                logging.info(f"成功删除 {deleted_count} 条当前策略版本的观察数据、关联变量及交易记录")
-            except Exception as e:
-                session.rollback()
-                logging.error(f"删除策略观察数据时发生错误: {e}")
-                raise
+                ledger.flush(reload=False)
+            finally:
+                self.ledger = DatabaseLedger(self)
+
+    def _checkpoint_ledger(self, day_index: int) -> None:
+        if isinstance(self.ledger, MemoryLedger) and self.ledger.checkpoint_days and (day_index + 1) % self.ledger.checkpoint_days == 0:
+            self.ledger.flush()
+
+    def iterate_simulation_days(self, start_date: str, end_date: str, closure: Callable[[str], None]) -> None:
+        """按交易日顺序执行回测，内存账本按检查点间隔写库"""
+        for day_index, trade_date in enumerate(TradeCalendar.get_trade_dates(start_date, end_date)):
+            closure(trade_date)
+            self._checkpoint_ledger(day_index)
+
+    def local_simulation(self, start_date: str, end_date: str, prefetch: bool = True, workers: int = BACKTEST_WORKERS,
+                         memory_ledger: bool = BACKTEST_MEMORY_LEDGER) -> None:
+        """
+        本地回测
 
-    def local_simulation(self, start_date: str, end_date: str) -> None:
+        参数:
+            start_date: str, 开始日期 (格式: YYYYMMDD)
+            end_date: str, 结束日期 (格式: YYYYMMDD)
+            prefetch: bool, 回测前是否并发拉取缺失的分时数据
+            workers: int, 进程数，大于1且策略支持时使用并行回测
+            memory_ledger: bool, 策略支持时回测期间使用内存账本，结束后批量写库
+        """
         import time
         start_time = time.time()
-        TradeCalendar.iterate_trade_days(start_date, end_date, self.strategy_simulation_daily_work)
+        parallel = workers > 1 and self.task_cls.supports_parallel_analysis and self.run_mode == StrategyTaskMode.MODE_BACKTEST_LOCAL
+        # 并行回测在盘后分析写入观察条目后再拉取分时数据，此处只为顺序回测预取
+        if prefetch and not parallel:
+            self.prefetch_minute_data(start_date, end_date)
+        with (self.memory_ledger(start_date, end_date) if memory_ledger else nullcontext()):
+            if parallel:
+                self.parallel_local_simulation(start_date, end_date, workers, prefetch)
+            else:
+                if workers > 1:
+                    logging.warning(f"策略 {self.strategy_name()} 不支持并行回测，按交易日顺序执行")
+                self.iterate_simulation_days(start_date, end_date, self.strategy_simulation_daily_work)
         end_time = time.time()
         elapsed_time = end_time - start_time
         logging.info(f"{start_date} - {end_date}策略 {self.strategy_name} 执行完成，耗时: {elapsed_time:.2f} 秒")
 
+    def parallel_local_simulation(self, start_date: str, end_date: str, workers: int, prefetch: bool = True) -> None:
+        """
+        并行回测，交易日之间只通过持仓相互依赖：
+            1. 进程池中按交易日分片执行盘后分析，主进程按交易日顺序写入观察条目，结果与顺序执行一致
+            2. 进程池中按交易日分片加载分时数据，写入列式存储
+            3. 主进程按交易日顺序重放买入/卖出，盘后流程跳过已完成的分析
+        """
+        trade_dates = TradeCalendar.get_trade_dates(start_date, end_date)
+        if not trade_dates:
+            return
+        mp_context = multiprocessing.get_context('spawn')
+
+        # 1. 盘后分析
+        analysis_results: Dict[str, CollectedObservations] = {}
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as executor:
+            futures = [
+                executor.submit(_analysis_shard_worker, type(self), self.params, shard)
+                for shard in _shard_trade_dates(trade_dates, workers)
+            ]
+            for future in futures:
+                analysis_results.update(future.result())
+        self.apply_collected_observations(trade_dates, analysis_results)
+        logging.info(f"{start_date} - {end_date} 盘后分析并行完成, 共 {len(trade_dates)} 个交易日")
+
+        # 2. 分时数据加载
+        if prefetch:
+            self.prefetch_minute_data(start_date, end_date)
+        if MINUTE_BAR_STORE_ENABLED:
+            requests = sorted((trade_date, sorted(stock_codes)) for trade_date, stock_codes in self.minute_data_requests(start_date, end_date).items())
+            with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as executor:
+                loaded = sum(executor.map(_minute_data_shard_worker, _shard_trade_dates(requests, workers)))
+            logging.info(f"{start_date} - {end_date} 分时数据并行加载完成, 共 {loaded} 个股票日")
+
+        # 3. 顺序重放
+        self.iterate_simulation_days(start_date, end_date, self.strategy_replay_daily_work)
+
+    def apply_collected_observations(self, trade_dates: List[str], analysis_results: Dict[str, CollectedObservations]) -> None:
+        """按交易日顺序将收集模式下的盘后分析结果写入当前策略版本"""
+        for trade_date in trade_dates:
+            collected = analysis_results[trade_date]
+            for cleared_date in collected.cleared_dates:
+                self.clear_records(cleared_date)
+            if collected.entries:
+                task = self.generate_daily_task(trade_date)
+                for entry_date, stock_code, stock_name, variables in collected.entries:
+                    task.add_observation_entry_with_variable(entry_date, stock_code, stock_name, variables)
+
+    def strategy_replay_daily_work(self, trade_date):
+        task = self.generate_daily_task(trade_date)
+        task.analysis_precomputed = True
+        task.schedule_task_flow()
+        task.start_local_trade()
+
     @abstractmethod
     def analyze_performance_datas(self, records: List[Tuple[TradeRecord,StrategyObservationEntry,ObservationVariable]]) -> Dict[str, Any]:
         """
@@ -814,82 +1370,95 @@ class Strategy(ABC):
         """
         pass
 
-    def analyze_strategy_performance(self, start_date: str, end_date: str):
+    def sell_type_names(self) -> Dict[int, str]:
+        """卖出策略类型 -> 名称，用于收益归因，子类按需重写"""
+        return {}
+
+    def performance_report(self, start_date: str, end_date: str) -> Optional[PerformanceReport]:
         """
-        收益分析
+        计算收益报告，按策略版本哈希缓存，区间内交易记录未变化时直接返回缓存
+
+        返回:
+            PerformanceReport: 收益报告，区间内没有交易数据时返回 None
         """
+        # 将输入日期格式化为 datetime 对象
+        start_time = datetime.datetime.strptime(start_date, "%Y%m%d")
+        end_time = datetime.datetime.strptime(end_date, "%Y%m%d") + datetime.timedelta(hours=23, minutes=59, seconds=59)
+        filters = [TradeRecord.buy_time.between(start_time, end_time)]
+        version_hash = self.params.to_md5()
+
         with StrategySession() as session:
-            # 将输入日期格式化为 datetime 对象
-            start_time = datetime.datetime.strptime(start_date, "%Y%m%d")
-            end_time = datetime.datetime.strptime(end_date, "%Y%m%d") + datetime.timedelta(hours=23, minutes=59, seconds=59)
+            # 交易记录指纹：记录数、最大交易ID、已卖出数、最大卖出时间
+            fingerprint = tuple(session.query(
+                func.count(TradeRecord.trade_id), func.max(TradeRecord.trade_id),
+                func.count(TradeRecord.sell_price), func.max(TradeRecord.sell_time)
+            ).join(
+                StrategyObservationEntry, TradeRecord.entry_id == StrategyObservationEntry.entry_id
+            ).filter(
+                TradeRecord.mode == self.run_mode,
+                StrategyObservationEntry.strategy_id == self.strategy_id,
+                StrategyObservationEntry.version_id == self.version_id,
+                *filters
+            ).one())
+            if fingerprint[0] == 0:
+                return None
 
-            total_days = (end_time - start_time).days+1  # 计算总天数
-            if total_days <= 0:
-                raise ValueError("起始日期必须早于结束日期")
-            total_years = total_days / 365  # 转换为年
+            def compute() -> PerformanceReport:
+                all_records = self.query_trade_record_data(session=session, filters=filters)
+                valid_records = [record for record in all_records if record[0].sell_price != None]
+                if len(valid_records) < len(all_records) and self.run_mode == StrategyTaskMode.MODE_BACKTEST_LOCAL:
+                    logging.warning(f"{start_date} - {end_date} 有未结算的交易数据")
+                report = compute_performance(
+                    trades_frame(all_records), start_date, end_date, version_hash=version_hash,
+                    calendar=TradeCalendar.get_trade_dates(start_date, end_date), sell_type_names=self.sell_type_names())
+                report.extra = self.analyze_performance_datas(valid_records)
+                return report
+
+            cache_key = (version_hash, self.strategy_id, self.run_mode.value, start_date, end_date)
+            return performanceCache.get_or_compute(cache_key, fingerprint, compute)
+
+    def performance_summary(self, start_date: str, end_date: str) -> Optional[Dict[str, Any]]:
+        """
+        计算收益指标
 
-            # 从数据库中获取交易记录
-            all_records = self.query_trade_record_data(session=session, filters=[
-                TradeRecord.buy_time.between(start_time, end_time)
-            ])
-            if not all_records:
-                logging.info(f"没有交易数据")
-                return
-            
-            # 从all_records中提取buy_time并计算交易天数
-            trade_days = len(set(
-                record[0].buy_time.date()  # 获取TradeRecord的buy_time并转换为date
-                for record in all_records
-            ))
-
-            valid_records = [record for record in all_records if record[0].sell_price!=None]
-            if len(valid_records) < len(all_records) and self.run_mode == StrategyTaskMode.MODE_BACKTEST_LOCAL:
-                logging.warning(f"{start_date} - {end_date} 有未结算的交易数据")              
-
-            # 总交易数
-            total_count = len(valid_records)
-
-            # 分类盈利和亏损交易
-            positive_trades = [record[0].profit_rate for record in valid_records if record[0].profit_rate > 0]
-            negative_trades = [record[0].profit_rate for record in valid_records if record[0].profit_rate < 0]
-
-            # 计算胜率
-            positive_count = len(positive_trades)
-            win_rate = positive_count / total_count if total_count > 0 else 0
-
-            # 计算平均盈利和平均亏损
-            total_profit = sum(positive_trades)
-            total_loss = sum(negative_trades)
-
-            # 计算盈亏比
-            profit_loss_ratio = total_profit / abs(total_loss) if total_loss != 0 else 0
-
-            # 计算累计资金（复利效应）
-            initial_funds = 50000
-            final_funds = initial_funds
-            for record in valid_records:
-                profit_rate = record[0].profit_rate / 100  # 将百分比转化为小数
-                final_funds *= (1 + profit_rate)
-
-            # 计算年化率
-            cagr = ((float(final_funds) / float(initial_funds)) ** (1 / total_years) - 1) if total_years > 0 else None
-            avg_buy_day = round(total_days / trade_days, 1) if trade_days > 0 else 0
-
-            add_prints = self.analyze_performance_datas(valid_records)
-            # 打印结果
-            print(f"出手天数: {trade_days}")
-            print(f"策略平均买入次数 {avg_buy_day} 天/次")
-            print(f"股票池总数: {total_count}")
-            print(f"策略涨跌幅>0的股票数: {positive_count}")
-            print(f"胜率: {win_rate:.2%}")
-            for key, value in add_prints.items():
-                print(f"{key}: {value}")
-            print(f"总盈利: {total_profit}")
-            print(f"总亏损: {total_loss}")
-            print(f"盈亏比: {profit_loss_ratio:.2f}" if profit_loss_ratio else "无亏损交易，无法计算盈亏比")
-            print(f"初始资金: {initial_funds}")
-            print(f"考虑复利后的累计资金量: {final_funds:.2f}")
-            print(f"年化率: {cagr:.2%}" if cagr else "无法计算年化率")
+        返回:
+            Dict[str, Any]: 收益指标，区间内没有交易数据时返回 None
+        """
+        report = self.performance_report(start_date, end_date)
+        return report.summary() if report is not None else None
+
+    def analyze_strategy_performance(self, start_date: str, end_date: str):
+        """
+        收益分析
+        """
+        report = self.performance_report(start_date, end_date)
+        if report is None:
+            logging.info(f"没有交易数据")
+            return
+
+        # 打印结果
+        print(f"出手天数: {report.trade_days}")
+        print(f"策略平均买入次数 {report.avg_buy_day} 天/次")
+        print(f"股票池总数: {report.total_count}")
+        print(f"策略涨跌幅>0的股票数: {report.positive_count}")
+        print(f"胜率: {report.win_rate:.2%}")
+        for key, value in report.extra.items():
+            print(f"{key}: {value}")
+        print(f"总盈利: {report.total_profit:.2f}")
+        print(f"总亏损: {report.total_loss:.2f}")
+        print(f"盈亏比: {report.profit_loss_ratio:.2f}" if report.profit_loss_ratio else "无亏损交易，无法计算盈亏比")
+        print(f"初始资金: {report.initial_funds}")
+        print(f"考虑复利后的累计资金量: {report.final_funds:.2f}")
+        print(f"累计收益: {report.total_return:.2%}")
+        print(f"年化率: {report.cagr:.2%}" if report.cagr else "无法计算年化率")
+        print(f"最大回撤: {report.max_drawdown:.2%}")
+        print(f"夏普比率: {report.sharpe:.2f}" if report.sharpe is not None else "无法计算夏普比率")
+        print(f"年化换手率: {report.turnover:.2f} 倍")
+        if not report.sell_type_attribution.empty:
+            print("卖出策略收益归因:")
+            for _, row in report.sell_type_attribution.iterrows():
+                print(f"  {row['sell_type_name']}: 交易数 {row['count']} 胜率 {row['win_rate']:.2%} "
+                      f"平均收益 {row['avg_profit_rate']:.2f}% 收益占比 {row['contribution']:.2%}")
 
     def export_trade_records_to_excel(self, start_date, end_date):
         """
@@ -1057,4 +1626,30 @@ class Strategy(ABC):
         返回与当前策略关联的 ObservationVariable 模型。
         子类需要实现。
         """
-        pass
\ No newline at end of file
+        pass
+
+def _shard_trade_dates(items: List, workers: int) -> List[List]:
+    """按交易日顺序切分为连续的分片，分片数为进程数的4倍以平衡负载"""
+    shard_size = max(1, math.ceil(len(items) / (workers * 4)))
+    return [items[i:i + shard_size] for i in range(0, len(items), shard_size)]
+
+def _analysis_shard_worker(strategy_cls: Type[Strategy], params: StrategyParams, trade_dates: List[str]) -> Dict[str, CollectedObservations]:
+    """进程池任务：对一段连续交易日执行盘后分析，只收集结果不写库"""
+    strategy = strategy_cls(params=params)
+    results = {}
+    for trade_date in trade_dates:
+        task = strategy.generate_daily_task(trade_date)
+        task.collected_observations = CollectedObservations()
+        try:
+            task.analysis_observed_stocks()
+        except Exception as e:
+            logging.error(f"{trade_date} 盘后分析异常: {e}")
+        results[trade_date] = task.collected_observations
+    return results
+
+def _minute_data_shard_worker(requests: List[Tuple[str, List[str]]]) -> int:
+    """进程池任务：加载分时数据并写入列式存储，返回加载的股票日数量"""
+    loaded = 0
+    for trade_date, stock_codes in requests:
+        loaded += len(get_minute_data_for_multiple_stocks(stock_codes, trade_date))
+    return loaded
@@ -1,18 +1,16 @@
 # coding: utf-8
 import logging
 import datetime
-from typing import List, Optional, Dict, Tuple, cast, Type, Any
+from typing import List, Optional, Dict, Tuple, cast, Type, Any, Set
 from enum import IntFlag
 from sqlalchemy import Boolean
 from sqlalchemy import cast as sqlalchemy_cast
-from sqlalchemy.orm.attributes import flag_modified
 from pydantic import Field
 
 from a_trade.limit_attribution import LimitDailyAttribution
 from a_trade.stocks_daily_data import StockDailyData, StockDailyDataSource, get_stock_daily_data_for_day
 from a_trade.trade_calendar import TradeCalendar
-from a_trade.limit_up_data_tushare import LimitUpTushare, is_strong_stock_base_limit_data, LimitDataSource
-from a_trade.stock_minute_data import is_strong_limit_up_base_minute_data
+from a_trade.limit_up_data_tushare import LimitUpTushare, is_strong_stock_base_limit_data, is_strong_limit_up, LimitDataSource
 from a_trade.db_base import Session
 from a_trade.market_analysis import MarketDailyData
 import a_trade.settings
@@ -20,7 +18,8 @@ from a_trade.trade_utils import is_10cm_stock
 from a_trade.wechat_bot import WechatBot
 from a_trade.strategy import (
     StrategyParams, StrategyTask, StrategyTaskMode, Strategy, StrategyObservationEntry,
-    ObservationVariable, SubscribeStopType, SellInfoRecord, BuyInfoRecord, StrategySession, ObservationVarMode, TradeRecord)
+    ObservationVariable, SubscribeStopType, SellInfoRecord, BuyInfoRecord, StrategySession, ObservationVarMode, TradeRecord,
+    PARAM_STAGE_ANALYSIS, PARAM_STAGE_TRADE)
 
 # 卖出策略枚举
 class SellStrategyType(IntFlag):
@@ -30,124 +29,144 @@ class SellStrategyType(IntFlag):
     SellProfitStopLowerThanAvgPrice = 8       # 股价低于于平均成交价格线一定幅度止盈
     SellProfitStopLowerThanDeadLine = 16      # 涨停/跌停，第二天卖出
     SellLossStopNeedBuyStock = 32             # 可以先卖后买，腾出仓位
+    SellCloseWithoutLimit = 64                # 14:54 后未涨停也未跌停，尾盘卖出
+    SellLateHighLimit = 128                   # 高位板较晚涨停卖出
 
 # 策略参数常量
 class StrategyParamsYugiS1(StrategyParams):
     # 冰点线定义，高于这条线，不做弱转强
     cold_sentiment_line: int = Field(
         40, 
-        description="冰点线定义，高于这条线，不做弱转强"
+        description="冰点线定义，高于这条线，不做弱转强",
+        json_schema_extra={"stage": PARAM_STAGE_ANALYSIS}
     )
     
     # 板块效应下限，达到这个数量的板块不参与弱转强
     concept_effect_line: int = Field(
         2, 
-        description="板块效应下限，达到这个数量的板块不参与弱转强"
+        description="板块效应下限，达到这个数量的板块不参与弱转强",
+        json_schema_extra={"stage": PARAM_STAGE_ANALYSIS}
     )
     
     # 板块效应连板数下限，低于这个数量不纳入观察池
     observe_min_limit_count: int = Field(
         2, 
-        description="板块效应连板数下限，低于这个数量不纳入观察池"
+        description="板块效应连板数下限，低于这个数量不纳入观察池",
+        json_schema_extra={"stage": PARAM_STAGE_ANALYSIS}
     )
 
     #
     min_buy_threshold: float = Field(
         1.01,
-        description="T字板买入信号最低涨幅"
+        description="T字板买入信号最低涨幅",
+        json_schema_extra={"stage": PARAM_STAGE_TRADE}
     )
     
     # 非连续涨停板龙头股日均涨幅下限，影响买入股票池
     avg_recent_high_limit: float = Field(
         6.0, 
-        description="非连续涨停板龙头股日均涨幅下限，影响买入股票池"
+        description="非连续涨停板龙头股日均涨幅下限，影响买入股票池",
+        json_schema_extra={"stage": PARAM_STAGE_ANALYSIS}
     )
     
     # 非连续涨停板龙头股总涨幅下限，影响买入股票池
     recent_high_limit: float = Field(
         50.0, 
-        description="非连续涨停板龙头股总涨幅下限，影响买入股票池"
+        description="非连续涨停板龙头股总涨幅下限，影响买入股票池",
+        json_schema_extra={"stage": PARAM_STAGE_ANALYSIS}
     )
     
     # 弱板开板时间下限定义(分钟)，影响买入股票池
     weak_limit_open_time: int = Field(
         10, 
-        description="弱板开板时间下限定义(分钟)，影响买入股票池"
+        description="弱板开板时间下限定义(分钟)，影响买入股票池",
+        json_schema_extra={"stage": PARAM_STAGE_ANALYSIS}
     )
     
     # 弱板股票/板块龙一 第二天纳入观察池幅度下限，影响买入策略
     buy_in_observe_dead_pch: float = Field(
         -6.0, 
-        description="弱板股票/板块龙一 第二天纳入观察池幅度下限，影响买入策略"
+        description="弱板股票/板块龙一 第二天纳入观察池幅度下限，影响买入策略",
+        json_schema_extra={"stage": PARAM_STAGE_TRADE}
     )
     
     # 弱板股票第一天振幅上限，影响买入策略
     first_date_amplitude: float = Field(
         17.0, 
-        description="弱板股票第一天振幅上限，影响买入策略"
+        description="弱板股票第一天振幅上限，影响买入策略",
+        json_schema_extra={"stage": PARAM_STAGE_ANALYSIS}
     )
     
     # T字板开盘幅度下限。影响买入策略
     t_limit_open_condition: float = Field(
         7.0, 
-        description="T字板开盘幅度下限。影响买入策略"
+        description="T字板开盘幅度下限。影响买入策略",
+        json_schema_extra={"stage": PARAM_STAGE_ANALYSIS}
     )
     
     # 第二天高开幅度上限, 影响买入策略
     next_date_open_rate_limit: float = Field(
         5.9, 
-        description="第二天高开幅度上限, 影响买入策略"
+        description="第二天高开幅度上限, 影响买入策略",
+        json_schema_extra={"stage": PARAM_STAGE_TRADE}
     )
     
     # 烂板前连续一字板数量上限。达到这个上限，不参与弱转强买入。影响买入策略
     continuous_one_limit_count: int = Field(
         3, 
-        description="烂板前连续一字板数量上限。达到这个上限，不参与弱转强买入。影响买入策略"
+        description="烂板前连续一字板数量上限。达到这个上限，不参与弱转强买入。影响买入策略",
+        json_schema_extra={"stage": PARAM_STAGE_ANALYSIS}
     )
     
     # 涨停幅度下限，影响卖出策略。
     limit_up_pch: float = Field(
         9.8, 
-        description="涨停幅度下限，影响卖出策略。"
+        description="涨停幅度下限，影响卖出策略。",
+        json_schema_extra={"stage": PARAM_STAGE_TRADE}
     )
     
     # 跌停幅度下限，影响卖出策略。
     limit_down_pch: float = Field(
         -9.8, 
-        description="跌停幅度下限，影响卖出策略。"
+        description="跌停幅度下限，影响卖出策略。",
+        json_schema_extra={"stage": PARAM_STAGE_TRADE}
     )
     
     # 前一天未吃到大面，第二天盘中分时高于黄线幅度触发卖出。影响卖出策略。3-4降低胜率，提升盈亏比
     sold_out_pch: float = Field(
         4.0, 
-        description="前一天未吃到大面，第二天盘中分时高于黄线幅度触发卖出。影响卖出策略。3-4降低胜率，提升盈亏比"
+        description="前一天未吃到大面，第二天盘中分时高于黄线幅度触发卖出。影响卖出策略。3-4降低胜率，提升盈亏比",
+        json_schema_extra={"stage": PARAM_STAGE_TRADE}
     )
     
     # 止盈线
     profit_stop: float = Field(
         -6.0, 
-        description="止盈线"
+        description="止盈线",
+        json_schema_extra={"stage": PARAM_STAGE_TRADE}
     )
     
     # 连续水下时长，止盈策略
     under_water_stop_minutes: int = Field(
         40, 
-        description="连续水下时长，止盈策略"
+        description="连续水下时长，止盈策略",
+        json_schema_extra={"stage": PARAM_STAGE_TRADE}
     )
     
     # 水下平均成交价跌幅上限
     under_water_avg_price_pch_limit: float = Field(
         -2.0, 
-        description="水下平均成交价跌幅上限"
+        description="水下平均成交价跌幅上限",
+        json_schema_extra={"stage": PARAM_STAGE_TRADE}
     )
     
     # 高位板首次涨停时间卖出线，晚于这个时间涨停。板上卖出。影响卖出策略。
     high_limit_stock_first_time: str = Field(
         '14:30', 
-        description="高位板首次涨停时间卖出线，晚于这个时间涨停。板上卖出。影响卖出策略。"
+        description="高位板首次涨停时间卖出线，晚于这个时间涨停。板上卖出。影响卖出策略。",
+        json_schema_extra={"stage": PARAM_STAGE_TRADE}
     )
 
-strategy_params = StrategyParamsYugiS1()
 
 # 策略交易股票观测数据
 class ObservedStockS1Model(ObservationVarMode):
@@ -184,6 +203,9 @@ class StrategyTaskYugiS1(StrategyTask):
     """
     策略任务类，用于封装日内策略操作, 包含准备观察池、订阅分时、取消订阅、买入股票、卖出股票。
     """
+    supports_parallel_analysis = True
+    supports_memory_ledger = True
+
     def schedule_task_flow(self):
         if TradeCalendar.is_trade_day(self.trade_date):
             self.schedule(closure=self.prepare_observed_pool, time="09:15:00")
@@ -248,41 +270,30 @@ class StrategyTaskYugiS1(StrategyTask):
             return desc
     
     def update_trade_data(self):
-        with StrategySession() as session:
-            # 获取所有相关的ObservationVariable记录
-            results = self.strategy.query_observation_data(session=session, include_observation_variable=True, filters=[
-                StrategyObservationEntry.trade_date == self.trade_date
-            ])
+        # 获取所有相关的ObservationVariable记录
+        results = self.ledger.observations(self.trade_date)
+        
+        limit_data_source = LimitDataSource(self.trade_date)
+        for entry, var in results:
+            daily_data = get_stock_daily_data_for_day(stock_code=entry.stock_code, trade_date=self.trade_date)
+            if not daily_data:
+                entry.trade_date = TradeCalendar.get_next_trade_date(self.trade_date)
+            status = '未封板'
+            if entry.stock_code in limit_data_source.limit_up_map:
+                status = '强势板' if is_strong_stock_base_limit_data(limit_data_source.limit_up_map[entry.stock_code]) else '弱势板'
+            elif entry.stock_code in limit_data_source.limit_down_map:
+                status = '跌停板'
+            elif entry.stock_code in limit_data_source.limit_failed_map:
+                status = '炸板'
+            # 添加日志输出
+            logging.info(f"Updating {entry.stock_code} status to {status} {entry}")
             
-            limit_data_source = LimitDataSource(self.trade_date)
-            for entry, var in results:
-                daily_data = get_stock_daily_data_for_day(stock_code=entry.stock_code, trade_date=self.trade_date)
-                if not daily_data:
-                    entry.trade_date = TradeCalendar.get_next_trade_date(self.trade_date)
-                    session.merge(entry)
-                status = '未封板'
-                if entry.stock_code in limit_data_source.limit_up_map:
-                    status = '强势板' if is_strong_stock_base_limit_data(limit_data_source.limit_up_map[entry.stock_code]) else '弱势板'
-                elif entry.stock_code in limit_data_source.limit_down_map:
-                    status = '跌停板'
-                elif entry.stock_code in limit_data_source.limit_failed_map:
-                    status = '炸板'
-                # 添加日志输出
-                logging.info(f"Updating {entry.stock_code} status to {status} {entry}")
-                
-                # 显式更新数据库记录
-                var.variables['buy_date_status'] = status
-                flag_modified(var, "variables")
-                session.add(var)
-            try:
-                session.commit()
-            except Exception as e:
-                session.rollback()
-                logging.error(f"Failed to commit status updates: {str(e)}")
-                raise
+            var.variables['buy_date_status'] = status
+        self.ledger.save_observations(results)
 
     def trade_did_end(self):
-        self.analysis_observed_stocks()
+        if not self.analysis_precomputed:
+            self.analysis_observed_stocks()
         self.update_trade_data()
 
     def handle_buy_stock(self, stock_code: str, minute_data, trade_time: str):
@@ -313,22 +324,22 @@ class StrategyTaskYugiS1(StrategyTask):
         if observer_buy_info.tactics_type < 0:
             if open_price > pre_close:
                 observer_buy_info.tactics_type = 0
-                observer_buy_info.buy_threshold = max(open_price, pre_close * strategy_params.min_buy_threshold)
+                observer_buy_info.buy_threshold = max(open_price, pre_close * self.params.min_buy_threshold)
                 observer_buy_info.stop_observe_price = pre_close * 0.98
             else:
                 observer_buy_info.tactics_type = 1
-                observer_buy_info.buy_threshold = pre_close *strategy_params.min_buy_threshold
-                observer_buy_info.stop_observe_price = pre_close * (1 + strategy_params.buy_in_observe_dead_pch / 100)
+                observer_buy_info.buy_threshold = pre_close *self.params.min_buy_threshold
+                observer_buy_info.stop_observe_price = pre_close * (1 + self.params.buy_in_observe_dead_pch / 100)
 
-            if observed_var_mode.is_t_limit and curent_open_rate >= strategy_params.next_date_open_rate_limit:
-                logging.info(f"{trade_time} {stock_name} {stock_code} 停止监听原因: 高开幅度 {curent_open_rate} 大于 {strategy_params.next_date_open_rate_limit}, 策略类型 {observer_buy_info.tactics_type}")
+            if observed_var_mode.is_t_limit and curent_open_rate >= self.params.next_date_open_rate_limit:
+                logging.info(f"{trade_time} {stock_name} {stock_code} 停止监听原因: 高开幅度 {curent_open_rate} 大于 {self.params.next_date_open_rate_limit}, 策略类型 {observer_buy_info.tactics_type}")
                 observer_buy_info.stop_buy = True
                 self.stop_subscribe_buy_stock(stock_code)
 
             logging.info(f"{trade_time} {stock_code} 买入策略 {observer_buy_info.tactics_type}")
         else:
             # 策略执行逻辑
-            if observed_var_mode.concept_position == '龙一' and curent_open_rate < strategy_params.buy_in_observe_dead_pch:
+            if observed_var_mode.concept_position == '龙一' and curent_open_rate < self.params.buy_in_observe_dead_pch:
                 logging.info(f"{observed_var_mode.concept_name} {stock_name} 龙一跌幅 {curent_open_rate}, 停止同板块监听")
                 for other_stock_code, _ in self.buy_var_model_map.items():
                     other_var_mode = self.buy_var_model_map[other_stock_code]
@@ -383,13 +394,13 @@ class StrategyTaskYugiS1(StrategyTask):
             pre_stock_daily_data: Optional[StockDailyData] = self.pre_stock_daily_map[stock_code]
             open_rate = (open / pre_close - 1)*100 
 
-            if open_rate <= strategy_params.limit_down_pch:
+            if open_rate <= self.params.limit_down_pch:
                 sell_data.strong_level = -2
                 observer_sell_info.tactics_type = SellStrategyType.SellLossStopHighThanAvgPrice
             elif open_rate <= -4:
                 sell_data.strong_level = -1
                 observer_sell_info.tactics_type = SellStrategyType.SellLossStopLowerThanAvgPrice | SellStrategyType.SellLossStopAvgPriceGoLow | SellStrategyType.SellLossStopNeedBuyStock
-            elif (pre_stock_daily_data.high / pre_stock_daily_data.pre_close - 1)*100 > strategy_params.limit_up_pch:
+            elif (pre_stock_daily_data.high / pre_stock_daily_data.pre_close - 1)*100 > self.params.limit_up_pch:
                 if pre_stock_daily_data.close < pre_stock_daily_data.high:
                     logging.info(f"{stock_code} 买入日炸板。当日卖出")
                     # 炸板
@@ -403,7 +414,7 @@ class StrategyTaskYugiS1(StrategyTask):
                         pre_limit_data = self.pre_limit_data_source.limit_up_map[stock_code]
                         if self.is_strong_limit_stock(pre_limit_data):
                             observer_sell_info.tactics_type = observer_sell_info.tactics_type | SellStrategyType.SellLossStopNeedBuyStock | SellStrategyType.SellLossStopLowerThanAvgPrice | SellStrategyType.SellLossStopAvgPriceGoLow
-            elif (pre_stock_daily_data.high / pre_stock_daily_data.pre_close - 1)*100 <= strategy_params.limit_up_pch:
+            elif (pre_stock_daily_data.high / pre_stock_daily_data.pre_close - 1)*100 <= self.params.limit_up_pch:
                 # 未封板
                 sell_data.strong_level = -1
                 observer_sell_info.tactics_type = SellStrategyType.SellLossStopLowerThanAvgPrice | SellStrategyType.SellLossStopAvgPriceGoLow | SellStrategyType.SellLossStopNeedBuyStock
@@ -416,12 +427,12 @@ class StrategyTaskYugiS1(StrategyTask):
             if (tactics_type & SellStrategyType.SellLossStopLowerThanAvgPrice) and open - avg < 0 and close - avg < 0:
                 sell_reason = f'基于策略{SellStrategyType.SellLossStopLowerThanAvgPrice} 且低于分时黄线'
                 logging.info(f"卖出参数 pre_avg_price={sell_data.pre_avg_price}")
-                self.sell_stock(stock_code, close, current_time, sell_reason)
+                self.sell_stock(stock_code, close, current_time, sell_reason, SellStrategyType.SellLossStopLowerThanAvgPrice)
                 return
             if (tactics_type & SellStrategyType.SellLossStopAvgPriceGoLow) and sell_data.pre_avg_price != None and avg - sell_data.pre_avg_price < -0.01:
                 sell_reason = f'基于策略{SellStrategyType.SellLossStopAvgPriceGoLow} 且分时黄线下行'
                 logging.info(f" 卖出参数 pre_avg_price={sell_data.pre_avg_price} avg={avg}")
-                self.sell_stock(stock_code, open, current_time, sell_reason)
+                self.sell_stock(stock_code, open, current_time, sell_reason, SellStrategyType.SellLossStopAvgPriceGoLow)
                 return
             if (tactics_type & SellStrategyType.SellProfitStopLowerThanAvgPrice):
                 if open < avg:
@@ -430,35 +441,35 @@ class StrategyTaskYugiS1(StrategyTask):
                     sell_data.under_water_minutes += 1
                 elif open > avg:
                     sell_data.under_water_minutes = 0
-                if sell_data.under_water_minutes > strategy_params.under_water_stop_minutes or (sell_data.under_water_avg_price_start and ( avg/sell_data.under_water_avg_price_start-1)*100 < strategy_params.under_water_avg_price_pch_limit):
+                if sell_data.under_water_minutes > self.params.under_water_stop_minutes or (sell_data.under_water_avg_price_start and ( avg/sell_data.under_water_avg_price_start-1)*100 < self.params.under_water_avg_price_pch_limit):
                     sell_reason = f'基于水下时长{sell_data.under_water_minutes}分钟'
                     logging.info(f"卖出参数 avg={avg} under_water_avg_price_start={sell_data.under_water_avg_price_start} pre_close={pre_close}")
-                    self.sell_stock(stock_code, open, current_time, sell_reason)
+                    self.sell_stock(stock_code, open, current_time, sell_reason, SellStrategyType.SellProfitStopLowerThanAvgPrice)
                     return
-            if (tactics_type & SellStrategyType.SellProfitStopLowerThanDeadLine) and (open / pre_close - 1) * 100 < strategy_params.profit_stop:
-                sell_reason = f'基于{strategy_params.profit_stop}%止盈'
+            if (tactics_type & SellStrategyType.SellProfitStopLowerThanDeadLine) and (open / pre_close - 1) * 100 < self.params.profit_stop:
+                sell_reason = f'基于{self.params.profit_stop}%止盈'
                 logging.info(f"卖出参数 水下时长{sell_data.under_water_minutes}分钟 avg={avg} under_water_avg_price_start={sell_data.under_water_avg_price_start}")
-                self.sell_stock(stock_code, open, current_time, sell_reason)
+                self.sell_stock(stock_code, open, current_time, sell_reason, SellStrategyType.SellProfitStopLowerThanDeadLine)
                 return
         if trade_time != "09:30":
-            if (tactics_type & SellStrategyType.SellLossStopHighThanAvgPrice) and (high - avg)*100/pre_close >= strategy_params.sold_out_pch:
-                sell_reason = f'基于分时偏离平均价格 {strategy_params.sold_out_pch}%'
-                self.sell_stock(stock_code, close, current_time, sell_reason)
+            if (tactics_type & SellStrategyType.SellLossStopHighThanAvgPrice) and (high - avg)*100/pre_close >= self.params.sold_out_pch:
+                sell_reason = f'基于分时偏离平均价格 {self.params.sold_out_pch}%'
+                self.sell_stock(stock_code, close, current_time, sell_reason, SellStrategyType.SellLossStopHighThanAvgPrice)
                 return
         if trade_time >= "14:54":
             current_pch = (open / pre_close - 1) * 100
-            if current_pch < strategy_params.limit_up_pch and current_pch > strategy_params.limit_down_pch:
+            if current_pch < self.params.limit_up_pch and current_pch > self.params.limit_down_pch:
                 sell_reason = f'基于14:54  后未涨停也并未跌停'
-                self.sell_stock(stock_code, open, current_time, sell_reason)
+                self.sell_stock(stock_code, open, current_time, sell_reason, SellStrategyType.SellCloseWithoutLimit)
                 return
             
         first_limit_time = sell_data.first_limit_time
-        if not first_limit_time and high == low and (high / pre_close - 1) * 100 > strategy_params.limit_up_pch:
+        if not first_limit_time and high == low and (high / pre_close - 1) * 100 > self.params.limit_up_pch:
             sell_data.first_limit_time = trade_time
             logging.info(f"首次涨停 {stock_code} {self.trade_date} {first_limit_time}")
-            if sell_data.first_limit_time > strategy_params.high_limit_stock_first_time:
-                sell_reason = f'基于高位板{strategy_params.high_limit_stock_first_time}后涨停'
-                self.sell_stock(stock_code, close, current_time, sell_reason)
+            if sell_data.first_limit_time > self.params.high_limit_stock_first_time:
+                sell_reason = f'基于高位板{self.params.high_limit_stock_first_time}后涨停'
+                self.sell_stock(stock_code, close, current_time, sell_reason, SellStrategyType.SellLateHighLimit)
                 return
         sell_data.pre_avg_price = avg
     
@@ -468,12 +479,12 @@ class StrategyTaskYugiS1(StrategyTask):
                 if (observer_sell_info.tactics_type & SellStrategyType.SellLossStopNeedBuyStock):
                     if not observer_sell_info.is_sell:
                         sell_reason = '基于先卖后买'
-                        self.sell_stock(sell_stock_code, 0, buy_time, sell_reason)
+                        self.sell_stock(sell_stock_code, 0, buy_time, sell_reason, SellStrategyType.SellLossStopNeedBuyStock)
         super().buy_stock(stock_code, buy_price, buy_time)
 
     def analysis_observed_stocks(self):
         next_date = TradeCalendar.get_next_trade_date(self.trade_date)
-        self.strategy.clear_records(next_date)
+        self.clear_observation_records(next_date)
         with Session() as session:
             trade_date = self.trade_date
             market_data_today =  session.query(MarketDailyData).filter(MarketDailyData.trade_date.in_([trade_date])).first()
@@ -481,7 +492,7 @@ class StrategyTaskYugiS1(StrategyTask):
             logging.info(f"正在分析{trade_date} 股票, 当日市场情绪指数 {market_data_sentiment}")
 
             # 提前退出条件
-            if market_data_sentiment > strategy_params.cold_sentiment_line:
+            if market_data_sentiment > self.params.cold_sentiment_line:
                 return
             
 
@@ -503,6 +514,11 @@ class StrategyTaskYugiS1(StrategyTask):
                 LimitDailyAttribution.trade_date == trade_date
             ).all()
 
+            # 一次性计算当日涨停、炸板股票的T字板标记
+            limit_data_source.load_minute_flags()
+
+            # 板块 -> 板块内股票代码（按归因顺序），龙一龙二及近期高度股在遍历结束后批量排序
+            concept_stock_codes: Dict[str, List[str]] = {}
             for attribution in attribution_results:
                 if attribution.concept_name == '其它':
                     continue
@@ -522,6 +538,7 @@ class StrategyTaskYugiS1(StrategyTask):
                 if stock_code not in stock_code_to_limit_result:
                     continue
                 limit_data = stock_code_to_limit_result[stock_code]
+                concept_stock_codes.setdefault(attribution.concept_name, []).append(stock_code)
 
                 if limit_data.continuous_limit_up_count > first_limit_count:
                     second_limit_count = first_limit_count
@@ -538,14 +555,14 @@ class StrategyTaskYugiS1(StrategyTask):
                 first_date_daily_data: Optional[StockDailyData] = limit_data_source.get_daily_data(stock_code)
                 # weak_stocks = first_date_concept_to_stocks[attribution.concept_name]["weak_stocks"]
                 t_stocks = first_date_concept_to_stocks[attribution.concept_name]["t_stocks"]
-                stock_is_t_limit = first_date_daily_data.is_t_limit()
+                stock_is_t_limit = limit_data_source.is_t_limit(stock_code)
                 logging.info(f"{self.trade_date} {limit_data.stock_name} T字板判定{stock_is_t_limit}")
                 
                 if stock_is_t_limit:
-                    amplitude_limit_condition = ((first_date_daily_data.high - first_date_daily_data.low)*100/first_date_daily_data.pre_close < strategy_params.first_date_amplitude)
+                    amplitude_limit_condition = ((first_date_daily_data.high - first_date_daily_data.low)*100/first_date_daily_data.pre_close < self.params.first_date_amplitude)
                     if limit_data.up_stat:
                         _, days_ago = map(int, limit_data.up_stat.split('/'))
-                    previous_daily_source = StockDailyDataSource(first_date_daily_data.ts_code, trade_date, strategy_params.continuous_one_limit_count)
+                    previous_daily_source = StockDailyDataSource(first_date_daily_data.ts_code, trade_date, self.params.continuous_one_limit_count)
                     logging.info(f"{limit_data.stock_name} 振幅判定{amplitude_limit_condition}")
                     if amplitude_limit_condition and not previous_daily_source.is_one_limit():
                         if stock_is_t_limit:
@@ -555,31 +572,22 @@ class StrategyTaskYugiS1(StrategyTask):
                         #     if avg_price_pch > 6:
                         #         weak_stocks.append(limit_data)
                 
-                # 填充 first_stock 和 second_stock
-                first_stock = first_date_concept_to_stocks[attribution.concept_name]["first_stock"]
-                second_stock = first_date_concept_to_stocks[attribution.concept_name]["second_stock"]
-                first_stock_code = first_stock.stock_code if first_stock else None
-                strong_stock_code = limit_data_source.compare_stock_strength(first_stock_code, limit_data.stock_code)
-                if strong_stock_code != first_stock_code:
-                    logging.info(f"{trade_date} {attribution.concept_name} 龙一判定 {limit_data.stock_name} > {first_stock.stock_name if first_stock else None}")
-                    first_date_concept_to_stocks[attribution.concept_name]["first_stock"] = limit_data
-                    if first_stock:
-                        logging.info(f"{trade_date} {attribution.concept_name} 龙二判定 {first_stock.stock_name} > {second_stock.stock_name if second_stock else None}")
-                        first_date_concept_to_stocks[attribution.concept_name]["second_stock"] = first_stock
-                    
-                else:
-                    second_stock_code = second_stock.stock_code if second_stock else None
-                    strong_stock_code = limit_data_source.compare_stock_strength(second_stock_code, limit_data.stock_code)
-                    if strong_stock_code != second_stock_code:
-                        logging.info(f"{trade_date} {attribution.concept_name} 龙二判定 {limit_data.stock_name} > {second_stock.stock_name if second_stock else None}")
-                        first_date_concept_to_stocks[attribution.concept_name]["second_stock"] = limit_data
-
-                recent_highest_stock = first_date_concept_to_stocks[attribution.concept_name]["recent_highest_stock"]
-                recent_highest_stock_code = recent_highest_stock.stock_code if recent_highest_stock else None
-                strong_stock_code = limit_data_source.compare_stock_recent_height(recent_highest_stock_code, limit_data.stock_code)
-                if strong_stock_code and strong_stock_code != recent_highest_stock_code:
-                    logging.info(f"{trade_date} {attribution.concept_name} 近期高度股票判定 {limit_data.stock_name} > {recent_highest_stock.stock_name if recent_highest_stock else None}")
-                    first_date_concept_to_stocks[attribution.concept_name]["recent_highest_stock"] = limit_data
+
+            # 填充 first_stock、second_stock 和 recent_highest_stock
+            all_stock_codes = list(dict.fromkeys(code for codes in concept_stock_codes.values() for code in codes))
+            limit_data_source.preload_pct_chg()
+            strength_frame = limit_data_source.strength_frame(all_stock_codes)
+            for concept_name, stock_codes in concept_stock_codes.items():
+                stocks_map = first_date_concept_to_stocks[concept_name]
+                ranked_codes = limit_data_source.rank_by_strength(stock_codes, strength_frame)
+                stocks_map["first_stock"] = stock_code_to_limit_result[ranked_codes[0]]
+                logging.info(f"{trade_date} {concept_name} 龙一判定 {stocks_map['first_stock'].stock_name}")
+                if len(ranked_codes) > 1:
+                    stocks_map["second_stock"] = stock_code_to_limit_result[ranked_codes[1]]
+                    logging.info(f"{trade_date} {concept_name} 龙二判定 {stocks_map['second_stock'].stock_name}")
+                recent_highest_code = limit_data_source.rank_by_recent_height(stock_codes, strength_frame)[0]
+                stocks_map["recent_highest_stock"] = stock_code_to_limit_result[recent_highest_code]
+                logging.info(f"{trade_date} {concept_name} 近期高度股票判定 {stocks_map['recent_highest_stock'].stock_name}")
 
             for concept_name, stocks_map in first_date_concept_to_stocks.items():
                 logging.info(f"{trade_date} {concept_name} 策略弱势条件判定")
@@ -613,10 +621,10 @@ class StrategyTaskYugiS1(StrategyTask):
                     boards, days_ago = map(int, recent_highest_stock.up_stat.split('/'))
                     stock.avg_recent_high = stock.recent_high / days_ago if days_ago > 0 else stock.recent_high
 
-                if first_stock.continuous_limit_up_count < strategy_params.observe_min_limit_count:
+                if first_stock.continuous_limit_up_count < self.params.observe_min_limit_count:
                     dragon_stocks.remove(first_stock)
 
-                if second_stock and (second_stock.continuous_limit_up_count == first_stock.continuous_limit_up_count or second_stock.continuous_limit_up_count < strategy_params.observe_min_limit_count):
+                if second_stock and (second_stock.continuous_limit_up_count == first_stock.continuous_limit_up_count or second_stock.continuous_limit_up_count < self.params.observe_min_limit_count):
                     dragon_stocks.remove(second_stock)
                 
                 recent_highest_stock.recent_high = limit_data_source.get_pct_chg(recent_highest_stock.stock_code)
@@ -624,8 +632,8 @@ class StrategyTaskYugiS1(StrategyTask):
                 recent_highest_stock.avg_recent_high = round(recent_highest_stock.recent_high / days_ago, 2) if days_ago > 0 else recent_highest_stock.recent_high
                 logging.info(f"{trade_date} 板块{concept_name} 最高涨幅股 {recent_highest_stock.stock_name}({recent_highest_stock.stock_code})  近期涨幅 {recent_highest_stock.recent_high} 平均涨幅 {recent_highest_stock.avg_recent_high}")
                 second_recent_high = second_stock.recent_high if second_stock else 0
-                if recent_highest_stock.avg_recent_high >= strategy_params.avg_recent_high_limit and recent_highest_stock.recent_high > max(strategy_params.recent_high_limit, second_recent_high):
-                    if (recent_highest_stock != first_stock and recent_highest_stock != second_stock) or recent_highest_stock.continuous_limit_up_count < strategy_params.observe_min_limit_count:
+                if recent_highest_stock.avg_recent_high >= self.params.avg_recent_high_limit and recent_highest_stock.recent_high > max(self.params.recent_high_limit, second_recent_high):
+                    if (recent_highest_stock != first_stock and recent_highest_stock != second_stock) or recent_highest_stock.continuous_limit_up_count < self.params.observe_min_limit_count:
                         recent_highest_stock.concept_position = "近期涨幅股"
                         dragon_stocks.add(recent_highest_stock)
                 print(f"location: {concept_name} {dragon_stocks}")
@@ -638,11 +646,11 @@ class StrategyTaskYugiS1(StrategyTask):
                 for stock in dragon_stocks:
                     stock_limit_info: Optional[LimitUpTushare] = stock
                     if is_10cm_stock(stock_limit_info.stock_code) and stock_limit_info in t_stocks:
-                        if len(limit_up_stocks) > strategy_params.concept_effect_line:
+                        if len(limit_up_stocks) > self.params.concept_effect_line:
                             concept_observed_pool.add(stock)
                         elif stock.continuous_limit_up_count >= max(second_limit_count,4):
                             concept_observed_pool.add(stock)
-                        elif stock == recent_highest_stock and stock.avg_recent_high >= strategy_params.avg_recent_high_limit and stock.recent_high >= max(strategy_params.recent_high_limit, second_recent_high):
+                        elif stock == recent_highest_stock and stock.avg_recent_high >= self.params.avg_recent_high_limit and stock.recent_high >= max(self.params.recent_high_limit, second_recent_high):
                             concept_observed_pool.add(stock)
                 if concept_observed_pool:
                     concept_observed_pool.add(first_stock)
@@ -671,12 +679,10 @@ class StrategyTaskYugiS1(StrategyTask):
                         is_t_limit=is_t_limit
                     )
                     self.add_observation_entry_with_variable(next_date, stock_limit_info.stock_code, stock_limit_info.stock_name, variables=observed_model.model_dump())
+            logging.info(f"{trade_date} 累计涨幅缓存 {limit_data_source.pct_chg_cache_stats()}")
         
     def is_strong_limit_stock(self, limit_info: LimitUpTushare):
-        if is_strong_stock_base_limit_data(limit_info):
-            return True
-        else:
-            return is_strong_limit_up_base_minute_data(limit_info.stock_code, limit_info.trade_date, limit_info.close,  limit_info.first_time, limit_info.last_time, 5)
+        return is_strong_limit_up(limit_info, 5)
 
 class StrategyYugiS1(Strategy):
     def strategy_name(self) -> str:
@@ -685,6 +691,53 @@ class StrategyYugiS1(Strategy):
     def get_observation_model(self) -> ObservationVarMode:
         return ObservedStockS1Model
     
+    def minute_data_requests(self, start_date: str, end_date: str) -> Dict[str, Set[str]]:
+        """在默认订阅股票之外，补充盘后分析中需要分时数据确认的T字板候选股票"""
+        requests = super().minute_data_requests(start_date, end_date)
+        trade_dates = TradeCalendar.get_trade_dates(start_date, end_date)
+        with Session() as session:
+            limit_rows = session.query(LimitUpTushare.trade_date, LimitUpTushare.stock_code).filter(
+                LimitUpTushare.trade_date.in_(trade_dates),
+                LimitUpTushare.limit_status.in_(['U', 'Z'])
+            ).all()
+            codes_by_date: Dict[str, Set[str]] = {}
+            for trade_date, stock_code in limit_rows:
+                codes_by_date.setdefault(trade_date, set()).add(stock_code)
+
+            for trade_date, stock_codes in codes_by_date.items():
+                daily_results = session.query(StockDailyData).filter(
+                    StockDailyData.trade_date == trade_date,
+                    StockDailyData.ts_code.in_(stock_codes)
+                ).all()
+                for daily_data in daily_results:
+                    if daily_data.is_t_limit_candidate():
+                        requests.setdefault(trade_date, set()).add(daily_data.ts_code)
+        return requests
+
+    def observation_candidates(self, trade_dates: List[str]) -> Dict[str, Set[str]]:
+        """盘后分析只在非过热行情下，从当日有板块归因的涨停、炸板股票中选出观察股票"""
+        candidates: Dict[str, Set[str]] = {}
+        if not trade_dates:
+            return candidates
+        with Session() as session:
+            hot_dates = {row.trade_date for row in session.query(MarketDailyData.trade_date).filter(
+                MarketDailyData.trade_date.in_(trade_dates),
+                MarketDailyData.sentiment_index > self.params.cold_sentiment_line
+            ).all()}
+            rows = session.query(LimitUpTushare.trade_date, LimitUpTushare.stock_code).join(
+                LimitDailyAttribution,
+                (LimitDailyAttribution.trade_date == LimitUpTushare.trade_date) &
+                (LimitDailyAttribution.stock_code == LimitUpTushare.stock_code)
+            ).filter(
+                LimitUpTushare.trade_date.in_(trade_dates),
+                LimitUpTushare.limit_status.in_(['U', 'Z']),
+                LimitDailyAttribution.concept_name != '其它'
+            ).distinct().all()
+        for trade_date, stock_code in rows:
+            if trade_date not in hot_dates:
+                candidates.setdefault(trade_date, set()).add(stock_code)
+        return candidates
+
     def analyze_performance_datas(self, records: List[Tuple[TradeRecord, StrategyObservationEntry, ObservationVariable]]) -> Dict[str, Any]:
         success_trades = [record[2].variables["buy_date_status"] for record in records 
                             if record[2].variables["buy_date_status"] in ('强势板', '弱势板', '涨停板')]
@@ -694,6 +747,9 @@ class StrategyYugiS1(Strategy):
             "买入当天封板成功率": f"{success_rate:.2%}"
         }
     
+    def sell_type_names(self) -> Dict[int, str]:
+        return {sell_type.value: sell_type.name for sell_type in SellStrategyType}
+
     def __init__(self, task_cls: StrategyTask = StrategyTaskYugiS1, params: Type['StrategyParams'] = StrategyParamsYugiS1(), mode: StrategyTaskMode = StrategyTaskMode.MODE_BACKTEST_LOCAL):
         super().__init__(task_cls, params, mode)
 
@@ -0,0 +1,251 @@
+# coding: utf-8
+# 文件：strategy_performance.py
+
+"""
+策略收益分析。
+
+将交易记录一次性转换为 DataFrame，使用向量化计算收益指标：
+    - 日度资金曲线（按卖出日复利）、累计收益、年化率、最大回撤、夏普比率
+    - 胜率、盈亏比、换手率
+    - 按卖出策略类型（观察变量中的 sell_strategy_type）的收益归因
+结果按策略版本哈希缓存，同一版本同一区间的交易记录未变化时直接返回缓存。
+"""
+
+import math
+import datetime
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# 回测初始资金
+INITIAL_FUNDS = 50000
+# 年化交易日数，用于夏普比率
+TRADING_DAYS_PER_YEAR = 252
+# 观察变量中记录卖出策略类型的键
+SELL_STRATEGY_TYPE_KEY = 'sell_strategy_type'
+
+TRADE_COLUMNS = ['trade_date', 'stock_code', 'stock_name', 'buy_time', 'buy_price', 'sell_time', 'sell_price', 'profit_rate', 'sell_strategy_type']
+
+
+@dataclass
+class PerformanceReport:
+    version_hash: str
+    start_date: str
+    end_date: str
+    initial_funds: float
+    trade_days: int = 0
+    avg_buy_day: float = 0.0
+    total_count: int = 0
+    unsettled_count: int = 0
+    positive_count: int = 0
+    win_rate: float = 0.0
+    total_profit: float = 0.0
+    total_loss: float = 0.0
+    profit_loss_ratio: float = 0.0
+    final_funds: float = 0.0
+    total_return: float = 0.0
+    cagr: Optional[float] = None
+    max_drawdown: float = 0.0
+    sharpe: Optional[float] = None
+    turnover: float = 0.0
+    extra: Dict[str, Any] = field(default_factory=dict)
+    equity_curve: pd.Series = field(default_factory=lambda: pd.Series(dtype=float))
+    drawdown: pd.Series = field(default_factory=lambda: pd.Series(dtype=float))
+    sell_type_attribution: pd.DataFrame = field(default_factory=pd.DataFrame)
+
+    def summary(self) -> Dict[str, Any]:
+        """标量指标字典，便于多个版本之间比较"""
+        return {
+            'trade_days': self.trade_days,
+            'avg_buy_day': self.avg_buy_day,
+            'total_count': self.total_count,
+            'positive_count': self.positive_count,
+            'win_rate': self.win_rate,
+            'extra': self.extra,
+            'total_profit': self.total_profit,
+            'total_loss': self.total_loss,
+            'profit_loss_ratio': self.profit_loss_ratio,
+            'initial_funds': self.initial_funds,
+            'final_funds': self.final_funds,
+            'total_return': self.total_return,
+            'cagr': self.cagr,
+            'max_drawdown': self.max_drawdown,
+            'sharpe': self.sharpe,
+            'turnover': self.turnover,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """导出为可序列化为 JSON 的结构"""
+        result = self.summary()
+        result.update({
+            'version_hash': self.version_hash,
+            'start_date': self.start_date,
+            'end_date': self.end_date,
+            'unsettled_count': self.unsettled_count,
+            'equity_curve': {date.strftime('%Y%m%d'): round(float(value), 2) for date, value in self.equity_curve.items()},
+            'sell_type_attribution': self.sell_type_attribution.reset_index().to_dict(orient='records'),
+        })
+        return result
+
+
+def trades_frame(records: Iterable[Tuple[Any, Any, Any]]) -> pd.DataFrame:
+    """
+    将 (TradeRecord, StrategyObservationEntry, ObservationVariable) 列表转换为 DataFrame，价格与收益率转为浮点数
+
+    返回:
+        pd.DataFrame: 列为 TRADE_COLUMNS，未卖出的交易 sell_price 为 NaN
+    """
+    rows = [
+        (entry.trade_date, entry.stock_code, entry.stock_name, record.buy_time, record.buy_price,
+         record.sell_time, record.sell_price, record.profit_rate,
+         (var.variables or {}).get(SELL_STRATEGY_TYPE_KEY) if var is not None else None)
+        for record, entry, var in records
+    ]
+    df = pd.DataFrame(rows, columns=TRADE_COLUMNS)
+    for column in ('buy_price', 'sell_price', 'profit_rate'):
+        df[column] = pd.to_numeric(df[column], errors='coerce').astype(float)
+    for column in ('buy_time', 'sell_time'):
+        df[column] = pd.to_datetime(df[column])
+    df['sell_strategy_type'] = pd.to_numeric(df['sell_strategy_type'], errors='coerce').fillna(0).astype(np.int64)
+    return df
+
+
+def _equity_curve(settled: pd.DataFrame, calendar: pd.DatetimeIndex, initial_funds: float) -> pd.Series:
+    """按卖出日将当日所有交易的收益复利到资金上，再按交易日历前向填充"""
+    if settled.empty:
+        return pd.Series(initial_funds, index=calendar, dtype=float)
+    growth = pd.Series(1 + settled['profit_rate'].to_numpy() / 100, index=settled['sell_time'].dt.normalize()).groupby(level=0).prod()
+    equity = initial_funds * growth.cumprod()
+    index = calendar.union(equity.index)
+    return equity.reindex(index).ffill().fillna(initial_funds)
+
+
+def sell_type_attribution(settled: pd.DataFrame, sell_type_names: Dict[int, str] = None) -> pd.DataFrame:
+    """
+    按卖出策略类型统计收益
+
+    返回:
+        pd.DataFrame: 索引为卖出策略类型，列为 交易数、胜率、平均收益(%)、对数收益贡献、收益占比
+    """
+    if settled.empty:
+        return pd.DataFrame(columns=['sell_type_name', 'count', 'win_rate', 'avg_profit_rate', 'log_return', 'contribution'])
+    log_return = np.log1p(settled['profit_rate'] / 100)
+    grouped = settled.assign(log_return=log_return, win=settled['profit_rate'] > 0).groupby('sell_strategy_type')
+    result = pd.DataFrame({
+        'count': grouped.size(),
+        'win_rate': grouped['win'].mean(),
+        'avg_profit_rate': grouped['profit_rate'].mean(),
+        'log_return': grouped['log_return'].sum(),
+    })
+    total_log_return = log_return.sum()
+    result['contribution'] = result['log_return'] / total_log_return if total_log_return != 0 else 0.0
+    names = sell_type_names or {}
+    result.insert(0, 'sell_type_name', [names.get(int(sell_type), '未记录' if sell_type == 0 else str(sell_type)) for sell_type in result.index])
+    return result.sort_values('count', ascending=False)
+
+
+def compute_performance(trades: pd.DataFrame, start_date: str, end_date: str, version_hash: str = '',
+                        calendar: Iterable[str] = None, sell_type_names: Dict[int, str] = None,
+                        initial_funds: float = INITIAL_FUNDS) -> PerformanceReport:
+    """
+    计算收益指标
+
+    参数:
+        trades: pd.DataFrame, trades_frame 的结果，区间内买入的交易
+        calendar: Iterable[str], 区间内的交易日 (格式: YYYYMMDD)，用于生成日度资金曲线，默认使用自然日
+        sell_type_names: Dict[int, str], 卖出策略类型 -> 名称
+
+    返回:
+        PerformanceReport
+    """
+    start_time = datetime.datetime.strptime(start_date, "%Y%m%d")
+    end_time = datetime.datetime.strptime(end_date, "%Y%m%d")
+    total_days = (end_time - start_time).days + 1
+    if total_days <= 0:
+        raise ValueError("起始日期必须早于结束日期")
+    total_years = total_days / 365
+
+    calendar_index = pd.DatetimeIndex(pd.to_datetime(list(calendar), format='%Y%m%d')) if calendar is not None else pd.date_range(start_time, end_time)
+    report = PerformanceReport(version_hash=version_hash, start_date=start_date, end_date=end_date, initial_funds=initial_funds)
+
+    settled = trades[trades['sell_price'].notna() & trades['profit_rate'].notna()].sort_values('sell_time', kind='stable')
+    report.trade_days = int(trades['buy_time'].dt.normalize().nunique())
+    report.avg_buy_day = round(total_days / report.trade_days, 1) if report.trade_days > 0 else 0
+    report.total_count = len(settled)
+    report.unsettled_count = len(trades) - len(settled)
+
+    profit_rate = settled['profit_rate'].to_numpy()
+    report.positive_count = int((profit_rate > 0).sum())
+    report.win_rate = report.positive_count / report.total_count if report.total_count > 0 else 0
+    report.total_profit = float(profit_rate[profit_rate > 0].sum())
+    report.total_loss = float(profit_rate[profit_rate < 0].sum())
+    report.profit_loss_ratio = report.total_profit / abs(report.total_loss) if report.total_loss != 0 else 0
+
+    equity = _equity_curve(settled, calendar_index, initial_funds)
+    report.equity_curve = equity
+    report.final_funds = float(initial_funds * np.prod(1 + profit_rate / 100)) if len(profit_rate) else float(initial_funds)
+    report.total_return = report.final_funds / initial_funds - 1
+    report.cagr = ((report.final_funds / initial_funds) ** (1 / total_years) - 1) if total_years > 0 else None
+
+    report.drawdown = equity / equity.cummax() - 1
+    report.max_drawdown = float(report.drawdown.min()) if len(report.drawdown) else 0.0
+
+    daily_returns = equity.pct_change().dropna()
+    std = daily_returns.std()
+    report.sharpe = float(daily_returns.mean() / std * math.sqrt(TRADING_DAYS_PER_YEAR)) if len(daily_returns) > 1 and std > 0 else None
+
+    # 换手率：每笔交易以买入时的全部资金成交，成交金额合计 / 平均资金，按年折算
+    if not settled.empty:
+        buy_equity = equity.reindex(settled['buy_time'].dt.normalize(), method='ffill').fillna(initial_funds)
+        report.turnover = float(buy_equity.sum() / equity.mean() / total_years)
+
+    report.sell_type_attribution = sell_type_attribution(settled, sell_type_names)
+    return report
+
+
+def compare_reports(reports: Dict[Hashable, PerformanceReport]) -> pd.DataFrame:
+    """将多个收益报告的标量指标合并为一张表，索引为传入的键"""
+    rows = {}
+    for key, report in reports.items():
+        summary = report.summary()
+        summary.pop('extra')
+        rows[key] = summary
+    return pd.DataFrame.from_dict(rows, orient='index')
+
+
+class PerformanceCache:
+    """
+    收益报告缓存，键为 (策略版本哈希, 策略ID, 运行模式, 开始日期, 结束日期)。
+    同时保存交易记录指纹（记录数、最大交易ID、已卖出数、最大卖出时间），指纹变化时重新计算。
+    """
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._reports: Dict[Tuple, Tuple[Tuple, PerformanceReport]] = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: Tuple, fingerprint: Tuple, compute: Callable[[], PerformanceReport]) -> PerformanceReport:
+        with self._lock:
+            cached = self._reports.get(key)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+        report = compute()
+        with self._lock:
+            if len(self._reports) >= self.max_size and key not in self._reports:
+                self._reports.pop(next(iter(self._reports)))
+            self._reports[key] = (fingerprint, report)
+        return report
+
+    def invalidate(self, version_hash: str = None) -> None:
+        with self._lock:
+            if version_hash is None:
+                self._reports.clear()
+            else:
+                for key in [key for key in self._reports if key[0] == version_hash]:
+                    del self._reports[key]
+
+
+performanceCache = PerformanceCache()
@@ -0,0 +1,213 @@
+# coding: utf-8
+# 文件：strategy_sweep.py
+
+"""
+策略参数扫描。
+
+对一组参数组合进行本地回测，按收益指标排序输出。策略参数按影响的回测阶段标注（见 StrategyParams.param_stage）：
+    - 盘后分析参数相同的组合共享同一份观察池分析结果，每组只分析一次
+    - 所有组合共享同一份分时数据列式存储，数据只加载一次，各进程通过内存映射读取
+    - 每个参数组合作为独立的策略版本，在进程池中只重放盘中买卖阶段
+
+用法:
+    python -m a_trade.strategy_sweep <开始日期(yyyyMMdd)> <结束日期(yyyyMMdd)> '<参数网格JSON>' [排序指标]
+
+    例如: python -m a_trade.strategy_sweep 20230101 20231231 '{"sold_out_pch": [3, 4, 5], "profit_stop": [-5, -6]}'
+"""
+
+import os
+import time
+import json
+import logging
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Type
+
+from a_trade.trade_calendar import TradeCalendar
+from a_trade.minute_bar_store import MINUTE_BAR_STORE_ENABLED
+from a_trade.strategy import (
+    Strategy, StrategyParams, CollectedObservations, BACKTEST_WORKERS,
+    _analysis_shard_worker, _minute_data_shard_worker, _shard_trade_dates)
+
+# 参数扫描默认进程数
+SWEEP_WORKERS = int(os.getenv('SWEEP_WORKERS', str(max(BACKTEST_WORKERS, os.cpu_count() or 1))))
+
+
+@dataclass
+class SweepResult:
+    params: Dict[str, Any]
+    version_id: int
+    summary: Optional[Dict[str, Any]]
+
+
+def expand_param_grid(base_params: StrategyParams, grid: Dict[str, Iterable]) -> List[StrategyParams]:
+    """
+    根据参数网格生成参数组合，未出现在网格中的参数取 base_params 中的值，重复的组合只保留一个
+
+    参数:
+        base_params: StrategyParams, 基准参数
+        grid: Dict[str, Iterable], 参数名 -> 候选值列表
+
+    返回:
+        List[StrategyParams]: 参数组合列表
+    """
+    unknown_names = set(grid.keys()) - set(type(base_params).model_fields.keys())
+    if unknown_names:
+        raise ValueError(f"未知的策略参数: {unknown_names}")
+
+    names = list(grid.keys())
+    params_list = []
+    seen_md5: Set[str] = set()
+    for values in itertools.product(*(list(grid[name]) for name in names)):
+        params = base_params.model_copy(update=dict(zip(names, values)))
+        params = type(base_params).model_validate(params.model_dump())
+        params_md5 = params.to_md5()
+        if params_md5 not in seen_md5:
+            seen_md5.add(params_md5)
+            params_list.append(params)
+    return params_list
+
+
+class ParameterSweep:
+    """
+    参数扫描器
+
+    参数:
+        strategy_cls: Type[Strategy], 策略类，构造函数需支持 params 关键字参数
+        grid: Dict[str, Iterable], 参数名 -> 候选值列表
+        base_params: StrategyParams, 基准参数，默认使用策略的默认参数
+        workers: int, 进程数
+    """
+
+    def __init__(self, strategy_cls: Type[Strategy], grid: Dict[str, Iterable],
+                 base_params: Optional[StrategyParams] = None, workers: int = SWEEP_WORKERS):
+        self.strategy_cls = strategy_cls
+        self.base_strategy = strategy_cls() if base_params is None else strategy_cls(params=base_params)
+        if not self.base_strategy.task_cls.supports_parallel_analysis:
+            raise ValueError(f"策略 {self.base_strategy.strategy_name()} 的盘后分析依赖持仓，不支持参数扫描")
+        self.params_list = expand_param_grid(self.base_strategy.params, grid)
+        self.workers = max(1, workers)
+
+    def _analyze(self, params: StrategyParams, trade_dates: List[str], executor: ProcessPoolExecutor) -> Dict[str, CollectedObservations]:
+        analysis_results: Dict[str, CollectedObservations] = {}
+        futures = [
+            executor.submit(_analysis_shard_worker, self.strategy_cls, params, shard)
+            for shard in _shard_trade_dates(trade_dates, self.workers)
+        ]
+        for future in futures:
+            analysis_results.update(future.result())
+        return analysis_results
+
+    def _load_minute_data(self, analysis_groups: Dict[str, Dict[str, CollectedObservations]], executor: ProcessPoolExecutor) -> None:
+        """按所有分析结果中的观察条目（买入日及下一交易日）加载分时数据到列式存储"""
+        requests: Dict[str, Set[str]] = {}
+        for analysis_results in analysis_groups.values():
+            for collected in analysis_results.values():
+                for entry_date, stock_code, _, _ in collected.entries:
+                    requests.setdefault(entry_date, set()).add(stock_code)
+                    next_date = TradeCalendar.get_next_trade_date(entry_date)
+                    if next_date:
+                        requests.setdefault(next_date, set()).add(stock_code)
+        sorted_requests = sorted((trade_date, sorted(stock_codes)) for trade_date, stock_codes in requests.items())
+        loaded = sum(executor.map(_minute_data_shard_worker, _shard_trade_dates(sorted_requests, self.workers)))
+        logging.info(f"参数扫描分时数据加载完成, 共 {loaded} 个股票日")
+
+    def run(self, start_date: str, end_date: str, rank_by: str = 'cagr') -> List[SweepResult]:
+        """
+        执行参数扫描
+
+        参数:
+            start_date: str, 开始日期 (格式: YYYYMMDD)
+            end_date: str, 结束日期 (格式: YYYYMMDD)
+            rank_by: str, 排序指标，为 performance_summary 返回的键
+
+        返回:
+            List[SweepResult]: 按排序指标从高到低排列的结果，无交易数据的组合排在最后
+        """
+        start_time = time.time()
+        trade_dates = TradeCalendar.get_trade_dates(start_date, end_date)
+        if not trade_dates:
+            return []
+        self.base_strategy.prefetch_minute_data(start_date, end_date)
+
+        # 先在主进程中依次登记所有策略版本，避免子进程并发创建版本号冲突
+        for params in self.params_list:
+            self.strategy_cls(params=params)
+
+        # 按盘后分析参数分组，每组只分析一次
+        params_by_analysis: Dict[str, List[StrategyParams]] = {}
+        for params in self.params_list:
+            params_by_analysis.setdefault(params.analysis_md5(), []).append(params)
+        logging.info(f"参数扫描: {len(self.params_list)} 组参数, {len(params_by_analysis)} 组盘后分析参数, {len(trade_dates)} 个交易日")
+
+        mp_context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=mp_context) as executor:
+            analysis_groups = {
+                analysis_md5: self._analyze(params_group[0], trade_dates, executor)
+                for analysis_md5, params_group in params_by_analysis.items()
+            }
+            if MINUTE_BAR_STORE_ENABLED:
+                self._load_minute_data(analysis_groups, executor)
+
+            futures = [
+                executor.submit(_sweep_replay_worker, self.strategy_cls, params, start_date, end_date, analysis_groups[analysis_md5])
+                for analysis_md5, params_group in params_by_analysis.items()
+                for params in params_group
+            ]
+            results = [future.result() for future in futures]
+
+        results.sort(key=lambda result: _rank_value(result, rank_by), reverse=True)
+        logging.info(f"参数扫描完成, 耗时: {time.time() - start_time:.2f} 秒")
+        print_sweep_results(results, self.params_list[0].model_fields.keys() if self.params_list else [], rank_by)
+        return results
+
+
+def _rank_value(result: SweepResult, rank_by: str) -> Tuple[int, float]:
+    value = result.summary.get(rank_by) if result.summary else None
+    return (0, 0.0) if value is None else (1, float(value))
+
+
+def _sweep_replay_worker(strategy_cls: Type[Strategy], params: StrategyParams, start_date: str, end_date: str,
+                         analysis_results: Dict[str, CollectedObservations]) -> SweepResult:
+    """进程池任务：以指定参数创建策略版本，写入共享的盘后分析结果后重放买卖并计算收益指标"""
+    strategy = strategy_cls(params=params)
+    trade_dates = TradeCalendar.get_trade_dates(start_date, end_date)
+    with strategy.memory_ledger(start_date, end_date):
+        strategy.apply_collected_observations(trade_dates, analysis_results)
+        strategy.iterate_simulation_days(start_date, end_date, strategy.strategy_replay_daily_work)
+    return SweepResult(params=params.model_dump(), version_id=strategy.version_id, summary=strategy.performance_summary(start_date, end_date))
+
+
+def print_sweep_results(results: List[SweepResult], param_names: Iterable[str], rank_by: str, top: int = 20) -> None:
+    """打印排名前 top 的参数组合，只展示各组合之间取值不同的参数"""
+    if not results:
+        print("没有参数扫描结果")
+        return
+    varying_names = [
+        name for name in param_names
+        if len({json.dumps(result.params[name]) for result in results}) > 1
+    ]
+    print(f"参数扫描结果（按 {rank_by} 排序，共 {len(results)} 组）")
+    for rank, result in enumerate(results[:top], start=1):
+        param_desc = ', '.join(f"{name}={result.params[name]}" for name in varying_names)
+        summary = result.summary
+        if summary is None:
+            print(f"{rank:>3}. v{result.version_id} [{param_desc}] 没有交易数据")
+            continue
+        cagr_desc = f"{summary['cagr']:.2%}" if summary['cagr'] is not None else "无"
+        print(f"{rank:>3}. v{result.version_id} [{param_desc}] 交易数 {summary['total_count']} "
+              f"胜率 {summary['win_rate']:.2%} 盈亏比 {summary['profit_loss_ratio']:.2f} "
+              f"累计资金 {summary['final_funds']:.2f} 年化率 {cagr_desc}")
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) < 4:
+        print("用法: python -m a_trade.strategy_sweep <开始日期(yyyyMMdd)> <结束日期(yyyyMMdd)> '<参数网格JSON>' [排序指标]")
+        sys.exit(1)
+
+    from a_trade.strategy_Yugi_s1 import StrategyYugiS1
+    sweep = ParameterSweep(StrategyYugiS1, json.loads(sys.argv[3]))
+    sweep.run(sys.argv[1], sys.argv[2], sys.argv[4] if len(sys.argv) > 4 else 'cagr')
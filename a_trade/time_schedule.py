@@ -1,37 +1,121 @@
 # coding: utf-8
 import datetime
 import logging
-from typing import Callable, List, Dict
+from typing import Callable, List, Dict, Optional, Tuple
 from collections import defaultdict
 
+import numpy as np
+
 from a_trade.stock_minute_data import get_minute_data_for_multiple_stocks
+from a_trade.minute_bar_store import trade_time_to_seconds
+
+MARKET_OPEN_SECONDS = 9 * 3600 + 30 * 60
+MARKET_CLOSE_SECONDS = 15 * 3600
+SCHEDULE_MIN_SECONDS = 9 * 3600
+SCHEDULE_MAX_SECONDS = 20 * 3600
+
+
+def _bar_seconds(bar) -> int:
+    """分钟数据的当日秒数，MinuteBar 直接读取整数时间，其他对象解析 trade_time"""
+    seconds = getattr(bar, 'time', None)
+    if isinstance(seconds, (int, np.integer)):
+        return int(seconds)
+    return trade_time_to_seconds(bar.trade_time)
+
+
+def _seconds_to_hhmm(seconds: int) -> str:
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}"
+
+
+class MinuteEventTimeline:
+    """
+    盘中分钟事件时间线。
+
+    将所有订阅股票的分钟数据合并为按时间稳定排序的数组，时间为当日零点起的整数秒，
+    回放时按游标逐个时间点取出该时刻真实存在的分钟数据，没有数据的分钟不产生事件。
+    同一时刻内股票的顺序与传入顺序一致。
+    """
+
+    def __init__(self, stock_minute_data: Dict[str, list], start_seconds: int = MARKET_OPEN_SECONDS,
+                 end_seconds: int = MARKET_CLOSE_SECONDS, interval: int = 1):
+        codes: List[str] = []
+        bars: list = []
+        times: List[int] = []
+        step = interval * 60
+        for stock_code, minute_data_list in stock_minute_data.items():
+            for bar in minute_data_list:
+                seconds = _bar_seconds(bar)
+                if seconds < start_seconds or seconds > end_seconds or (seconds - start_seconds) % step:
+                    continue
+                codes.append(stock_code)
+                bars.append(bar)
+                times.append(seconds)
+
+        time_array = np.asarray(times, dtype=np.int32)
+        order = np.argsort(time_array, kind='stable')
+        sorted_times = time_array[order]
+        boundaries = np.flatnonzero(np.diff(sorted_times)) + 1
+        starts = np.concatenate(([0], boundaries)) if len(sorted_times) else np.empty(0, dtype=np.int64)
+        ends = np.concatenate((boundaries, [len(sorted_times)])) if len(sorted_times) else np.empty(0, dtype=np.int64)
+
+        self.times: List[int] = sorted_times[starts].tolist() if len(sorted_times) else []
+        self._codes = [codes[i] for i in order]
+        self._bars = [bars[i] for i in order]
+        self._ranges: List[Tuple[int, int]] = list(zip(starts.tolist(), ends.tolist()))
+        self.event_count = len(self._bars)
+
+    def events_at(self, position: int) -> List[Tuple[str, object]]:
+        """第 position 个时间点的 (股票代码, 分钟数据) 列表"""
+        begin, end = self._ranges[position]
+        return list(zip(self._codes[begin:end], self._bars[begin:end]))
+
 
 class TimeScheduleBus:
     """
     分钟数据订阅模块，支持多个股票代码的分钟数据订阅，
     并支持在模拟时间触发自定义回调(函数)。
     由内部自动决定 start_time 与 end_time，不再需要外部传入。
+
+    盘中阶段由 MinuteEventTimeline 驱动，只在存在分钟数据或定时回调的时间点派发事件。
     """
 
-    def __init__(self, trade_date: str):
-        self.subscribers: Dict[str, Callable[[str, dict, datetime.datetime], None]] = {}
+    def __init__(self, trade_date: str, minute_data_loader: Callable[[List[str], str], Dict[str, list]] = get_minute_data_for_multiple_stocks):
+        self.subscribers: Dict[str, Callable[[str, dict, str], None]] = {}
+        # 批量订阅：股票代码 -> 回调函数，同一分钟内同一回调的所有股票数据一次性推送
+        self.batch_subscribers: Dict[str, Callable[[Dict[str, dict], str], None]] = {}
         self.trade_date = trade_date
+        self.minute_data_loader = minute_data_loader
         
-        # 用于保存“定时函数调用”：键为 datetime.datetime 对象，值为回调函数列表
-        self.scheduled_func_calls = defaultdict(list)
+        # 用于保存“定时函数调用”：键为当日零点起的秒数，值为回调函数列表
+        self.scheduled_func_calls: Dict[int, List[Callable[[], None]]] = defaultdict(list)
 
-    def subscribe(self, stock_codes: List[str], callback: Callable[[str, dict, datetime.datetime], None]):
+    def subscribe(self, stock_codes: List[str], callback: Callable[[str, dict, str], None]):
         """
         订阅股票的分钟数据。
 
         参数:
             stock_codes: list，订阅的股票代码列表。
-            callback: function，回调函数，接受三个参数 (stock_code, minute_data, current_time)。
+            callback: function，回调函数，接受三个参数 (stock_code, minute_data, trade_time)。
         """
         logging.info(f"开始监听 {stock_codes}")
         for stock_code in stock_codes:
+            self.batch_subscribers.pop(stock_code, None)
             self.subscribers[stock_code] = callback
 
+    def subscribe_batch(self, stock_codes: List[str], callback: Callable[[Dict[str, dict], str], None]):
+        """
+        批量订阅股票的分钟数据，每个时间点只回调一次。
+
+        参数:
+            stock_codes: list，订阅的股票代码列表。
+            callback: function，回调函数，接受两个参数 (minute_data_map, trade_time)，
+                      minute_data_map 为该时间点存在数据的已订阅股票代码 -> 分钟数据。
+        """
+        logging.info(f"开始批量监听 {stock_codes}")
+        for stock_code in stock_codes:
+            self.subscribers.pop(stock_code, None)
+            self.batch_subscribers[stock_code] = callback
+
     def unsubscribe(self, stock_code: str) -> bool:
         """
         取消订阅某只股票。
@@ -39,9 +123,10 @@ class TimeScheduleBus:
         参数:
             stock_code: string，取消订阅的股票代码。
         """
-        if stock_code in self.subscribers:
+        if stock_code in self.subscribers or stock_code in self.batch_subscribers:
             logging.info(f"停止监听 {stock_code}")
-            del self.subscribers[stock_code]
+            self.subscribers.pop(stock_code, None)
+            self.batch_subscribers.pop(stock_code, None)
             return True
         else:
             return False
@@ -59,30 +144,21 @@ class TimeScheduleBus:
             - 内部以分钟粒度为主（若需要秒级可自行扩展）。
             - 若多次在同一时间点注册不同回调函数，所有回调都会依次执行。
         """
-        # 先将 trigger_time 统一转换为 datetime.datetime 对象
         fmt = "%H:%M" if len(trigger_time) == 5 else "%H:%M:%S"
         try:
             time_part = datetime.datetime.strptime(trigger_time, fmt).time()
         except ValueError:
             raise ValueError(f"触发时间格式错误: {trigger_time}, 请使用HH:MM或HH:MM:SS格式")
 
-        # 检查范围 09:00:00 <= dt_time <= 20:00:00
-        if time_part < datetime.time(9, 0, 0) or time_part > datetime.time(20, 0, 0):
+        # 统一转换为当日零点起的秒数，检查范围 09:00:00 <= trigger_time <= 20:00:00
+        trigger_seconds = time_part.hour * 3600 + time_part.minute * 60 + time_part.second
+        if trigger_seconds < SCHEDULE_MIN_SECONDS or trigger_seconds > SCHEDULE_MAX_SECONDS:
             raise ValueError("触发时间超出允许范围(09:00:00 - 20:00:00)")
 
-        # 转换为 trade_date 的 datetime.datetime 对象
-        trigger_datetime = datetime.datetime.combine(
-            datetime.datetime.strptime(self.trade_date, "%Y%m%d").date(),
-            time_part
-        )
-
-        self.scheduled_func_calls[trigger_datetime].append(callback)
-        
-        # 移除对 scheduled_func_calls 进行重新赋值和排序的操作
-        # self.scheduled_func_calls = dict(sorted(self.scheduled_func_calls.items()))
+        self.scheduled_func_calls[trigger_seconds].append(callback)
         
         func_name = getattr(callback, '__name__', repr(callback))
-        logging.info(f"已注册定时函数，时间={trigger_datetime.time()}, 函数名={func_name}")
+        logging.info(f"已注册定时函数，时间={time_part}, 函数名={func_name}")
 
     def start_trade(self, interval: int = 1):
         """
@@ -91,114 +167,110 @@ class TimeScheduleBus:
         self.pre_market_trade()
         self.during_market_trade(interval=interval)
         self.post_market_trade()
-    
-    def pre_market_trade(self):
-        """
-        盘前交易：
-        执行所有在09:30之前注册的API回调。
-        """
-        trade_date_obj = datetime.datetime.strptime(self.trade_date, "%Y%m%d").date()
-        pre_market_end = datetime.datetime.combine(trade_date_obj, datetime.time(9, 30))
 
-        # 获取所有触发时间在09:30之前的回调，并按时间排序
-        pre_market_callbacks = []
-        for trigger_time, callbacks in sorted(self.scheduled_func_calls.items()):
-            if trigger_time < pre_market_end:
-                pre_market_callbacks.extend(callbacks)
-                del self.scheduled_func_calls[trigger_time]
+    def _pop_scheduled_calls(self, predicate: Callable[[int], bool]) -> List[Tuple[int, List[Callable[[], None]]]]:
+        """按时间顺序取出并移除满足条件的定时回调"""
+        trigger_times = sorted(t for t in self.scheduled_func_calls if predicate(t))
+        return [(t, self.scheduled_func_calls.pop(t)) for t in trigger_times]
 
-        for callback in pre_market_callbacks:
+    def _run_callbacks(self, callbacks: List[Callable[[], None]], stage: str, time_desc: str = ''):
+        for callback in callbacks:
             func_name = getattr(callback, '__name__', repr(callback))
-            logging.info(f"{self.trade_date} 即将执行盘前回调函数: {func_name}")
+            logging.info(f"{self.trade_date} {time_desc}即将执行{stage}回调函数: {func_name}")
             try:
                 callback()
             except Exception as e:
-                logging.error(f"执行盘前回调函数异常: {e}")
+                logging.error(f"执行{stage}回调函数异常: {e}")
+    
+    def pre_market_trade(self):
+        """
+        盘前交易：
+        执行所有在09:30之前注册的API回调。
+        """
+        for _, callbacks in self._pop_scheduled_calls(lambda t: t < MARKET_OPEN_SECONDS):
+            self._run_callbacks(callbacks, '盘前')
 
-    def during_market_trade(self, interval: int = 1):
+    def during_market_trade(self, interval: int = 1) -> int:
         """
         盘中交易：
-        如果存在订阅股票代码或盘中回调，09:30 - 15:00通过current_dt模拟时间按照分钟推进，
-        在每个时间点执行注册的回调并推送分钟数据给订阅者。
+        如果存在订阅股票代码或盘中回调，09:30 - 15:00 按 interval 分钟的时间点回放，
+        在每个时间点先执行注册的回调，再推送该时间点存在的分钟数据给订阅者。
+        回放中取消订阅的股票不再推送；分钟数据在盘中开始前一次性加载，盘中新增的订阅不会收到数据。
+
+        返回:
+            int: 实际推送的分钟数据条数
         """
         if not self.trade_date:
             raise ValueError("交易日期未设置，请在初始化时指定 trade_date。")
 
-        trade_date_obj = datetime.datetime.strptime(self.trade_date, "%Y%m%d").date()
-
-        market_start_datetime = datetime.datetime.combine(trade_date_obj, datetime.time(9, 30))
-        market_end_datetime = datetime.datetime.combine(trade_date_obj, datetime.time(15, 0))
+        step = interval * 60
+        market_callbacks = [
+            item for item in self._pop_scheduled_calls(lambda t: MARKET_OPEN_SECONDS <= t <= MARKET_CLOSE_SECONDS)
+            if (item[0] - MARKET_OPEN_SECONDS) % step == 0
+        ]
 
-        # 获取盘中所有触发时间，并按时间排序
-        market_callbacks = defaultdict(list)
-        for trigger_time, callbacks in sorted(self.scheduled_func_calls.items()):
-            if market_start_datetime <= trigger_time <= market_end_datetime:
-                market_callbacks[trigger_time].extend(callbacks)
-
-        # 移除盘中的回调
-        for trigger_time in list(market_callbacks.keys()):
-            del self.scheduled_func_calls[trigger_time]
-
-        # 获取股票分钟数据
-        stock_codes = list(self.subscribers.keys())
+        stock_codes = list(self.subscribers.keys()) + list(self.batch_subscribers.keys())
         
         # 如果没有订阅股票且没有盘中回调，则跳过盘中交易
         if not stock_codes and not market_callbacks:
             logging.info(f"{self.trade_date} 盘中交易阶段没有订阅股票且没有注册的回调函数，跳过盘中交易。")
-            return
+            return 0
 
-        stock_minute_data = get_minute_data_for_multiple_stocks(stock_codes, self.trade_date)
+        stock_minute_data = self.minute_data_loader(stock_codes, self.trade_date) if stock_codes else {}
+        timeline = MinuteEventTimeline(stock_minute_data, MARKET_OPEN_SECONDS, MARKET_CLOSE_SECONDS, interval)
+        return self.replay(timeline, market_callbacks)
 
-        # 按 datetime.datetime 分组
-        time_grouped_data = defaultdict(dict)
-        for stock_code, minute_data_list in stock_minute_data.items():
-            for data in minute_data_list:
-                trade_datetime = datetime.datetime.strptime(data.trade_time, "%Y-%m-%d %H:%M:%S")
-                trade_datetime = datetime.datetime.combine(trade_date_obj, trade_datetime.time())
-                time_grouped_data[trade_datetime][stock_code] = data
-
-        current_dt = market_start_datetime
-        step = datetime.timedelta(minutes=interval)
-
-        while current_dt <= market_end_datetime:
-            # 执行在当前时间的盘中回调
-            if current_dt in market_callbacks:
-                for callback in market_callbacks[current_dt]:
-                    func_name = getattr(callback, '__name__', repr(callback))
-                    logging.info(f"{self.trade_date} [{current_dt.time()}] 即将执行盘中回调函数: {func_name}")
-                    try:
-                        callback()
-                    except Exception as e:
-                        logging.error(f"执行盘中回调函数异常: {e}")
-
-            # 推送当前时间的股票数据给订阅者
-            if current_dt in time_grouped_data:
-                for stock_code, data in time_grouped_data[current_dt].items():
-                    if stock_code not in self.subscribers:
-                        continue
-                    self.subscribers[stock_code](stock_code, data, current_dt.strftime("%H:%M"))
-
-            current_dt += step
+    def replay(self, timeline: MinuteEventTimeline, market_callbacks: List[Tuple[int, List[Callable[[], None]]]] = None) -> int:
+        """
+        按时间顺序合并定时回调与分钟数据事件并派发，同一时间点定时回调先于分钟数据执行
+
+        参数:
+            timeline: MinuteEventTimeline，盘中分钟事件时间线
+            market_callbacks: 按时间排序的 (当日秒数, 回调列表)
+
+        返回:
+            int: 实际推送的分钟数据条数
+        """
+        market_callbacks = market_callbacks or []
+        callback_cursor = 0
+        dispatched = 0
+        for position, current_seconds in enumerate(timeline.times):
+            while callback_cursor < len(market_callbacks) and market_callbacks[callback_cursor][0] <= current_seconds:
+                trigger_seconds, callbacks = market_callbacks[callback_cursor]
+                self._run_callbacks(callbacks, '盘中', f"[{_seconds_to_hhmm(trigger_seconds)}] ")
+                callback_cursor += 1
+            dispatched += self._dispatch(timeline.events_at(position), _seconds_to_hhmm(current_seconds))
+
+        for trigger_seconds, callbacks in market_callbacks[callback_cursor:]:
+            self._run_callbacks(callbacks, '盘中', f"[{_seconds_to_hhmm(trigger_seconds)}] ")
+        return dispatched
+
+    def _dispatch(self, events: List[Tuple[str, object]], trade_time: str) -> int:
+        """推送同一时间点的分钟数据，订阅关系在推送时读取，已取消订阅的股票跳过"""
+        dispatched = 0
+        batches: Dict[Callable, Dict[str, object]] = {}
+        for stock_code, data in events:
+            callback = self.subscribers.get(stock_code)
+            if callback is not None:
+                callback(stock_code, data, trade_time)
+                dispatched += 1
+                continue
+            batch_callback = self.batch_subscribers.get(stock_code)
+            if batch_callback is not None:
+                batches.setdefault(batch_callback, {})[stock_code] = data
+
+        for batch_callback, minute_data_map in batches.items():
+            # 同一时间点内前面的回调可能取消了部分股票的订阅
+            minute_data_map = {code: data for code, data in minute_data_map.items() if self.batch_subscribers.get(code) == batch_callback}
+            if minute_data_map:
+                batch_callback(minute_data_map, trade_time)
+                dispatched += len(minute_data_map)
+        return dispatched
 
     def post_market_trade(self):
         """
         盘后交易：
         执行所有在15:00之后注册的API回调。
         """
-        trade_date_obj = datetime.datetime.strptime(self.trade_date, "%Y%m%d").date()
-        post_market_start = datetime.datetime.combine(trade_date_obj, datetime.time(15, 0))
-
-        # 获取所有触发时间在15:00之后的回调，并按时间排序
-        post_market_callbacks = []
-        for trigger_time, callbacks in sorted(self.scheduled_func_calls.items()):
-            if trigger_time >= post_market_start:
-                post_market_callbacks.extend(callbacks)
-                del self.scheduled_func_calls[trigger_time]
-
-        for callback in post_market_callbacks:
-            func_name = getattr(callback, '__name__', repr(callback))
-            logging.info(f"{self.trade_date} 即将执行盘后回调函数: {func_name}")
-            try:
-                callback()
-            except Exception as e:
-                logging.error(f"执行盘后回调函数异常: {e}")
+        for _, callbacks in self._pop_scheduled_calls(lambda t: t >= MARKET_CLOSE_SECONDS):
+            self._run_callbacks(callbacks, '盘后')
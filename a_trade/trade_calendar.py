@@ -5,9 +5,11 @@ import os
 import datetime
 from a_trade.settings import _get_tushare
 from sqlalchemy import Column, String, Integer
-from a_trade.db_base import Session, Base
+from a_trade.db_base import Session, Base, bulk_upsert_dataframe
+import bisect
 import logging
-from typing import Optional, List, Callable
+import threading
+from typing import Optional, List, Callable, Dict, Tuple
 
 # 定义数据库模型
 class TradeCalendar(Base):
@@ -48,17 +50,9 @@ class TradeCalendar(Base):
             if trade_calendar.empty:
                 logging.warning(f"从 {start_date} 到 {end_date} 没有获取到新的交易日历数据")
             else:
-                # 插入或更新交易日历数据
-                for _, row in trade_calendar.iterrows():
-                    new_record = TradeCalendar(
-                        exchange=row['exchange'],
-                        cal_date=row['cal_date'],
-                        is_open=row['is_open'],
-                        pretrade_date=row['pretrade_date']
-                    )
-                    session.merge(new_record)
-
-                session.commit()
+                # 批量插入或更新交易日历数据
+                bulk_upsert_dataframe(trade_calendar, TradeCalendar)
+                tradeCalendarIndex.invalidate()
                 logging.info(f"成功更新了 {len(trade_calendar)} 条交易日历数据")
         except Exception as e:
             session.rollback()
@@ -78,23 +72,14 @@ class TradeCalendar(Base):
         :param exchange: 交易所 (默认 'SSE')
         :return: 第 delta 个交易日的日期，或者 None
         """
-        with Session() as session:
-            # 查询未来可能的交易日列表
-            future_trade_days = (
-                session.query(TradeCalendar.cal_date)
-                .filter(TradeCalendar.cal_date > start_date, TradeCalendar.exchange == exchange)
-                .filter(TradeCalendar.is_open == 1)  # 只选择开市日
-                .order_by(TradeCalendar.cal_date.asc())
-                .limit(delta)  # 只查询 delta 个交易日
-                .all()
-            )
-
-            # 确保有足够的交易日返回
-            if len(future_trade_days) < delta:
-                return None
-
-            # 返回目标交易日
-            return future_trade_days[-1][0]  # 返回第 delta 个交易日
+        open_dates = tradeCalendarIndex.get(exchange).open_dates
+        # 第一个晚于 start_date 的交易日位置
+        index = bisect.bisect_right(open_dates, start_date) + delta - 1
+
+        # 确保有足够的交易日返回
+        if index >= len(open_dates):
+            return None
+        return open_dates[index]
 
     @staticmethod
     def get_previous_trade_date(trade_date: str, delta: int = 1, exchange: str = 'SSE') -> str:
@@ -106,53 +91,37 @@ class TradeCalendar(Base):
         :param exchange: 交易所 (默认 'SSE')
         :return: 第 delta 个交易日的日期
         """
-        with Session() as session:
-            # 一次性获取所有小于 trade_date 的交易日，按日期降序排列
-            results = (
-                session.query(TradeCalendar.cal_date)
-                .filter(TradeCalendar.cal_date < trade_date, TradeCalendar.exchange == exchange, TradeCalendar.is_open == 1)
-                .order_by(TradeCalendar.cal_date.desc())
-                .limit(delta)  # 只获取 delta 个交易日
-                .all()
-            )
-            
-            # 确保查询到足够的交易日
-            if len(results) < delta:
-                raise ValueError("Insufficient previous trade dates found for the given trade date.")
-            
-            # 返回第 delta 个交易日
-            return results[-1][0]  # results 是 [(cal_date,)] 格式，取第一个值
+        open_dates = tradeCalendarIndex.get(exchange).open_dates
+        # 第一个不早于 trade_date 的交易日位置，之前的都是更早的交易日
+        index = bisect.bisect_left(open_dates, trade_date) - delta
+
+        # 确保查询到足够的交易日
+        if index < 0:
+            raise ValueError("Insufficient previous trade dates found for the given trade date.")
+        return open_dates[index]
 
     @staticmethod
     def is_trade_day(cal_date: str, exchange: str = 'SSE') -> Optional[bool]:
-        session = Session()
-        try:
-            result = session.query(TradeCalendar.is_open).filter(
-                TradeCalendar.cal_date == cal_date,
-                TradeCalendar.exchange == exchange
-            ).first()
-            if result:
-                return result.is_open == 1
-            else:
-                return None
-        finally:
-            session.close()
+        return tradeCalendarIndex.get(exchange).is_open_map.get(cal_date)
 
     @staticmethod
     def get_trade_dates(start_date: str, end_date: str, exchange: str = 'SSE') -> List[str]:
         if not TradeCalendar.validate_date_range(start_date, end_date):
             return []
-        
-        session = Session()
-        try:
-            result = session.query(TradeCalendar.cal_date).filter(
-                TradeCalendar.exchange == exchange,
-                TradeCalendar.is_open == 1,
-                TradeCalendar.cal_date.between(start_date, end_date)
-            ).order_by(TradeCalendar.cal_date).all()
-            return [row.cal_date for row in result]
-        finally:
-            session.close()
+
+        open_dates = tradeCalendarIndex.get(exchange).open_dates
+        return open_dates[bisect.bisect_left(open_dates, start_date):bisect.bisect_right(open_dates, end_date)]
+
+    @staticmethod
+    def get_trade_date_ordinal(trade_date: str, exchange: str = 'SSE') -> Optional[int]:
+        """
+        获取交易日在交易日历中的序号，相邻交易日序号相差1，非交易日返回 None。
+
+        :param trade_date: 交易日 (格式: YYYYMMDD)
+        :param exchange: 交易所 (默认 'SSE')
+        :return: 交易日序号
+        """
+        return tradeCalendarIndex.get(exchange).ordinal_map.get(trade_date)
 
     @staticmethod
     def iterate_trade_days(start_date: str, end_date: str, closure: Callable[[str], None], reverse: bool = False) -> None:
@@ -179,18 +148,51 @@ class TradeCalendar(Base):
 
     @staticmethod
     def get_recent_trade_date(exchange: str = 'SSE') -> str:
-        session = Session()
-        try:
-            result = session.query(TradeCalendar.cal_date).filter(
-                TradeCalendar.exchange == exchange,
-                TradeCalendar.is_open == 1
-            ).order_by(TradeCalendar.cal_date.desc()).limit(1).first()
-            if result:
-                return result.cal_date
-            else:
-                raise ValueError("No recent trade date found.")
-        finally:
-            session.close()
+        open_dates = tradeCalendarIndex.get(exchange).open_dates
+        if open_dates:
+            return open_dates[-1]
+        else:
+            raise ValueError("No recent trade date found.")
+
+class _ExchangeCalendar:
+    """单个交易所的交易日历快照"""
+    def __init__(self, rows: List[Tuple[str, int]]):
+        # 按日期升序排列的开市日
+        self.open_dates: List[str] = [cal_date for cal_date, is_open in rows if is_open == 1]
+        # 开市日 -> 序号
+        self.ordinal_map: Dict[str, int] = {cal_date: index for index, cal_date in enumerate(self.open_dates)}
+        # 日历日期 -> 是否开市
+        self.is_open_map: Dict[str, bool] = {cal_date: is_open == 1 for cal_date, is_open in rows}
+
+class TradeCalendarIndex:
+    """
+    进程内交易日历索引，首次使用时从数据库加载，之后所有日历查询均为内存中的二分查找或字典查找。
+    交易日历更新后需调用 invalidate 使索引失效。
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calendars: Dict[str, _ExchangeCalendar] = {}
+
+    def get(self, exchange: str = 'SSE') -> _ExchangeCalendar:
+        calendar = self._calendars.get(exchange)
+        if calendar is None:
+            with self._lock:
+                calendar = self._calendars.get(exchange)
+                if calendar is None:
+                    with Session() as session:
+                        rows = session.query(TradeCalendar.cal_date, TradeCalendar.is_open).filter(
+                            TradeCalendar.exchange == exchange
+                        ).order_by(TradeCalendar.cal_date).all()
+                    calendar = _ExchangeCalendar([(row.cal_date, row.is_open) for row in rows])
+                    self._calendars[exchange] = calendar
+                    logging.debug(f"交易日历索引已加载: {exchange} 共 {len(calendar.open_dates)} 个交易日")
+        return calendar
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._calendars = {}
+
+tradeCalendarIndex = TradeCalendarIndex()
 
 if __name__ == "__main__":
     import sys
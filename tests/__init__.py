@@ -0,0 +1,11 @@
+# coding: utf-8
+
+# 测试使用临时项目目录，数据库等文件均创建在该目录下，不读写真实数据
+import os
+import atexit
+import shutil
+import tempfile
+
+TEST_PROJECT_DIR = tempfile.mkdtemp(prefix='a_trade_test_')
+os.environ['PROJECT_DIR'] = TEST_PROJECT_DIR
+atexit.register(shutil.rmtree, TEST_PROJECT_DIR, ignore_errors=True)
@@ -0,0 +1,43 @@
+# coding: utf-8
+
+import json
+import unittest
+from unittest import mock
+
+from a_trade import concept_llm_analysis
+from a_trade.concept_llm_analysis import analyze_related_concepts_with_limit_reasons
+
+
+class RelatedConceptBatchTest(unittest.TestCase):
+    def test_out_of_list_concepts_fall_back_to_single_request(self):
+        items = [
+            ('华为云', ['云计算', '华为概念']),
+            ('锂电池', ['锂电池', '固态电池']),
+        ]
+        single_prompts = []
+
+        def fake_map(provider, requests, return_exceptions=True):
+            responses = []
+            for request in requests:
+                if request.user_prompt.startswith('['):
+                    # 批量响应中第二个原因选了别人的候选板块
+                    responses.append(request.parse(json.dumps([
+                        {'id': 0, 'output': ['云计算'], 'reason': '推理过程'},
+                        {'id': 1, 'output': ['锂电池', '华为概念'], 'reason': '推理过程'},
+                    ], ensure_ascii=False)))
+                else:
+                    single_prompts.append(request.user_prompt)
+                    responses.append({'output': ['锂电池'], 'reason': '逐个请求'})
+            return responses
+
+        with mock.patch.object(concept_llm_analysis.llmCallerPool, 'map', side_effect=fake_map):
+            results = analyze_related_concepts_with_limit_reasons(items)
+
+        self.assertEqual(results[0], {'output': ['云计算'], 'reason': '推理过程'})
+        self.assertEqual(results[1], {'output': ['锂电池'], 'reason': '逐个请求'})
+        self.assertEqual(len(single_prompts), 1)
+        self.assertIn('锂电池', single_prompts[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+# coding: utf-8
+
+import os
+import json
+import time
+import threading
+import unittest
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from a_trade.llm_caller_pool import LLMCallerPool, LLMRequest, PooledLLMCaller, ProviderLimits
+from a_trade.llm_openai_caller import OpenAICaller
+
+
+class StubCompletionHandler(BaseHTTPRequestHandler):
+    """兼容 OpenAI chat/completions 的桩接口，按 server.statuses 依次返回状态码，成功时回显用户提示词"""
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with server.lock:
+            server.arrivals.append(time.monotonic())
+            status = server.statuses.pop(0) if server.statuses else 200
+            server.in_flight += 1
+            server.peak = max(server.peak, server.in_flight)
+        try:
+            time.sleep(server.delay)
+            if status == 200:
+                user_prompt = next(message['content'] for message in body['messages'] if message['role'] == 'user')
+                payload = {
+                    'id': 'chatcmpl-stub', 'object': 'chat.completion', 'created': 0, 'model': body['model'],
+                    'choices': [{'index': 0, 'finish_reason': 'stop',
+                                 'message': {'role': 'assistant', 'content': user_prompt}}],
+                }
+            else:
+                payload = {'error': {'message': f'stub {status}', 'type': 'stub_error', 'code': None}}
+            data = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LLMCallerPoolTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubCompletionHandler)
+        cls.server.daemon_threads = True
+        cls.server_thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.server_thread.start()
+        cls.env = mock.patch.dict(os.environ, {
+            'OPENAI_API_KEY': 'stub',
+            'OPENAI_BASE_URL': f'http://127.0.0.1:{cls.server.server_address[1]}/v1',
+            'NO_PROXY': '127.0.0.1',
+        })
+        cls.env.start()
+        os.environ.pop('PROXY_HTTP', None)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.env.stop()
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.lock = threading.Lock()
+        self.server.statuses = []
+        self.server.arrivals = []
+        self.server.delay = 0
+        self.server.in_flight = 0
+        self.server.peak = 0
+
+    def _pool(self, **limits) -> LLMCallerPool:
+        """调用池的 openai 调用器直接指向桩接口，不经过响应缓存"""
+        limits = ProviderLimits(**dict({'base_delay': 0.01, 'max_delay': 0.05}, **limits))
+        pool = LLMCallerPool({'openai': limits}, parse_retries=0)
+        pool._callers['openai'] = PooledLLMCaller(OpenAICaller(), 'openai', limits)
+        return pool
+
+    def test_token_bucket_spaces_requests(self):
+        pool = self._pool(tokens_per_minute=60000)
+        caller = pool.get_caller('openai')
+        caller.bucket.acquire(caller.bucket.capacity)
+        # 令牌耗尽后，每个 200 token 的请求需等待 0.2 秒的补充
+        request = LLMRequest(system_prompt='s' * 100, user_prompt='u' * 100, max_tokens=0)
+        for _ in range(3):
+            self.assertEqual(pool.call('openai', request), request.user_prompt)
+        gaps = [later - earlier for earlier, later in zip(self.server.arrivals, self.server.arrivals[1:])]
+        self.assertEqual(len(gaps), 2)
+        for gap in gaps:
+            self.assertGreaterEqual(gap, 0.15)
+
+    def test_retries_rate_limit_and_server_errors(self):
+        self.server.statuses = [429, 500, 503]
+        pool = self._pool(max_retries=3)
+        self.assertEqual(pool.call('openai', LLMRequest(system_prompt='s', user_prompt='ok')), 'ok')
+        # SDK 自身不重试，请求数即调用池的尝试次数
+        self.assertEqual(len(self.server.arrivals), 4)
+
+    def test_gives_up_after_max_retries(self):
+        self.server.statuses = [500] * 10
+        pool = self._pool(max_retries=2)
+        with self.assertRaises(Exception) as context:
+            pool.call('openai', LLMRequest(system_prompt='s', user_prompt='never'))
+        self.assertEqual(getattr(context.exception, 'status_code', None), 500)
+        self.assertEqual(len(self.server.arrivals), 3)
+
+        # 429 以外的 4xx 不重试
+        self.server.statuses = [400]
+        with self.assertRaises(Exception):
+            pool.call('openai', LLMRequest(system_prompt='s', user_prompt='bad'))
+        self.assertEqual(len(self.server.arrivals), 4)
+
+    def test_concurrent_callers_share_limits(self):
+        self.server.delay = 0.1
+        pool = self._pool(max_concurrency=2)
+        requests = [LLMRequest(system_prompt='s', user_prompt=f'reason-{i}') for i in range(6)]
+        results = {}
+
+        def call_sync():
+            results['sync'] = pool.call('openai', LLMRequest(system_prompt='s', user_prompt='sync'))
+
+        # 批量请求与同步调用同时进行，共用同一个调用器的并发上限
+        thread = threading.Thread(target=call_sync)
+        thread.start()
+        self.assertEqual(pool.map('openai', requests), [request.user_prompt for request in requests])
+        thread.join()
+        self.assertEqual(results['sync'], 'sync')
+        self.assertEqual(len(self.server.arrivals), 7)
+        self.assertEqual(self.server.peak, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+# coding: utf-8
+
+import threading
+import unittest
+
+import pandas as pd
+
+from a_trade.trade_calendar import TradeCalendar, tradeCalendarIndex
+from a_trade.db_base import bulk_upsert_dataframe
+from a_trade.stock_minute_data import find_missing_minute_data
+from a_trade.minute_data_prefetcher import MinuteDataPrefetcher, holding_minute_requests, merge_minute_requests
+
+# 20240106、20240107 为周末
+CALENDAR = [
+    ('20240102', 1), ('20240103', 1), ('20240104', 1), ('20240105', 1),
+    ('20240106', 0), ('20240107', 0), ('20240108', 1), ('20240109', 1),
+]
+
+
+class FakeMinuteClient:
+    """按请求生成分时数据的 pro_bar 客户端，记录全部调用"""
+
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def pro_bar(self, ts_code, freq, start_date, end_date):
+        trade_date = start_date[:10].replace('-', '')
+        with self._lock:
+            self.calls.append((ts_code, trade_date))
+        return pd.DataFrame({
+            'ts_code': [ts_code] * 3,
+            'trade_time': [f"{start_date[:10]} 09:3{minute}:00" for minute in range(3)],
+            'open': [10.0, 10.1, 10.2],
+            'close': [10.1, 10.2, 10.3],
+            'high': [10.1, 10.2, 10.3],
+            'low': [10.0, 10.1, 10.2],
+            'vol': [100.0, 200.0, 300.0],
+            'amount': [1010.0, 2040.0, 3090.0],
+            'trade_date': [trade_date] * 3,
+            'pre_close': [10.0] * 3,
+            'change': [0.1, 0.2, 0.3],
+            'pct_chg': [1.0, 2.0, 3.0],
+        })
+
+
+class MinuteDataPrefetcherTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        bulk_upsert_dataframe(
+            pd.DataFrame(CALENDAR, columns=['cal_date', 'is_open']).assign(exchange='SSE'),
+            TradeCalendar
+        )
+        tradeCalendarIndex.invalidate()
+
+    def test_holding_requests_follow_trade_calendar(self):
+        requests = holding_minute_requests({'20240104': {'000001.SZ'}, '20240109': {'600000.SH'}}, '20240109')
+        # 跳过周末，区间最后一天的候选股票没有后续交易日
+        self.assertEqual(requests, {'20240105': {'000001.SZ'}, '20240108': {'000001.SZ'}})
+
+    def test_prefetch_cold_range_without_observation_entries(self):
+        # 首次回测：区间内没有任何观察条目，订阅完全由盘后分析日的候选股票推算
+        candidates = {'20240102': {'000001.SZ', '000002.SZ'}, '20240103': {'600000.SH'}}
+        requests = merge_minute_requests(
+            {'20240102': {'300001.SZ'}},
+            holding_minute_requests(candidates, '20240105')
+        )
+        self.assertEqual(requests, {
+            '20240102': {'300001.SZ'},
+            '20240103': {'000001.SZ', '000002.SZ'},
+            '20240104': {'000001.SZ', '000002.SZ', '600000.SH'},
+            '20240105': {'600000.SH'},
+        })
+
+        client = FakeMinuteClient()
+        saved, failed = MinuteDataPrefetcher(client=client, max_workers=2).prefetch(requests)
+        expected = {(stock_code, trade_date) for trade_date, stock_codes in requests.items() for stock_code in stock_codes}
+        self.assertEqual(failed, [])
+        self.assertEqual(saved, len(expected))
+        self.assertEqual(set(client.calls), expected)
+        self.assertEqual(find_missing_minute_data(requests), [])
+
+        # 数据已存在时不再调用接口
+        saved, failed = MinuteDataPrefetcher(client=client, max_workers=2).prefetch(requests)
+        self.assertEqual((saved, failed), (0, []))
+        self.assertEqual(len(client.calls), len(expected))
+
+
+if __name__ == '__main__':
+    unittest.main()